@@ -1,7 +1,71 @@
 """Configuration constants for the DigiShell backend."""
 
+import os
+import tempfile
+
 STATUS_POLL_INTERVAL = 5
 CONNECTION_CHECK_INTERVAL = 50
 POLL_SLEEP_INTERVAL = 0.1
 CONSECUTIVE_FAILURE_THRESHOLD = 10
 ERROR_RETRY_INTERVAL = 1
+
+# WebSocket heartbeat: ping every HEARTBEAT_INTERVAL seconds, reap clients
+# that have not sent anything back within HEARTBEAT_TIMEOUT seconds.
+HEARTBEAT_INTERVAL = 15
+HEARTBEAT_TIMEOUT = 45
+
+# Per-client outbound queue. A client that falls this far behind on control or
+# RX messages is dropped.
+CLIENT_SEND_QUEUE_SIZE = 256
+CLIENT_SEND_TIMEOUT = 10
+
+# Low-priority messages (status updates, metrics) are coalesced per message
+# type and, to a client that has fallen behind, sent at most once per this
+# many seconds.
+LOW_PRIORITY_MIN_INTERVAL = 1.0
+
+# Server-Sent Events (/api/events): events kept for Last-Event-ID resume,
+# per-listener backlog, and comment keepalive interval in seconds.
+EVENT_HISTORY_SIZE = 500
+SSE_QUEUE_SIZE = 256
+SSE_KEEPALIVE_INTERVAL = 15
+
+# Event bus carrying broadcasts between processes/nodes: "inprocess" (default),
+# "unix" (URL is a socket path) or "redis" (URL like redis://host:6379).
+# Relay processes set DIGISHELL_POLLER=0 so only one process polls FLDIGI.
+EVENT_BUS = os.environ.get('DIGISHELL_EVENT_BUS', 'inprocess')
+EVENT_BUS_URL = os.environ.get(
+    'DIGISHELL_EVENT_BUS_URL',
+    os.path.join(tempfile.gettempdir(), 'digishell-events.sock') if EVENT_BUS == 'unix' else ''
+)
+EVENT_BUS_CHANNEL = os.environ.get('DIGISHELL_EVENT_BUS_CHANNEL', 'digishell:events')
+POLLER_ENABLED = os.environ.get('DIGISHELL_POLLER', '1') != '0'
+
+# Waterfall codecs in server preference order. Each /api/waterfall/ws client
+# gets the first one it says it can decode (JPEG if it says nothing). Run
+# `python -m benchmarks.waterfall_codecs` to pick an order for a deployment.
+# "intensity" is last: clients only get it by asking for it alone.
+WATERFALL_CODECS = [
+    name.strip() for name in
+    os.environ.get('DIGISHELL_WATERFALL_CODECS', 'jpeg,webp,indexed,png,intensity').split(',')
+    if name.strip()
+]
+
+# FlDigi palette file (.pal) used to turn waterfall colours back into signal
+# levels for the intensity codec. Empty means FlDigi's default palette.
+WATERFALL_PALETTE = os.environ.get('DIGISHELL_WATERFALL_PALETTE', '')
+
+# Worker processes for waterfall encoding. 0 encodes on one thread, which is
+# enough for a single full-size stream; more lets several frames and
+# resolution tiers be encoded at once on multi-core machines.
+WATERFALL_ENCODE_PROCESSES = int(os.environ.get('DIGISHELL_WATERFALL_ENCODE_PROCESSES', '0'))
+
+# Waterfall recording (/api/waterfall/recording): where segments are kept,
+# and when the oldest are deleted - total size in bytes or age in seconds.
+# New segments start every WATERFALL_RECORD_SEGMENT_SECONDS.
+WATERFALL_RECORD_DIR = os.environ.get(
+    'DIGISHELL_WATERFALL_RECORD_DIR', os.path.join(os.path.expanduser('~'), '.fldigi_tui_waterfall')
+)
+WATERFALL_RECORD_MAX_BYTES = int(os.environ.get('DIGISHELL_WATERFALL_RECORD_MAX_BYTES', str(512 * 1024 * 1024)))
+WATERFALL_RECORD_MAX_AGE = float(os.environ.get('DIGISHELL_WATERFALL_RECORD_MAX_AGE', str(24 * 3600)))
+WATERFALL_RECORD_SEGMENT_SECONDS = float(os.environ.get('DIGISHELL_WATERFALL_RECORD_SEGMENT_SECONDS', '300'))
@@ -0,0 +1,489 @@
+"""
+Event bus behind ConnectionManager.
+
+The FLDIGI poller publishes each broadcast once; the bus delivers it to every
+subscribing process (including the publisher), and each process fans it out
+to its own WebSocket and SSE clients. Backends:
+
+- inprocess: direct call, the default single-process setup
+- unix:      local Unix domain socket; the poller process is the hub and
+             relay processes connect to it
+- redis:     Redis PUBLISH/SUBSCRIBE spoken directly over RESP, so any
+             Redis-protocol server can carry events between nodes
+
+Select with DIGISHELL_EVENT_BUS / DIGISHELL_EVENT_BUS_URL (see config.py).
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import deque
+from typing import Callable, Dict, Any, Optional, Set
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+RECONNECT_DELAY = 1.0
+MAX_RECONNECT_DELAY = 30.0
+PEER_BUFFER_LIMIT = 4 * 1024 * 1024  # Bytes buffered for a relay before it is dropped
+EVENT_LINE_LIMIT = 4 * 1024 * 1024  # Longest event line read from the Unix socket; longer ones are skipped
+PUBLISH_DRAIN_TIMEOUT = 2.0  # Seconds a Redis PUBLISH may wait on the socket before the connection is dropped
+RECENT_EVENT_IDS = 1024  # Events remembered to drop duplicates (delivered locally and via Redis)
+
+
+def event_topic(message_type: str, data: Dict[str, Any]) -> str:
+    """Map a broadcast message type to its event-stream topic."""
+    if message_type == "text_update":
+        return data.get("text_type", "rx")
+    if message_type == "status_update":
+        return "status"
+    if message_type == "connection_status":
+        return "connection"
+    return message_type
+
+
+class BroadcastEvent:
+    """A broadcast message serialized once and shared by every consumer."""
+
+    __slots__ = ("id", "type", "topic", "data", "payload")
+
+    def __init__(self, event_id: int, message_type: str, topic: str, data: Dict[str, Any], payload: str):
+        self.id = event_id
+        self.type = message_type
+        self.topic = topic
+        self.data = data
+        self.payload = payload
+
+    @classmethod
+    def from_payload(cls, payload: str) -> "BroadcastEvent":
+        message = json.loads(payload)
+        message_type = message.get("type", "update")
+        data = message.get("data") or {}
+        return cls(int(message.get("id", 0)), message_type, event_topic(message_type, data), data, payload)
+
+
+EventHandler = Callable[[BroadcastEvent], None]
+
+
+class EventBus:
+    """
+    Base class. publish() must eventually call the handler of every process
+    subscribed to the bus, this one included, exactly once per event.
+    """
+
+    kind = "base"
+
+    def __init__(self, handler: EventHandler):
+        self.handler = handler
+        self.published = 0
+        self.received = 0
+        self.errors = 0
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    async def publish(self, event: BroadcastEvent):
+        raise NotImplementedError
+
+    def _deliver(self, event: BroadcastEvent):
+        self.received += 1
+        try:
+            self.handler(event)
+        except Exception as e:
+            logger.error(f"Error dispatching event {event.id}: {e}")
+
+    def _deliver_payload(self, payload: str):
+        try:
+            event = BroadcastEvent.from_payload(payload)
+        except (ValueError, TypeError) as e:
+            self.errors += 1
+            logger.warning(f"Discarding malformed event from bus: {e}")
+            return
+        self._deliver(event)
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "kind": self.kind,
+            "published": self.published,
+            "received": self.received,
+            "errors": self.errors
+        }
+
+
+class InProcessEventBus(EventBus):
+    kind = "inprocess"
+
+    async def publish(self, event: BroadcastEvent):
+        self.published += 1
+        self._deliver(event)
+
+
+async def _read_line(reader: asyncio.StreamReader) -> Optional[bytes]:
+    """
+    Read one newline-terminated event line. Returns b"" at the end of the
+    stream, and None for a line longer than the reader's limit, which is
+    skipped so the lines after it still arrive.
+    """
+    try:
+        return await reader.readuntil(b"\n")
+    except asyncio.IncompleteReadError:
+        return b""
+    except asyncio.LimitOverrunError as e:
+        consumed = e.consumed
+    while True:
+        # Discard what was scanned of the long line, then look for its end again
+        await reader.readexactly(consumed)
+        try:
+            await reader.readuntil(b"\n")
+            return None
+        except asyncio.LimitOverrunError as e:
+            consumed = e.consumed
+
+
+class UnixSocketEventBus(EventBus):
+    """
+    Newline-delimited JSON over a Unix domain socket.
+
+    The hub (the process running the FLDIGI poller) listens on the socket and
+    re-broadcasts everything it publishes or receives to all connected relays.
+    Relays connect as clients and reconnect automatically.
+    """
+
+    kind = "unix"
+
+    def __init__(self, handler: EventHandler, path: str, hub: bool):
+        super().__init__(handler)
+        self.path = path
+        self.hub = hub
+        self._server = None
+        self._peers: Set[asyncio.StreamWriter] = set()
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._client_task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        if self.hub:
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+            self._server = await asyncio.start_unix_server(self._handle_peer, path=self.path, limit=EVENT_LINE_LIMIT)
+            logger.info(f"Event bus hub listening on {self.path}")
+        else:
+            self._client_task = asyncio.create_task(self._client_loop())
+
+    async def stop(self):
+        if self._client_task:
+            self._client_task.cancel()
+            try:
+                await self._client_task
+            except asyncio.CancelledError:
+                pass
+            self._client_task = None
+
+        for writer in list(self._peers) + ([self._writer] if self._writer else []):
+            writer.close()
+        self._peers.clear()
+        self._writer = None
+
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+
+    async def publish(self, event: BroadcastEvent):
+        self.published += 1
+        if self.hub:
+            self._deliver(event)
+            self._write_peers((event.payload + "\n").encode("utf-8"))
+        elif self._writer:
+            # The hub echoes the event back, which is when we deliver it locally
+            self._writer.write((event.payload + "\n").encode("utf-8"))
+        else:
+            self._deliver(event)
+
+    def _write_peers(self, line: bytes):
+        for writer in list(self._peers):
+            if writer.transport.get_write_buffer_size() > PEER_BUFFER_LIMIT:
+                logger.warning("Event bus relay is not keeping up, disconnecting it")
+                self._peers.discard(writer)
+                writer.close()
+            else:
+                writer.write(line)
+
+    async def _handle_peer(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._peers.add(writer)
+        logger.info(f"Event bus relay connected ({len(self._peers)} total)")
+        try:
+            while True:
+                line = await _read_line(reader)
+                if line is None:
+                    self._discard_long_line()
+                    continue
+                if not line:
+                    break
+                self._deliver_payload(line.decode("utf-8", errors="replace").rstrip("\n"))
+                self._write_peers(line)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._peers.discard(writer)
+            writer.close()
+
+    def _discard_long_line(self):
+        self.errors += 1
+        logger.warning(f"Discarding event over {EVENT_LINE_LIMIT} bytes from bus")
+
+    async def _client_loop(self):
+        delay = RECONNECT_DELAY
+        while True:
+            try:
+                reader, writer = await asyncio.open_unix_connection(self.path, limit=EVENT_LINE_LIMIT)
+            except OSError as e:
+                logger.debug(f"Event bus hub not reachable at {self.path}: {e}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, MAX_RECONNECT_DELAY)
+                continue
+
+            logger.info(f"Connected to event bus hub at {self.path}")
+            self._writer = writer
+            delay = RECONNECT_DELAY
+            try:
+                while True:
+                    line = await _read_line(reader)
+                    if line is None:
+                        self._discard_long_line()
+                        continue
+                    if not line:
+                        break
+                    self._deliver_payload(line.decode("utf-8", errors="replace").rstrip("\n"))
+            except (ConnectionError, asyncio.IncompleteReadError):
+                pass
+            finally:
+                self._writer = None
+                writer.close()
+            logger.warning("Lost connection to event bus hub, reconnecting")
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            **super().get_status(),
+            "path": self.path,
+            "role": "hub" if self.hub else "relay",
+            "peers": len(self._peers) if self.hub else None,
+            "connected": True if self.hub else self._writer is not None
+        }
+
+
+class RedisProtocolError(Exception):
+    pass
+
+
+async def _read_resp(reader: asyncio.StreamReader):
+    """Read one RESP2 reply."""
+    line = await reader.readline()
+    if not line:
+        raise ConnectionError("Connection closed by server")
+
+    prefix, rest = line[:1], line[1:-2]
+    if prefix == b"+":
+        return rest
+    if prefix == b"-":
+        raise RedisProtocolError(rest.decode("utf-8", errors="replace"))
+    if prefix == b":":
+        return int(rest)
+    if prefix == b"$":
+        length = int(rest)
+        if length < 0:
+            return None
+        return (await reader.readexactly(length + 2))[:-2]
+    if prefix == b"*":
+        count = int(rest)
+        if count < 0:
+            return None
+        return [await _read_resp(reader) for _ in range(count)]
+    raise RedisProtocolError(f"Unexpected reply: {line!r}")
+
+
+def _encode_resp(*parts) -> bytes:
+    out = [b"*%d\r\n" % len(parts)]
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode("utf-8")
+        out.append(b"$%d\r\n%s\r\n" % (len(part), part))
+    return b"".join(out)
+
+
+class RedisEventBus(EventBus):
+    """
+    PUBLISH/SUBSCRIBE on one channel using a minimal built-in RESP client.
+
+    Uses one connection for publishing and one for the subscription. Events
+    are delivered locally when they come back through the subscription; if
+    Redis is unreachable or too slow, publish falls back to local delivery.
+    An event can then arrive both ways (e.g. while the subscription is being
+    re-established), so recently delivered event ids are remembered and
+    repeats dropped.
+    """
+
+    kind = "redis"
+
+    def __init__(self, handler: EventHandler, url: str, channel: str):
+        super().__init__(handler)
+        parsed = urlparse(url or "redis://127.0.0.1:6379")
+        self.url = url
+        self.host = parsed.hostname or "127.0.0.1"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.channel = channel
+        self._pub_reader: Optional[asyncio.StreamReader] = None
+        self._pub_writer: Optional[asyncio.StreamWriter] = None
+        self._pub_lock = asyncio.Lock()
+        self._pub_drain_task: Optional[asyncio.Task] = None
+        self._sub_task: Optional[asyncio.Task] = None
+        self._subscribed = False
+        self._recent_ids: Set[tuple] = set()
+        self._recent_order: deque = deque()
+
+    async def _open(self):
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        if self.password:
+            writer.write(_encode_resp("AUTH", self.password))
+            await _read_resp(reader)
+        return reader, writer
+
+    async def start(self):
+        self._sub_task = asyncio.create_task(self._subscribe_loop())
+
+    async def stop(self):
+        for task in (self._sub_task, self._pub_drain_task):
+            if task:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._sub_task = None
+        self._drop_publisher()
+
+    def _deliver(self, event: BroadcastEvent):
+        key = (event.id, event.type)
+        if key in self._recent_ids:
+            return
+        self._recent_ids.add(key)
+        self._recent_order.append(key)
+        if len(self._recent_order) > RECENT_EVENT_IDS:
+            self._recent_ids.discard(self._recent_order.popleft())
+        super()._deliver(event)
+
+    def _drop_publisher(self):
+        if self._pub_drain_task:
+            self._pub_drain_task.cancel()
+            self._pub_drain_task = None
+        if self._pub_writer:
+            self._pub_writer.close()
+            self._pub_writer = None
+
+    async def _drain_publish_replies(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                await _read_resp(reader)
+        except (ConnectionError, asyncio.IncompleteReadError, RedisProtocolError) as e:
+            logger.warning(f"Redis publish connection closed: {e}")
+        finally:
+            # A replacement connection may already be in use
+            if self._pub_writer is writer:
+                self._pub_writer = None
+
+    async def publish(self, event: BroadcastEvent):
+        self.published += 1
+        async with self._pub_lock:
+            if self._pub_writer is None:
+                try:
+                    reader, self._pub_writer = await self._open()
+                    self._pub_drain_task = asyncio.create_task(
+                        self._drain_publish_replies(reader, self._pub_writer)
+                    )
+                except (OSError, RedisProtocolError) as e:
+                    self.errors += 1
+                    logger.debug(f"Redis unavailable, delivering locally: {e}")
+                    self._deliver(event)
+                    return
+
+            try:
+                self._pub_writer.write(_encode_resp("PUBLISH", self.channel, event.payload))
+                # Back-pressure: a stalled Redis must not buffer events without bound
+                await asyncio.wait_for(self._pub_writer.drain(), PUBLISH_DRAIN_TIMEOUT)
+            except (OSError, asyncio.TimeoutError) as e:
+                self.errors += 1
+                logger.warning(f"Redis publish failed, delivering locally: {e!r}")
+                self._drop_publisher()
+                self._deliver(event)
+                return
+
+        if not self._subscribed:
+            # Our own subscription is down, so the event would not come back
+            self._deliver(event)
+
+    async def _subscribe_loop(self):
+        delay = RECONNECT_DELAY
+        while True:
+            writer = None
+            try:
+                reader, writer = await self._open()
+                writer.write(_encode_resp("SUBSCRIBE", self.channel))
+                await writer.drain()
+                logger.info(f"Subscribed to redis://{self.host}:{self.port} channel {self.channel}")
+                delay = RECONNECT_DELAY
+
+                while True:
+                    reply = await _read_resp(reader)
+                    if not isinstance(reply, list) or len(reply) < 3:
+                        continue
+                    if reply[0] == b"subscribe":
+                        self._subscribed = True
+                    elif reply[0] == b"message":
+                        self._deliver_payload(reply[2].decode("utf-8"))
+            except asyncio.CancelledError:
+                raise
+            except (OSError, asyncio.IncompleteReadError, RedisProtocolError) as e:
+                self.errors += 1
+                logger.warning(f"Redis subscription lost: {e}")
+            finally:
+                self._subscribed = False
+                if writer:
+                    writer.close()
+
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, MAX_RECONNECT_DELAY)
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            **super().get_status(),
+            "url": f"redis://{self.host}:{self.port}",
+            "channel": self.channel,
+            "connected": self._subscribed
+        }
+
+
+def create_event_bus(kind: str, handler: EventHandler, url: str = "", channel: str = "",
+                     hub: bool = True) -> EventBus:
+    kind = (kind or "inprocess").lower()
+    if kind == "inprocess":
+        return InProcessEventBus(handler)
+    if kind == "unix":
+        return UnixSocketEventBus(handler, url, hub)
+    if kind == "redis":
+        return RedisEventBus(handler, url, channel)
+    raise ValueError(f"Unknown event bus '{kind}' (expected inprocess, unix or redis)")
+
+
+def next_event_id(last_id: int) -> int:
+    """
+    Event ids are microsecond timestamps, forced strictly increasing, so ids
+    from different publishers still order sensibly for Last-Event-ID resume.
+    """
+    return max(last_id + 1, time.time_ns() // 1000)
@@ -1,4 +1,5 @@
 import logging
+import os
 import threading
 from typing import Optional, Dict, Any
 from pyfldigi import Client
@@ -665,4 +666,7 @@ class FldigiClient:
         }
 
 
-fldigi_client = FldigiClient()
+fldigi_client = FldigiClient(
+    host=os.environ.get('DIGISHELL_FLDIGI_HOST', '127.0.0.1'),
+    port=int(os.environ.get('DIGISHELL_FLDIGI_PORT', 7362))
+)
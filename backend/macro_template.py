@@ -0,0 +1,86 @@
+"""
+Macro templates, shared by the web backend and the TUI.
+
+A macro is text with <NAME> placeholders:
+
+    <MYCALL> <MYNAME> <MYQTH>   station config
+    <CALL>                      last station worked
+    <DATE> <TIME> <UTC>         local date and time, UTC time
+    <FREQ> <MODE> <RST> <SNR>   rig frequency (kHz), modem, RST/RSQ estimate
+                                and S/N, from the latest status snapshot
+
+Each distinct macro text is split into literal and placeholder tokens once
+and cached, so expanding it is one pass over the tokens with the clock read
+once. Unknown placeholders are left as they are; values missing from the
+status snapshot expand to nothing.
+"""
+
+import re
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Any, Dict, Optional, Tuple
+
+PLACEHOLDER = re.compile(r"<([A-Z]+)>")
+STATUS_PLACEHOLDERS = ("FREQ", "MODE", "RST", "SNR")
+
+Token = Tuple[bool, str]  # (is placeholder, placeholder name or literal text)
+
+
+@lru_cache(maxsize=256)
+def compile_template(text: str) -> Tuple[Token, ...]:
+    """Split macro text into tokens. Cached per text, so an edited macro compiles again."""
+    tokens = []
+    position = 0
+    for match in PLACEHOLDER.finditer(text):
+        if match.start() > position:
+            tokens.append((False, text[position:match.start()]))
+        tokens.append((True, match.group(1)))
+        position = match.end()
+    if position < len(text):
+        tokens.append((False, text[position:]))
+    return tuple(tokens)
+
+
+def _status_value(name: str, status: Dict[str, Any]) -> str:
+    if name == "FREQ":
+        frequency = status.get("rig_frequency")
+        return f"{frequency / 1000:.3f}" if frequency else ""
+    if name == "MODE":
+        return status.get("modem") or ""
+    if name == "RST":
+        return status.get("rsq_estimate") or status.get("rst_estimate") or ""
+    snr = status.get("snr")
+    return f"{snr:.1f}dB" if snr is not None else ""
+
+
+def expand_template(text: str, callsign: str, name: str, qth: str, last_call: Optional[str] = None,
+                    status: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Expand a macro. status is a status snapshot (StatusUpdate fields, as
+    broadcast in status_update); nothing is asked of FLDIGI here.
+    """
+    now = None
+    parts = []
+    for is_placeholder, value in compile_template(text):
+        if not is_placeholder:
+            parts.append(value)
+        elif value == "MYCALL":
+            parts.append(callsign)
+        elif value == "MYNAME":
+            parts.append(name)
+        elif value == "MYQTH":
+            parts.append(qth)
+        elif value == "CALL":
+            parts.append(last_call or "NOCALL")
+        elif value in ("DATE", "TIME", "UTC"):
+            if now is None:
+                now = datetime.now(timezone.utc)
+            if value == "UTC":
+                parts.append(now.strftime("%H:%MZ"))
+            else:
+                parts.append(now.astimezone().strftime("%Y-%m-%d" if value == "DATE" else "%H:%M"))
+        elif value in STATUS_PLACEHOLDERS:
+            parts.append(_status_value(value, status or {}))
+        else:
+            parts.append(f"<{value}>")
+    return "".join(parts)
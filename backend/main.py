@@ -9,14 +9,15 @@ from fastapi.middleware.cors import CORSMiddleware
 from backend.fldigi_client import fldigi_client
 from backend.websocket_manager import manager
 from backend.models import ConnectionStatus, StatusUpdate
-from backend.routers import modem, txrx, rig, macros, settings, presets, waterfall
+from backend.routers import modem, txrx, rig, macros, settings, presets, waterfall, events
 from backend.dependencies import require_fldigi_connected
 from backend.config import (
     STATUS_POLL_INTERVAL,
     CONNECTION_CHECK_INTERVAL,
     POLL_SLEEP_INTERVAL,
     CONSECUTIVE_FAILURE_THRESHOLD,
-    ERROR_RETRY_INTERVAL
+    ERROR_RETRY_INTERVAL,
+    POLLER_ENABLED
 )
 
 logging.basicConfig(
@@ -134,12 +135,18 @@ async def poll_fldigi_status():
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    success, error = fldigi_client.connect()
-    if not success:
-        logger.warning(f"Could not connect to FLDIGI: {error}. Will retry on WebSocket connection.")
+    # Relay processes never talk to FLDIGI; the poller's events reach them over the bus
+    if POLLER_ENABLED:
+        success, error = fldigi_client.connect()
+        if not success:
+            logger.warning(f"Could not connect to FLDIGI: {error}. Will retry on WebSocket connection.")
+
+    await manager.start()
 
+    # Relay processes (DIGISHELL_POLLER=0) only serve clients from the event bus
     global background_task
-    background_task = asyncio.create_task(poll_fldigi_status())
+    if POLLER_ENABLED:
+        background_task = asyncio.create_task(poll_fldigi_status())
 
     yield
 
@@ -150,6 +157,7 @@ async def lifespan(app: FastAPI):
         except asyncio.CancelledError:
             pass
 
+    await manager.stop()
     fldigi_client.disconnect()
 
 
@@ -182,6 +190,7 @@ app.include_router(macros.router)
 app.include_router(settings.router)
 app.include_router(presets.router)
 app.include_router(waterfall.router)
+app.include_router(events.router)
 
 
 
@@ -237,18 +246,24 @@ async def websocket_endpoint(websocket: WebSocket):
     await manager.connect(websocket)
 
     try:
-        status = ConnectionStatus(
-            connected=fldigi_client.is_connected(),
-            fldigi_version=fldigi_client.get_version() if fldigi_client.is_connected() else None,
-            fldigi_name=fldigi_client.get_name() if fldigi_client.is_connected() else None
-        )
-        await manager.send_personal_message(
-            status.model_dump_json(),
-            websocket
-        )
+        # The connection_status snapshot is the source of truth once the poller
+        # has broadcast one; only the polling process asks FLDIGI before that,
+        # so viewers and relays add no XML-RPC calls
+        if POLLER_ENABLED and "connection_status" not in manager.latest_events:
+            status = ConnectionStatus(
+                connected=fldigi_client.is_connected(),
+                fldigi_version=fldigi_client.get_version() if fldigi_client.is_connected() else None,
+                fldigi_name=fldigi_client.get_name() if fldigi_client.is_connected() else None
+            )
+            await manager.send_personal_message(
+                status.model_dump_json(),
+                websocket
+            )
+        await manager.send_snapshot(websocket)
 
         while True:
             data = await websocket.receive_text()
+            manager.touch(websocket)
 
     except WebSocketDisconnect:
         manager.disconnect(websocket)
@@ -281,7 +296,8 @@ async def health_check():
     return {
         "status": "healthy",
         "fldigi_connected": fldigi_client.is_connected(),
-        "websocket_connections": manager.get_connection_count()
+        "websocket_connections": manager.get_connection_count(),
+        "websocket_stats": manager.get_stats()
     }
 
 
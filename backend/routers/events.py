@@ -0,0 +1,97 @@
+"""
+Server-Sent Events stream of the broadcast pipeline.
+
+Read-only consumers (dashboards, curl, proxied viewers) get the same RX,
+status and connection events that /ws clients receive, without a WebSocket.
+
+    curl -N --compressed "http://localhost:8000/api/events?topics=rx,status"
+
+Each event is sent as:
+
+    id: <event id>
+    event: <message type>
+    data: <same JSON message as /ws>
+
+Reconnecting clients send Last-Event-ID (browsers do this automatically) and
+receive every retained event after that id.
+"""
+
+import asyncio
+import zlib
+from typing import Optional
+
+from fastapi import APIRouter, Request, Query, Header
+from fastapi.responses import StreamingResponse
+
+from backend.websocket_manager import manager
+from backend.config import SSE_KEEPALIVE_INTERVAL
+
+router = APIRouter(prefix="/api/events", tags=["events"])
+
+SSE_RETRY_MS = 3000
+
+
+def _format_event(event) -> str:
+    return f"id: {event.id}\nevent: {event.type}\ndata: {event.payload}\n\n"
+
+
+def _parse_event_id(value: Optional[str]) -> Optional[int]:
+    try:
+        return int(value) if value else None
+    except ValueError:
+        return None
+
+
+@router.get("")
+async def stream_events(
+    request: Request,
+    topics: Optional[str] = Query(None, description="Comma-separated topics: rx, tx, status, connection, error"),
+    last_event_id: Optional[str] = Query(None, description="Resume after this event id"),
+    last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID"),
+    accept_encoding: Optional[str] = Header(None, alias="Accept-Encoding")
+):
+    """Stream broadcast events as text/event-stream, optionally gzip-compressed."""
+    topic_set = {t.strip() for t in topics.split(",") if t.strip()} if topics else None
+    resume_id = _parse_event_id(last_event_id_header) or _parse_event_id(last_event_id)
+    listener = manager.add_event_listener(topic_set, resume_id)
+
+    # Streaming gzip: Z_SYNC_FLUSH after every event so nothing sits in the
+    # compressor while the connection is idle.
+    use_gzip = bool(accept_encoding) and "gzip" in accept_encoding.lower()
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if use_gzip else None
+
+    def encode(text: str) -> bytes:
+        data = text.encode("utf-8")
+        if compressor:
+            return compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        return data
+
+    async def event_generator():
+        try:
+            yield encode(f"retry: {SSE_RETRY_MS}\n\n")
+            while not listener.overflowed:
+                try:
+                    event = await asyncio.wait_for(listener.queue.get(), SSE_KEEPALIVE_INTERVAL)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield encode(": keepalive\n\n")
+                    continue
+
+                # Batch whatever else is already queued into one write
+                chunks = [_format_event(event)]
+                while not listener.queue.empty():
+                    chunks.append(_format_event(listener.queue.get_nowait()))
+                yield encode("".join(chunks))
+        finally:
+            manager.remove_event_listener(listener)
+
+    headers = {
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+        "Vary": "Accept-Encoding"
+    }
+    if use_gzip:
+        headers["Content-Encoding"] = "gzip"
+
+    return StreamingResponse(event_generator(), media_type="text/event-stream", headers=headers)
@@ -1,14 +1,19 @@
 import json
 import os
-from datetime import datetime
+import threading
+import time
 from pathlib import Path
 from typing import Dict, Optional
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 
+from backend.macro_template import expand_template
+from backend.websocket_manager import manager
+
 router = APIRouter(prefix="/api/macros", tags=["macros"])
 
 CONFIG_FILE = Path.home() / ".fldigi_tui.json"
+CONFIG_CHECK_INTERVAL = 1.0  # Seconds between stat() calls on CONFIG_FILE
 
 class Config(BaseModel):
     callsign: str
@@ -36,7 +41,42 @@ class MacroDeleteRequest(BaseModel):
     key: str
 
 
+# Process-wide cache of CONFIG_FILE, reloaded when its mtime or size changes
+# (run_tui.py edits the same file). The cached Config is shared: callers that
+# change it work on a model_copy(deep=True) and hand it to save_config.
+_config_lock = threading.Lock()
+_cached_config: Optional[Config] = None
+_cached_signature = None  # (st_mtime_ns, st_size) the cache was loaded from, None = no file
+_last_check = 0.0
+
+
+def _config_signature():
+    try:
+        stat = os.stat(CONFIG_FILE)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
 def load_config() -> Config:
+    """
+    The current config, read-only (see above). The file is stat()ed at most
+    once per CONFIG_CHECK_INTERVAL and only parsed again when it changed.
+    """
+    global _cached_config, _cached_signature, _last_check
+    with _config_lock:
+        now = time.monotonic()
+        if _cached_config is None or now - _last_check >= CONFIG_CHECK_INTERVAL:
+            _last_check = now
+            # Stat before reading: a write in between is picked up by the next check
+            signature = _config_signature()
+            if _cached_config is None or signature != _cached_signature:
+                _cached_config = _read_config()
+                _cached_signature = signature
+        return _cached_config
+
+
+def _read_config() -> Config:
     if CONFIG_FILE.exists():
         try:
             with open(CONFIG_FILE, 'r') as f:
@@ -60,34 +100,26 @@ def load_config() -> Config:
 
 
 def save_config(config: Config) -> bool:
-    try:
-        with open(CONFIG_FILE, 'w') as f:
-            json.dump(config.dict(), f, indent=2)
-        return True
-    except (OSError, TypeError):
-        return False
+    """Write config and make it the cached one. It must not be changed afterwards."""
+    global _cached_config, _cached_signature, _last_check
+    with _config_lock:
+        try:
+            with open(CONFIG_FILE, 'w') as f:
+                json.dump(config.dict(), f, indent=2)
+        except (OSError, TypeError):
+            return False
+        _cached_config = config
+        _cached_signature = _config_signature()
+        _last_check = time.monotonic()
+    return True
 
 
 def expand_macros(text: str, config: Config, last_call: Optional[str] = None) -> str:
-    now = datetime.now()
-    from datetime import timezone
-    utc_now = datetime.now(timezone.utc)
-
-    replacements = {
-        '<MYCALL>': config.callsign,
-        '<MYNAME>': config.name,
-        '<MYQTH>': config.qth,
-        '<CALL>': last_call or 'NOCALL',
-        '<DATE>': now.strftime('%Y-%m-%d'),
-        '<TIME>': now.strftime('%H:%M'),
-        '<UTC>': utc_now.strftime('%H:%MZ'),
-    }
-
-    result = text
-    for placeholder, value in replacements.items():
-        result = result.replace(placeholder, value)
-
-    return result
+    # <FREQ>, <MODE>, <RST> and <SNR> come from the poller's last status broadcast
+    status = manager.latest_events.get("status_update")
+    return expand_template(
+        text, config.callsign, config.name, config.qth, last_call, status.data if status else None
+    )
 
 
 @router.get("/config", response_model=Config)
@@ -97,7 +129,7 @@ async def get_config():
 
 @router.post("/config")
 async def update_config(update: ConfigUpdate):
-    config = load_config()
+    config = load_config().model_copy(deep=True)
 
     if update.callsign is not None:
         config.callsign = update.callsign.upper()
@@ -127,7 +159,7 @@ async def get_macros():
 
 @router.post("/add")
 async def add_or_update_macro(request: MacroUpdateRequest):
-    config = load_config()
+    config = load_config().model_copy(deep=True)
     config.macros[request.key] = request.text
 
     if save_config(config):
@@ -138,7 +170,7 @@ async def add_or_update_macro(request: MacroUpdateRequest):
 
 @router.post("/delete")
 async def delete_macro(request: MacroDeleteRequest):
-    config = load_config()
+    config = load_config().model_copy(deep=True)
 
     if request.key not in config.macros:
         raise HTTPException(status_code=404, detail=f"Macro '{request.key}' not found")
@@ -6,11 +6,17 @@ This is a BETA feature and disabled by default.
 Supports both Linux (X11) and Windows platforms.
 """
 
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, HTTPException
+import asyncio
+import time
+
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import Optional
+from typing import Optional, List, Dict, Any
 
-from backend.waterfall_capture import waterfall_service
+from backend.fldigi_client import fldigi_client
+from backend.waterfall_capture import waterfall_service, MjpegSink, RESOLUTION_TIERS
+from backend.waterfall_recorder import waterfall_recorder
 
 
 router = APIRouter(prefix="/api/waterfall", tags=["waterfall"])
@@ -24,6 +30,23 @@ class WaterfallStatusResponse(BaseModel):
     window_found: bool
     subscribers: int
     platform: str
+    capture_method: Optional[str] = None
+    capture_trigger: Optional[str] = None
+    capture_ms: Optional[float] = None
+    last_capture_ms: Optional[float] = None
+    stage_ms: Dict[str, float] = {}
+    capture_fps: Optional[float] = None
+    crop: Optional[List[int]] = None
+    frequency_axis: Optional[List[float]] = None
+    window_size: Optional[List[int]] = None
+    keyframes_sent: int = 0
+    strips_sent: int = 0
+    frames_sent: int = 0
+    frames_skipped: int = 0
+    codecs: List[str] = []
+    tiers: List[int] = []
+    carriers: List[Dict[str, Any]] = []
+    clients: List[Dict[str, Any]] = []
 
 
 class WaterfallEnableRequest(BaseModel):
@@ -58,13 +81,14 @@ async def set_waterfall_enabled(request: WaterfallEnableRequest):
     Requires platform-specific dependencies:
     - Linux: X11, python-xlib, Pillow
     - Windows: pywin32, Pillow
+    NumPy adds scroll strips, intensity frames and carrier detection.
     """
     try:
         if request.enabled:
             if not waterfall_service.is_available():
                 import sys
                 if sys.platform == "linux":
-                    req_msg = "Requires Linux with X11, python-xlib, and Pillow."
+                    req_msg = "Requires Linux with X11, python-xlib and Pillow."
                 elif sys.platform == "win32":
                     req_msg = "Requires Windows with pywin32 and Pillow."
                 else:
@@ -95,20 +119,237 @@ async def set_waterfall_enabled(request: WaterfallEnableRequest):
         )
 
 
+class WaterfallRegionRequest(BaseModel):
+    """
+    Request to set the capture region.
+
+    Either give x/y/width/height in FlDigi window coordinates, set auto to
+    detect the waterfall from pixel statistics, or set clear to capture the
+    whole window. low_hz/high_hz give the audio frequencies at the left and
+    right edges of the crop; without them clicks are passed to the FlDigi
+    window and carriers are not reported. They may be sent alone to change
+    just the axis.
+    """
+    x: Optional[int] = None
+    y: Optional[int] = None
+    width: Optional[int] = None
+    height: Optional[int] = None
+    auto: bool = False
+    clear: bool = False
+    low_hz: Optional[float] = None
+    high_hz: Optional[float] = None
+
+
+class WaterfallRegionResponse(BaseModel):
+    """Current capture region."""
+    crop: Optional[List[int]] = None
+    frequency_axis: Optional[List[float]] = None
+    window_size: Optional[List[int]] = None
+
+
+@router.get("/region", response_model=WaterfallRegionResponse)
+async def get_waterfall_region():
+    """Get the capture region (None means the whole FlDigi window)."""
+    status = waterfall_service.get_status()
+    return WaterfallRegionResponse(
+        crop=status["crop"], frequency_axis=status["frequency_axis"], window_size=status["window_size"]
+    )
+
+
+@router.post("/region", response_model=WaterfallRegionResponse)
+async def set_waterfall_region(request: WaterfallRegionRequest):
+    """
+    Set, auto-detect or clear the capture region.
+
+    Cropping to the waterfall means fewer pixels are captured, encoded and
+    sent per frame, and clicks tune by frequency (see the WebSocket). A crop
+    over the same columns as before keeps its frequency axis; any other
+    crop clears it unless one is given with it.
+    """
+    axis = (request.low_hz, request.high_hz)
+    if (request.low_hz is None) != (request.high_hz is None):
+        raise HTTPException(status_code=400, detail="Provide both low_hz and high_hz")
+
+    if request.clear:
+        waterfall_service.clear_crop()
+    elif request.auto:
+        try:
+            region = await waterfall_service.auto_detect_crop()
+        except RuntimeError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        if region is None:
+            raise HTTPException(
+                status_code=404,
+                detail="Could not find the waterfall in the FlDigi window"
+            )
+    elif None not in (request.x, request.y, request.width, request.height):
+        try:
+            waterfall_service.set_crop(request.x, request.y, request.width, request.height)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    elif None in axis:
+        raise HTTPException(
+            status_code=400,
+            detail="Provide x, y, width and height, low_hz and high_hz, or set auto or clear"
+        )
+
+    if None not in axis and not request.clear:
+        try:
+            waterfall_service.set_frequency_axis(*axis)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    status = waterfall_service.get_status()
+    return WaterfallRegionResponse(
+        crop=status["crop"], frequency_axis=status["frequency_axis"], window_size=status["window_size"]
+    )
+
+
+class WaterfallRecordingRequest(BaseModel):
+    """Request to start/stop recording the waterfall."""
+    enabled: bool
+
+
+class WaterfallRecordingStatus(BaseModel):
+    """Recorder state and what is on disk. oldest/newest are Unix seconds."""
+    recording: bool
+    directory: str
+    segments: int
+    bytes: int
+    max_bytes: int
+    max_age: float
+    oldest: Optional[float] = None
+    newest: Optional[float] = None
+    records_written: int = 0
+
+
+@router.get("/recording", response_model=WaterfallRecordingStatus)
+async def get_waterfall_recording():
+    """Get the recorder state and the span of the recording kept on disk."""
+    return WaterfallRecordingStatus(**waterfall_recorder.get_status())
+
+
+@router.post("/recording", response_model=WaterfallRecordingStatus)
+async def set_waterfall_recording(request: WaterfallRecordingRequest):
+    """
+    Start or stop recording.
+
+    The recorder receives frames while waterfall streaming is enabled;
+    old recordings are deleted by size and age (see backend/config.py).
+    """
+    try:
+        if request.enabled:
+            waterfall_recorder.start(waterfall_service)
+        else:
+            waterfall_recorder.stop()
+    except OSError as e:
+        raise HTTPException(status_code=500, detail=f"Failed to start recording: {e}")
+    return WaterfallRecordingStatus(**waterfall_recorder.get_status())
+
+
+@router.get("/mjpeg")
+async def waterfall_mjpeg(request: Request, tier: Optional[str] = None, width: Optional[int] = None):
+    """
+    Stream the waterfall as MJPEG (multipart/x-mixed-replace).
+
+    Works in an <img> tag, VLC or any browser without the JavaScript
+    client. Frames are the JPEG keyframes the WebSocket clients get, encoded
+    once for everyone at the same quality and resolution tier. tier and
+    width choose the resolution as in the WebSocket hello. A viewer that
+    reads slowly gets the latest frame, not a backlog.
+    """
+    if not waterfall_service.enabled:
+        raise HTTPException(status_code=503, detail="Waterfall streaming is not enabled")
+
+    sink = MjpegSink()
+    waterfall_service.add_subscriber(sink, full_frames=True)
+    try:
+        waterfall_service.set_subscriber_tier(sink, tier, width)
+    except ValueError as e:
+        waterfall_service.remove_subscriber(sink)
+        raise HTTPException(status_code=400, detail=str(e))
+
+    async def stream():
+        try:
+            while not await request.is_disconnected():
+                try:
+                    frame = await asyncio.wait_for(sink.next_frame(), 5.0)
+                except asyncio.TimeoutError:
+                    continue
+                # Part header and frame are yielded separately so the shared JPEG is not copied
+                yield b"--frame\r\nContent-Type: image/jpeg\r\nContent-Length: %d\r\n\r\n" % len(frame)
+                yield frame
+                yield b"\r\n"
+        finally:
+            waterfall_service.remove_subscriber(sink)
+
+    return StreamingResponse(
+        stream(),
+        media_type="multipart/x-mixed-replace; boundary=frame",
+        headers={"Cache-Control": "no-cache, no-store"}
+    )
+
+
 @router.websocket("/ws")
 async def waterfall_websocket(websocket: WebSocket):
     """
     WebSocket endpoint for receiving waterfall frames.
 
-    Clients connect to this endpoint to receive real-time JPEG frames
-    of the FlDigi waterfall window. Frames are sent as JSON with base64-encoded images.
+    Clients connect to this endpoint to receive real-time frames of the
+    FlDigi waterfall window. Frames are sent as binary messages: a 31-byte
+    little-endian header followed by the encoded image.
 
-    Message format:
-    {
-        "type": "waterfall_frame",
-        "image": "<base64-encoded JPEG>",
-        "timestamp": 1234567890.123
-    }
+    Header layout (see FRAME_HEADER in backend/waterfall_capture.py):
+        magic     2 bytes  b"WF"
+        version   uint8    4
+        kind      uint8    0 = keyframe, 1 = strip
+        timestamp float64  capture time, seconds since epoch
+        frame     uint32   frame number
+        width     uint16   full frame width
+        height    uint16   full frame height
+        scroll    int16    rows to shift the previous frame (+down, -up)
+        y         uint16   row where the image goes
+        rows      uint16   image height
+        base      uint32   frame number a strip applies on top of
+        codec     uint8    0 = jpeg, 1 = webp, 2 = png, 3 = indexed,
+                           4 = intensity
+                           (see backend/waterfall_codecs.py)
+
+    For a strip the client shifts its current image by scroll rows and
+    draws the image at y, provided it currently holds frame "base". A strip
+    with no rows (and no payload) is a keepalive sent while the waterfall is
+    not changing. A client that missed a frame can send
+    {"type": "keyframe_request"} to get a full frame.
+
+    Frame rate and quality adapt per connection: a client that cannot keep
+    up is sent fewer frames at lower quality instead of queuing them.
+
+    Clients should first send {"type": "hello", "codecs": [...]} listing
+    the codecs they can decode; the server answers with
+    {"type": "hello_ack", "codec": <chosen>, "tiers": [...]}. Without a
+    hello, frames are JPEG.
+
+    Frames are sent full size unless the hello includes "tier" (a width
+    from "tiers", or "full") or "width", the width in device pixels the
+    client displays frames at, in which case the smallest tier at least
+    that wide is used. Without either, the tier follows the canvasWidth
+    of mouse_click messages. Tiers scale the width only; the header's
+    width field gives the width actually sent.
+
+    Before a keyframe whose frequency axis or palette differs from what
+    the client last got, the server sends {"type": "meta", "width",
+    "low_hz", "high_hz", "palette"}: the audio frequencies at the left and
+    right edges (null when not cropped to the waterfall) and FlDigi's
+    palette stops for rendering intensity frames. A client asks for
+    intensity frames by offering only that codec in its hello.
+
+    {"type": "mouse_click", "x", "y", "canvasWidth", "canvasHeight"} tunes
+    FlDigi: when cropped to the waterfall, x is mapped onto the frequency
+    axis and the carrier set directly, and click_ack carries the "carrier"
+    in Hz. Otherwise a click is sent to the FlDigi window and "carrier" is
+    null.
+
+    Text messages (hello_ack, meta, click_ack, error) are JSON.
     """
     await websocket.accept()
 
@@ -123,22 +364,58 @@ async def waterfall_websocket(websocket: WebSocket):
                 message = await websocket.receive_json()
 
                 # Handle different message types
-                if message.get("type") == "mouse_click":
-                    # Send click to FlDigi window
+                if message.get("type") == "hello":
+                    codecs = message.get("codecs")
+                    codec = waterfall_service.set_subscriber_codecs(
+                        websocket, codecs if isinstance(codecs, list) else None
+                    )
+                    try:
+                        width = message.get("width")
+                        waterfall_service.set_subscriber_tier(
+                            websocket, message.get("tier"),
+                            int(width) if isinstance(width, (int, float)) else None
+                        )
+                    except ValueError as e:
+                        await websocket.send_json({"type": "error", "message": str(e)})
+                    await websocket.send_json({
+                        "type": "hello_ack",
+                        "codec": codec,
+                        "tiers": list(RESOLUTION_TIERS)
+                    })
+
+                elif message.get("type") == "keyframe_request":
+                    waterfall_service.request_keyframe(websocket)
+
+                elif message.get("type") == "mouse_click":
+                    # Tune FlDigi to the clicked frequency
                     x = message.get("x")
                     y = message.get("y")
                     canvas_width = message.get("canvasWidth")
                     canvas_height = message.get("canvasHeight")
 
                     if x is not None and y is not None and canvas_width and canvas_height:
-                        success = waterfall_service.send_mouse_click(
-                            int(x), int(y), int(canvas_width), int(canvas_height)
+                        # Clients without a hello width get a tier matching the canvas they click on
+                        waterfall_service.set_subscriber_tier(
+                            websocket, display_width=int(canvas_width), from_click=True
                         )
+                        # Set the carrier over XML-RPC when the click maps onto the
+                        # frequency axis; otherwise click in the FlDigi window
+                        carrier = waterfall_service.frequency_at(float(x), float(canvas_width))
+                        # XML-RPC blocks; a slow FLDIGI must not stall the event loop
+                        if carrier is not None and await asyncio.get_running_loop().run_in_executor(
+                                None, fldigi_client.set_carrier, carrier):
+                            success = True
+                        else:
+                            carrier = None
+                            success = waterfall_service.send_mouse_click(
+                                int(x), int(y), int(canvas_width), int(canvas_height)
+                            )
                         await websocket.send_json({
                             "type": "click_ack",
                             "success": success,
                             "x": x,
-                            "y": y
+                            "y": y,
+                            "carrier": carrier
                         })
                     else:
                         await websocket.send_json({
@@ -155,3 +432,64 @@ async def waterfall_websocket(websocket: WebSocket):
     finally:
         # Remove subscriber when connection closes
         waterfall_service.remove_subscriber(websocket)
+
+
+@router.websocket("/playback")
+async def waterfall_playback(websocket: WebSocket, start: Optional[float] = None, speed: float = 1.0):
+    """
+    WebSocket endpoint replaying the recorded waterfall.
+
+    Frames and meta messages are sent exactly as /api/waterfall/ws sent
+    them, from start (Unix seconds, default the oldest recording; negative
+    means that many seconds ago) at speed times real time. Playback starts
+    at the keyframe before start; the frames up to start are sent at once.
+    When it reaches the end it follows the recording live.
+
+    Send {"type": "seek", "start": ..., "speed": ...} to jump; each
+    (re)start is acknowledged with {"type": "playback", "start", "speed"}.
+    """
+    await websocket.accept()
+
+    async def play(position: Optional[float], rate: float):
+        if position is None:
+            position = waterfall_recorder.get_status()["oldest"] or time.time()
+        elif position < 0:
+            position += time.time()
+        try:
+            await websocket.send_json({"type": "playback", "start": position, "speed": rate})
+            async for is_meta, data in waterfall_recorder.play(position, rate):
+                if is_meta:
+                    await websocket.send_text(data.decode())
+                else:
+                    await websocket.send_bytes(data)
+            await websocket.send_json({"type": "playback_end"})
+        except Exception as e:
+            print(f"Error in waterfall playback: {e}")
+
+    player = None
+    try:
+        if speed <= 0:
+            await websocket.send_json({"type": "error", "message": "Playback speed must be positive"})
+        else:
+            player = asyncio.create_task(play(start, speed))
+
+        while True:
+            message = await websocket.receive_json()
+            if message.get("type") == "seek":
+                rate = message.get("speed", 1.0)
+                position = message.get("start")
+                if not isinstance(rate, (int, float)) or rate <= 0 or \
+                        (position is not None and not isinstance(position, (int, float))):
+                    await websocket.send_json({"type": "error", "message": "Invalid seek"})
+                    continue
+                if player:
+                    player.cancel()
+                player = asyncio.create_task(play(position, float(rate)))
+
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        print(f"Error in waterfall playback websocket: {e}")
+    finally:
+        if player:
+            player.cancel()
@@ -0,0 +1,339 @@
+"""
+NumPy helpers for analysing captured waterfall frames.
+
+Frames are HxWx3 uint8 RGB arrays (np.asarray(pil_image)).
+"""
+
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+# Region detection thresholds (0-255 scale)
+MIN_CHROMA = 12        # Mean max-min channel spread of a "colourful" waterfall row
+MIN_CHANGED = 0.05     # Fraction of pixels in a row that changed between frames
+MIN_REGION_HEIGHT = 16
+MIN_REGION_WIDTH = 64
+MAX_RUN_GAP = 2        # Rows/columns allowed to fail the test inside a run
+
+
+def _longest_run(mask: np.ndarray, max_gap: int = MAX_RUN_GAP) -> Optional[Tuple[int, int]]:
+    """Longest [start, end) run of True values, bridging gaps of up to max_gap."""
+    best = None
+    start = None
+    gap = 0
+    last_true = None
+    for i, value in enumerate(mask):
+        if value:
+            if start is None:
+                start = i
+            last_true = i
+            gap = 0
+        elif start is not None:
+            gap += 1
+            if gap > max_gap:
+                if best is None or last_true + 1 - start > best[1] - best[0]:
+                    best = (start, last_true + 1)
+                start = None
+                gap = 0
+    if start is not None and (best is None or last_true + 1 - start > best[1] - best[0]):
+        best = (start, last_true + 1)
+    return best
+
+
+def detect_waterfall_region(frames: List[np.ndarray]) -> Optional[Tuple[int, int, int, int]]:
+    """
+    Locate the waterfall inside full-window captures.
+
+    The waterfall is the largest block of pixels that is both colourful (the
+    palette is saturated, FLDIGI's widgets are mostly grey) and, when more
+    than one frame is given, changing between frames as it scrolls.
+
+    Returns (x, y, width, height) or None if nothing plausible was found.
+    """
+    if not frames:
+        return None
+
+    frame = frames[-1].astype(np.int16)
+    chroma = frame.max(axis=2) - frame.min(axis=2)
+    score = chroma >= MIN_CHROMA
+
+    if len(frames) > 1:
+        changed = np.zeros(chroma.shape, dtype=bool)
+        for previous in frames[:-1]:
+            if previous.shape == frames[-1].shape:
+                changed |= np.any(previous != frames[-1], axis=2)
+        if changed.any():
+            score &= changed | (chroma >= MIN_CHROMA * 2)
+            row_ok = changed.mean(axis=1) >= MIN_CHANGED
+        else:
+            row_ok = np.ones(chroma.shape[0], dtype=bool)
+    else:
+        row_ok = np.ones(chroma.shape[0], dtype=bool)
+
+    rows = _longest_run(row_ok & (score.mean(axis=1) >= 0.5))
+    if rows is None or rows[1] - rows[0] < MIN_REGION_HEIGHT:
+        return None
+
+    cols = _longest_run(score[rows[0]:rows[1]].mean(axis=0) >= 0.5)
+    if cols is None or cols[1] - cols[0] < MIN_REGION_WIDTH:
+        return None
+
+    return cols[0], rows[0], cols[1] - cols[0], rows[1] - rows[0]
+
+
+# Scroll detection
+SCROLL_SAMPLE_STEP = 4  # Compare every Nth column when searching for the shift
+
+
+def _row_keys(frame: np.ndarray) -> np.ndarray:
+    rows = np.ascontiguousarray(frame).reshape(frame.shape[0], -1)
+    return rows.view(np.dtype((np.void, rows.shape[1] * rows.itemsize))).ravel()
+
+
+def detect_scroll(previous: np.ndarray, current: np.ndarray, max_shift: int = 64) -> Optional[int]:
+    """
+    Find how many rows the waterfall scrolled between two frames.
+
+    A positive result means the content moved down by that many rows (new
+    rows exposed at the top, FlDigi's default); negative means it moved up.
+    Candidate shifts are tested on a column-subsampled copy of both frames,
+    and a match is verified against every pixel. Returns None if the
+    frames are not an exact scroll of each other (or are identical).
+    """
+    if previous.shape != current.shape:
+        return None
+
+    height = current.shape[0]
+    max_shift = min(max_shift, height // 2)
+    if max_shift < 1:
+        return None
+
+    # One opaque value per row so rows compare with a single ==
+    prev_rows = _row_keys(previous[:, ::SCROLL_SAMPLE_STEP])
+    cur_rows = _row_keys(current[:, ::SCROLL_SAMPLE_STEP])
+
+    # Smallest shift first; the sampled match is confirmed on every pixel
+    for shift in range(1, max_shift + 1):
+        for signed in (shift, -shift):
+            if signed > 0:
+                new, old = slice(signed, None), slice(None, height - signed)
+            else:
+                new, old = slice(None, height + signed), slice(-signed, None)
+            if np.array_equal(cur_rows[new], prev_rows[old]) and np.array_equal(current[new], previous[old]):
+                return signed
+
+    return None
+
+
+# Change detection
+FINGERPRINT_STEP = 4    # Keep every Nth row and column
+CHANGE_LEVEL = 24       # Per-channel difference that counts as a changed sample
+MIN_CHANGED_FRACTION = 0.001
+
+
+def frame_fingerprint(frame: np.ndarray, step: int = FINGERPRINT_STEP) -> np.ndarray:
+    """Cheap subsampled copy of a frame for change detection."""
+    return frame[::step, ::step].copy()
+
+
+def fingerprint_changed(previous: Optional[np.ndarray], current: np.ndarray,
+                        min_fraction: float = MIN_CHANGED_FRACTION) -> bool:
+    """
+    True if two fingerprints differ meaningfully.
+
+    Small differences (a blinking text cursor, dithering) are ignored; a
+    scrolling waterfall changes nearly every sample.
+    """
+    if previous is None or previous.shape != current.shape:
+        return True
+    diff = np.abs(previous.astype(np.int16) - current)
+    return np.count_nonzero(diff > CHANGE_LEVEL) >= max(1, min_fraction * diff.size)
+
+
+# Intensity extraction
+# FlDigi draws the waterfall by mapping each 0-255 signal level through a
+# 256-colour palette interpolated from 9 colour stops (levels 0, 32, ... 256).
+FLDIGI_PALETTE = (
+    (0, 0, 0),
+    (0, 0, 136),
+    (0, 19, 198),
+    (0, 32, 239),
+    (172, 167, 105),
+    (194, 198, 49),
+    (225, 228, 107),
+    (255, 255, 0),
+    (255, 51, 0),
+)
+LUT_BITS = 5  # Bits kept per channel when looking colours up (32768 entries)
+
+
+def load_palette(path: str) -> Tuple[Tuple[int, int, int], ...]:
+    """
+    Read a FlDigi .pal file: 9 lines of "r; g; b". Lines without three
+    numbers are ignored.
+    """
+    stops = []
+    with open(path) as f:
+        for line in f:
+            values = [int(v) for v in line.replace(";", " ").replace(",", " ").split() if v.isdigit()]
+            if len(values) == 3:
+                stops.append(tuple(min(255, v) for v in values))
+    if len(stops) != len(FLDIGI_PALETTE):
+        raise ValueError(f"{path}: expected {len(FLDIGI_PALETTE)} colours, found {len(stops)}")
+    return tuple(stops)
+
+
+def palette_colours(stops=FLDIGI_PALETTE) -> np.ndarray:
+    """The 256x3 uint8 colour table FlDigi interpolates from palette stops."""
+    stops = np.asarray(stops, dtype=np.float64)
+    positions = np.linspace(0, 256, len(stops))
+    levels = np.arange(256)
+    return np.stack(
+        [np.interp(levels, positions, stops[:, c]) for c in range(3)], axis=1
+    ).astype(np.uint8)
+
+
+def intensity_lut(stops=FLDIGI_PALETTE) -> np.ndarray:
+    """
+    Lookup table from a colour (LUT_BITS per channel, packed RGB) to the
+    signal level whose palette colour is nearest.
+    """
+    colours = palette_colours(stops).astype(np.int32)
+    size = 1 << LUT_BITS
+    centres = (np.arange(size, dtype=np.int32) << (8 - LUT_BITS)) + (1 << (7 - LUT_BITS))
+    r, g, b = np.meshgrid(centres, centres, centres, indexing="ij")
+    rgb = np.stack([r.ravel(), g.ravel(), b.ravel()], axis=1)
+
+    lut = np.empty(len(rgb), dtype=np.uint8)
+    # In chunks: the full distance matrix would be 32768x256
+    for start in range(0, len(rgb), 4096):
+        chunk = rgb[start:start + 4096, None, :] - colours[None, :, :]
+        lut[start:start + 4096] = np.argmin((chunk * chunk).sum(axis=2), axis=1)
+    return lut
+
+
+def to_intensity(frame: np.ndarray, lut: np.ndarray) -> np.ndarray:
+    """Map an HxWx3 RGB waterfall back to HxW uint8 signal levels."""
+    shift = 8 - LUT_BITS
+    keys = (frame[..., 0] >> shift).astype(np.uint16) << (2 * LUT_BITS)
+    keys |= (frame[..., 1] >> shift).astype(np.uint16) << LUT_BITS
+    keys |= frame[..., 2] >> shift
+    return lut[keys]
+
+
+# Carrier detection
+CARRIER_SMOOTHING = 0.15  # EWMA weight of one new row in the per-column average
+CARRIER_THRESHOLD = 20.0  # Average level above the noise floor (0-255) that counts as signal
+CARRIER_MAX_GAP = 2       # Columns below threshold allowed inside one carrier
+CARRIER_MIN_WIDTH = 2     # Narrower runs are noise spikes
+CARRIER_HOLD = 3.0        # Seconds a carrier is remembered after it was last seen
+
+
+class CarrierDetector:
+    """
+    Finds carriers in the rows a waterfall adds.
+
+    Each column (frequency bin) keeps an exponentially weighted average of
+    its signal level, so a carrier has to stay put for a few rows to stand
+    out and noise averages down. The median of the averages is the noise
+    floor; runs of columns more than threshold above it are carriers, each
+    reported at its level-weighted centre. Carriers are matched with the
+    ones found before so each has a persistence (seconds seen).
+
+    The work per update is a handful of vector operations on one row of
+    averages, whatever the frame height.
+    """
+
+    def __init__(self, smoothing: float = CARRIER_SMOOTHING, threshold: float = CARRIER_THRESHOLD,
+                 hold: float = CARRIER_HOLD):
+        self.smoothing = smoothing
+        self.threshold = threshold
+        self.hold = hold
+        self.average: Optional[np.ndarray] = None
+        self.noise_floor: Optional[float] = None
+        self._tracks: List[dict] = []  # centre, width, strength, first_seen, last_seen
+
+    def reset(self):
+        self.average = None
+        self.noise_floor = None
+        self._tracks = []
+
+    def update(self, levels: np.ndarray, now: float) -> List[dict]:
+        """
+        Add new waterfall rows (RxW uint8 signal levels, see to_intensity)
+        and return the carriers being tracked, strongest first: dicts with
+        column (centre, fractional), width (columns), strength (level above
+        the noise floor) and persistence (seconds).
+        """
+        if levels.ndim != 2 or levels.shape[0] == 0:
+            return self.carriers(now)
+        row = levels.mean(axis=0, dtype=np.float32)
+        if self.average is None or self.average.shape != row.shape:
+            self.reset()
+            self.average = row
+        else:
+            # n rows at once weigh the same as n single-row updates
+            weight = 1.0 - (1.0 - self.smoothing) ** levels.shape[0]
+            self.average += weight * (row - self.average)
+
+        self.noise_floor = float(np.median(self.average))
+        excess = self.average - self.noise_floor
+        self._track(self._find_runs(excess), now)
+        return self.carriers(now)
+
+    def _find_runs(self, excess: np.ndarray) -> List[Tuple[float, int, float]]:
+        """(centre, width, strength) of every run of columns above threshold."""
+        above = excess > self.threshold
+        if not above.any():
+            return []
+        edges = np.diff(np.concatenate(([0], above.view(np.int8), [0])))
+        starts = np.flatnonzero(edges == 1)
+        ends = np.flatnonzero(edges == -1)
+        # Join runs split by a short dip (a carrier's own sidebands)
+        keep = np.concatenate(([True], starts[1:] - ends[:-1] > CARRIER_MAX_GAP))
+        starts = starts[keep]
+        ends = np.concatenate((ends[np.flatnonzero(keep[1:])], ends[-1:]))
+
+        # Level-weighted centres from running sums: one pass for all runs
+        weights = np.clip(excess, 0, None)
+        mass = np.concatenate(([0.0], np.cumsum(weights, dtype=np.float64)))
+        moment = np.concatenate(([0.0], np.cumsum(weights * np.arange(len(excess)), dtype=np.float64)))
+        mass = mass[ends] - mass[starts]
+        moment = moment[ends] - moment[starts]
+
+        # Runs are separated by columns below threshold, so each run's peak is its segment's peak
+        peaks = np.maximum.reduceat(excess, starts)
+        return [
+            (float(m / w), int(e - s), float(p))
+            for s, e, w, m, p in zip(starts, ends, mass, moment, peaks)
+            if e - s >= CARRIER_MIN_WIDTH
+        ]
+
+    def _track(self, runs: List[Tuple[float, int, float]], now: float):
+        # Drop stale tracks first, so a carrier back after the hold starts afresh
+        self._tracks = [track for track in self._tracks if now - track["last_seen"] <= self.hold]
+        for centre, width, strength in runs:
+            tolerance = max(2.0, width / 2)
+            match = min(
+                (track for track in self._tracks if abs(track["centre"] - centre) <= tolerance),
+                key=lambda track: abs(track["centre"] - centre), default=None
+            )
+            if match is None:
+                self._tracks.append({
+                    "centre": centre, "width": width, "strength": strength,
+                    "first_seen": now, "last_seen": now
+                })
+            else:
+                match.update(centre=centre, width=width, strength=strength, last_seen=now)
+
+    def carriers(self, now: float) -> List[dict]:
+        current = [track for track in self._tracks if track["last_seen"] == now]
+        return [
+            {
+                "column": track["centre"],
+                "width": track["width"],
+                "strength": round(track["strength"], 1),
+                "persistence": round(now - track["first_seen"], 1)
+            }
+            for track in sorted(current, key=lambda track: -track["strength"])
+        ]
@@ -6,22 +6,30 @@ Works on both Linux (X11) and Windows. This is a BETA feature and disabled by de
 """
 
 import asyncio
-import base64
-import io
+import struct
 import sys
+import threading
 import time
-from typing import Optional, Tuple
+from collections import deque
+from typing import Optional, Tuple, List
 from pathlib import Path
 
+from backend.config import WATERFALL_CODECS, WATERFALL_ENCODE_PROCESSES, WATERFALL_PALETTE
+from backend.websocket_manager import manager
+
 # Platform-specific imports
 if sys.platform == "linux":
     # Linux: Use X11/Xlib
     try:
         from Xlib import X, display as xdisplay
         from Xlib.error import DisplayConnectionError
+        from backend.x11_damage import DamageTracker, intersect_rect
+        from backend.x11_windows import WindowFinder
         XLIB_AVAILABLE = True
     except ImportError:
         XLIB_AVAILABLE = False
+    # MIT-SHM fast path (ctypes, no extra dependency); falls back to get_image
+    from backend.x11_shm import ShmCapture
 else:
     XLIB_AVAILABLE = False
 
@@ -40,15 +48,190 @@ else:
     WIN32_AVAILABLE = False
 
 try:
-    from PIL import Image
+    from PIL import Image, ImageChops
+    from backend.waterfall_codecs import CODECS, DEFAULT_CODEC, available_codecs, negotiate_codec
+    from backend.waterfall_encode import ProcessEncoder, ThreadEncoder
     PIL_AVAILABLE = True
 except ImportError:
     PIL_AVAILABLE = False
 
+try:
+    import numpy as np
+    from backend.waterfall_analysis import (
+        CarrierDetector, detect_waterfall_region, detect_scroll, frame_fingerprint, fingerprint_changed,
+        load_palette, to_intensity
+    )
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+# Binary frame header sent in front of every encoded image on /api/waterfall/ws:
+# magic "WF", version, kind, timestamp (float64 seconds), frame number,
+# frame width, frame height, scroll (signed rows), strip y, strip rows,
+# base frame number (the frame a strip is applied on top of), codec id
+# (see backend/waterfall_codecs.py). Little-endian, 31 bytes.
+FRAME_HEADER = struct.Struct("<2sBBdIHHhHHIB")
+FRAME_MAGIC = b"WF"
+FRAME_VERSION = 4
+FRAME_KIND_KEYFRAME = 0  # The whole frame
+FRAME_KIND_STRIP = 1     # Scroll the previous frame, then draw the strip at y
+                         # (a strip with no rows and no payload is a keepalive)
+
+# Per-subscriber (fps, JPEG quality) steps, best first. Level 0 is capped at
+# the service's fps and jpeg_quality.
+ADAPTIVE_LEVELS = ((15, 75), (10, 60), (5, 45), (2, 35))
+ADAPT_INTERVAL = 2.0  # Seconds between level changes for one subscriber
+# Frame widths subscribers can ask for instead of full size. Only the width
+# is scaled, so scroll strips keep their exact row counts.
+RESOLUTION_TIERS = (1280, 800, 480)
+SEND_TIMEOUT = 10.0  # Drop a subscriber whose send stalls this long
+DAMAGE_MAX_MISSES = 3  # Timed captures with changes DAMAGE did not report before giving up on it
+CARRIER_ROWS = 4  # Newest rows fed to the carrier detector when a frame is not a plain scroll
+CARRIER_PUBLISH_INTERVAL = 1.0  # Most frequent "carriers" broadcasts on /ws, in seconds
+CARRIER_CHANGE_HZ = 10  # Carriers that moved less than this are not a change worth broadcasting
+CARRIER_CHANGE_FLOOR = 2  # Noise floor change (levels) worth broadcasting
+CARRIER_MIN_PERSISTENCE = 1.0  # Seconds a carrier must last before it is broadcast
+
+
+def _bgrx_to_rgb(buffer, stride: int, x: int, y: int, width: int, height: int,
+                 out: Optional["np.ndarray"] = None) -> "np.ndarray":
+    """
+    Convert a rectangle of a BGRX buffer (X11 ZPixmap, Windows DIB) to an
+    HxWx3 RGB array, writing into out when it already has the right shape.
+    Without NumPy it is converted to an RGB PIL image instead.
+    """
+    if not NUMPY_AVAILABLE:
+        image = Image.frombuffer("RGB", (stride // 4, y + height), buffer, "raw", "BGRX", stride, 1)
+        return image.crop((x, y, x + width, y + height))
+    rows = np.frombuffer(buffer, dtype=np.uint8, count=stride * (y + height)).reshape(y + height, stride)
+    bgrx = rows[y:, x * 4:(x + width) * 4].reshape(height, width, 4)
+    if out is None or out.shape != (height, width, 3):
+        out = np.empty((height, width, 3), dtype=np.uint8)
+    np.copyto(out, bgrx[:, :, 2::-1])
+    return out
+
+
+class CapturedFrame:
+    """One capture plus what the analysis found, shared by all subscribers."""
+
+    __slots__ = ("image", "timestamp", "number", "changed", "scroll")
+
+    def __init__(self, image, timestamp: float, number: int, changed: bool, scroll: Optional[int]):
+        self.image = image
+        self.timestamp = timestamp
+        self.number = number  # Frame number subscribers will hold after this frame
+        self.changed = changed
+        self.scroll = scroll  # Rows scrolled since the previous changed frame, None = not a scroll
+
+    def absorb(self, older: "CapturedFrame"):
+        """
+        Fold in a frame that was replaced before it was distributed, so the
+        scroll it carried is not lost.
+        """
+        if not older.changed:
+            return
+        if not self.changed:
+            self.changed = True
+            self.scroll = older.scroll
+        elif self.scroll is None or older.scroll is None or (self.scroll > 0) != (older.scroll > 0):
+            self.scroll = None
+        else:
+            self.scroll += older.scroll
+
+
+class MjpegSink:
+    """
+    Stands in for a WebSocket for one /api/waterfall/mjpeg response.
+
+    Frames land in a latest-wins slot: a viewer that reads slowly skips
+    frames instead of queuing them.
+    """
+
+    def __init__(self):
+        self._frame = None
+        self._ready = asyncio.Event()
+
+    async def send_bytes(self, data: bytes):
+        self._frame = data
+        self._ready.set()
+
+    async def send_json(self, data: dict):
+        pass
+
+    async def next_frame(self) -> bytes:
+        await self._ready.wait()
+        self._ready.clear()
+        frame, self._frame = self._frame, None
+        return frame
+
+
+class WaterfallSubscriber:
+    """
+    Stream state for one /api/waterfall/ws connection (or MJPEG viewer).
+
+    Each subscriber has its own rate and quality level, adjusted from how
+    long its sends take and whether it was still busy when a frame was due.
+    Frames it cannot take are skipped, not queued; scrolls from skipped
+    frames are accumulated so the next strip still lines up.
+    """
+
+    def __init__(self, websocket, full_frames: bool = False):
+        self.websocket = websocket
+        self.full_frames = full_frames  # Whole JPEG frames without headers (MJPEG)
+        self.level = 0
+        self.in_flight = 0  # Sends started and not finished (they run one after another)
+        self.send_task = None  # Latest send; the next one waits for it
+        self.send_ms = None  # Smoothed send time
+        self.last_sent_time = 0.0
+        self.last_keyframe_time = 0.0
+        self.last_adjust_time = time.time()
+        self.backlog_skips = 0  # Frames due while a send was still in flight
+        self.frame_number = 0  # Frame the client currently holds
+        self.pending_scroll = 0  # Rows scrolled since frame_number
+        self.needs_keyframe = True
+        self.codec = "jpeg" if full_frames else DEFAULT_CODEC
+        self.meta = None  # Last meta message sent (frequency axis, palette)
+        self.requested_tier = None  # Width asked for in hello (0 = full size), None = pick from display_width
+        self.display_width = None  # Width the client shows frames at, from hello or mouse clicks
+        self.display_width_from_hello = False
+        self.tier = 0  # Width frames are currently sent at, 0 = full size
+        self.frames_sent = 0
+        self.frames_skipped = 0
+
+    def advance(self, frame: CapturedFrame):
+        """Account for a changed frame, whether or not it is sent to this subscriber."""
+        if self.needs_keyframe:
+            return
+        scroll = frame.scroll
+        if scroll is None or (self.pending_scroll and (scroll > 0) != (self.pending_scroll > 0)):
+            self.needs_keyframe = True
+            self.pending_scroll = 0
+        else:
+            self.pending_scroll += scroll
+
+    def record_send(self, elapsed_ms: float):
+        if self.send_ms is None:
+            self.send_ms = elapsed_ms
+        else:
+            self.send_ms = 0.8 * self.send_ms + 0.2 * elapsed_ms
+
+    def to_dict(self, fps: float, quality: int) -> dict:
+        return {
+            "level": self.level,
+            "codec": "mjpeg" if self.full_frames else self.codec,
+            "tier": self.tier,
+            "fps": fps,
+            "quality": quality,
+            "send_ms": round(self.send_ms, 2) if self.send_ms is not None else None,
+            "frames_sent": self.frames_sent,
+            "frames_skipped": self.frames_skipped
+        }
+
 
 class WaterfallCaptureService:
     """
-    Service to capture FlDigi waterfall window and stream it as JPEG images.
+    Service to capture FlDigi waterfall window and stream it as JPEG (or
+    another negotiated codec) images.
 
     This is disabled by default and only runs when explicitly enabled by user
     in the beta features settings.
@@ -60,11 +243,58 @@ class WaterfallCaptureService:
         self.display = None
         self.window = None
         self.window_id = None
-        self.capture_task = None
-        self.subscribers = set()  # WebSocket connections to stream to
+        self.capture_task = None  # Distribution task on the event loop
+        self.capture_thread = None  # Dedicated capture/analysis thread
+        self.encoder = None  # ThreadEncoder or ProcessEncoder, overlaps with capture
+        self.encode_processes = WATERFALL_ENCODE_PROCESSES  # 0 = encode on one thread
+        self.send_task = None  # Sends encoded frames in capture order
+        self._encoded = deque()  # (frame, plans, encode task, start time), oldest first
+        self._encoded_ready = None  # asyncio.Event: a frame was queued for encoding
+        self._encode_slots = None  # asyncio.Semaphore limiting frames in flight
+        self._encode_sequence = 0
+        self._stop_event = threading.Event()
+        self._wake_event = threading.Event()
+        self._capture_lock = threading.Lock()  # One grab at a time (capture thread vs auto-detect)
+        self._frame_lock = threading.Lock()
+        self._pending_frame = None  # Latest captured frame not yet distributed
+        self._frame_ready = None  # asyncio.Event set from the capture thread
+        self._loop = None
+        self._frame_buffer = None  # Reused RGB array the capture thread converts into
+        self._last_image = None  # PIL image of the last changed frame
+        self.stage_ms = {}  # Smoothed per-stage timings: capture, analyze, encode
+        self.capture_fps = None
+        self.subscribers = {}  # WebSocket -> WaterfallSubscriber
         self.fps = 15  # Target frames per second (conservative for waterfall)
         self.jpeg_quality = 75  # Balance between quality and bandwidth
         self.last_window_size = None  # Cache window size for coordinate conversion
+        self.window_finder = None  # WindowFinder (Linux)
+        self.use_shm = True  # Try MIT-SHM capture on Linux before get_image
+        self.shm = None
+        self.use_damage = True  # Capture on X DAMAGE events on Linux instead of a fixed timer
+        self.damage = None  # DamageTracker for the current window
+        self.damage_fallback_interval = 1.0  # Capture anyway after this long without damage
+        self.capture_trigger = None  # "damage" or "timer"
+        self.capture_method = None
+        self.capture_ms = None  # Smoothed per-frame capture time (excludes encoding)
+        self.last_capture_ms = None
+        self.crop = None  # (x, y, width, height) in window coordinates, None = whole window
+        self.frequency_axis = None  # (low_hz, high_hz) at the left and right edges of the crop
+        self._crop_axis = None  # ((x, width), axis): the last axis set and the window columns it spans
+        self.last_capture_rect = None  # Region actually captured for the last frame
+        self.frame_number = 0
+        self.keyframe_interval = 5.0  # Seconds between full frames while scrolling
+        self.max_scroll = 64  # Largest accumulated scroll sent as a strip
+        self.previous_frame = None  # numpy copy of the last changed frame
+        self.keepalive_interval = 2.0  # Send a header-only frame this often when nothing changes
+        self.last_fingerprint = None  # Fingerprint of the last changed frame
+        self.keyframes_sent = 0
+        self.strips_sent = 0
+        self.frames_sent = 0
+        self.frames_skipped = 0
+        self.carrier_detector = CarrierDetector() if NUMPY_AVAILABLE else None
+        self.carriers = []  # Latest detected carriers (see _detect_carriers), replaced as a whole
+        self._carriers_published = 0.0
+        self._carriers_sent = None  # (frequencies, noise floor) of the last "carriers" broadcast
 
     def is_available(self) -> bool:
         """Check if waterfall capture is available on this system."""
@@ -83,9 +313,41 @@ class WaterfallCaptureService:
             "running": self.running,
             "window_found": self.window is not None,
             "subscribers": len(self.subscribers),
-            "platform": sys.platform
+            "platform": sys.platform,
+            "capture_method": self.capture_method,
+            "capture_trigger": self.capture_trigger,
+            "capture_ms": round(self.capture_ms, 2) if self.capture_ms is not None else None,
+            "last_capture_ms": round(self.last_capture_ms, 2) if self.last_capture_ms is not None else None,
+            "stage_ms": {stage: round(ms, 2) for stage, ms in self.stage_ms.items()},
+            "capture_fps": round(self.capture_fps, 1) if self.capture_fps is not None else None,
+            "crop": list(self.crop) if self.crop else None,
+            "frequency_axis": list(self.frequency_axis) if self.frequency_axis else None,
+            "window_size": list(self.last_window_size) if self.last_window_size else None,
+            "keyframes_sent": self.keyframes_sent,
+            "strips_sent": self.strips_sent,
+            "frames_sent": self.frames_sent,
+            "frames_skipped": self.frames_skipped,
+            "codecs": available_codecs() if PIL_AVAILABLE else [],
+            "tiers": list(RESOLUTION_TIERS),
+            "carriers": self.carriers,
+            "clients": [
+                sub.to_dict(self._subscriber_fps(sub), self._subscriber_quality(sub))
+                for sub in self.subscribers.values()
+            ]
         }
 
+    def _record_stage(self, stage: str, start: float):
+        """Update smoothed timing for a pipeline stage from a time.perf_counter() start value."""
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        previous = self.stage_ms.get(stage)
+        self.stage_ms[stage] = elapsed_ms if previous is None else 0.9 * previous + 0.1 * elapsed_ms
+
+    def _record_capture_time(self, start: float):
+        """Update capture timing stats from a time.perf_counter() start value."""
+        self._record_stage("capture", start)
+        self.last_capture_ms = (time.perf_counter() - start) * 1000
+        self.capture_ms = self.stage_ms["capture"]
+
     async def enable(self):
         """Enable the waterfall capture service."""
         if not self.is_available():
@@ -97,94 +359,394 @@ class WaterfallCaptureService:
 
         self.enabled = True
 
-        # Start capture loop if not already running
+        if WATERFALL_PALETTE and NUMPY_AVAILABLE:
+            try:
+                CODECS["intensity"].set_palette(load_palette(WATERFALL_PALETTE))
+            except (OSError, ValueError) as e:
+                print(f"Error loading waterfall palette, using FlDigi's default: {e}")
+
+        # Start capture thread and distribution loop if not already running
         if not self.running:
+            self.running = True
+            self._loop = asyncio.get_running_loop()
+            self._frame_ready = asyncio.Event()
+            self._stop_event.clear()
+            self.encoder = self._create_encoder()
+            self._encode_slots = asyncio.Semaphore(self.encoder.depth)
+            self._encoded_ready = asyncio.Event()
+            self.capture_thread = threading.Thread(
+                target=self._capture_thread_main, name="waterfall-capture", daemon=True
+            )
+            self.capture_thread.start()
             self.capture_task = asyncio.create_task(self._capture_loop())
+            self.send_task = asyncio.create_task(self._send_loop())
 
     async def disable(self):
         """Disable the waterfall capture service."""
         self.enabled = False
 
-        # Stop capture loop
-        if self.capture_task:
-            self.capture_task.cancel()
-            try:
-                await self.capture_task
-            except asyncio.CancelledError:
-                pass
-            self.capture_task = None
+        # Stop capture and send loops
+        for task in (self.capture_task, self.send_task):
+            if task:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self.capture_task = None
+        self.send_task = None
+
+        while self._encoded:
+            self._encoded.popleft()[2].cancel()
+        if self.encoder:
+            self.encoder.shutdown()
+            self.encoder = None
+
+        # Stop the capture thread before closing the connections it uses
+        self._stop_event.set()
+        self._wake_event.set()
+        if self.capture_thread:
+            await asyncio.get_running_loop().run_in_executor(None, self.capture_thread.join, 5.0)
+            self.capture_thread = None
+        self._pending_frame = None
+
+        # Close X11 connections
+        if self.window_finder:
+            self.window_finder.close()
+            self.window_finder = None
+
+        if self.damage:
+            self.damage.close()
+            self.damage = None
+
+        if self.shm:
+            self.shm.close()
+            self.shm = None
 
-        # Close X11 connection
         if self.display:
             self.display.close()
             self.display = None
             self.window = None
             self.window_id = None
 
+        self.previous_frame = None
+        self.last_fingerprint = None
+        self._frame_buffer = None
+        self._last_image = None
         self.running = False
 
-    def add_subscriber(self, websocket):
-        """Add a WebSocket subscriber to receive frames."""
-        self.subscribers.add(websocket)
+    def add_subscriber(self, websocket, full_frames: bool = False):
+        """
+        Add a WebSocket subscriber to receive frames. With full_frames (an
+        MjpegSink), every frame is sent as a whole JPEG without a header.
+        """
+        self.subscribers[websocket] = WaterfallSubscriber(websocket, full_frames)
+        self._wake_event.set()
+
+    def request_keyframe(self, websocket=None):
+        """Send the next frame in full, to one subscriber or to all of them."""
+        if websocket is None:
+            targets = self.subscribers.values()
+        else:
+            targets = [self.subscribers[websocket]] if websocket in self.subscribers else []
+        for sub in targets:
+            sub.needs_keyframe = True
+        # Don't wait for the window to change before sending it
+        self._wake_event.set()
 
     def remove_subscriber(self, websocket):
         """Remove a WebSocket subscriber."""
-        self.subscribers.discard(websocket)
+        self.subscribers.pop(websocket, None)
 
-    def _find_fldigi_window(self) -> Optional[int]:
+    def set_subscriber_codecs(self, websocket, client_codecs: Optional[List[str]]) -> str:
         """
-        Find the FlDigi window by searching for window titles.
-        Returns the window ID if found, None otherwise.
+        Choose a codec for a subscriber from the codecs its client can decode,
+        in the server's WATERFALL_CODECS preference order. Returns the codec name.
         """
-        try:
-            if not self.display:
-                self.display = xdisplay.Display()
+        sub = self.subscribers.get(websocket)
+        codec = negotiate_codec(client_codecs, WATERFALL_CODECS)
+        if sub and sub.codec != codec:
+            sub.codec = codec
+            sub.needs_keyframe = True
+        return codec
+
+    def set_subscriber_tier(self, websocket, tier=None, display_width: Optional[int] = None,
+                            from_click: bool = False):
+        """
+        Choose the resolution a subscriber is sent.
 
-            root = self.display.screen().root
+        tier is a width from RESOLUTION_TIERS, or 0 / "full" for full size;
+        otherwise the tier is picked from display_width, the width the client
+        shows frames at. Widths inferred from mouse clicks (from_click) never
+        override one the client stated in its hello.
+        """
+        sub = self.subscribers.get(websocket)
+        if not sub:
+            return
+        if tier is not None:
+            tier = 0 if tier == "full" else int(tier)
+            if tier and tier not in RESOLUTION_TIERS:
+                raise ValueError(f"Unknown tier {tier}; use one of {list(RESOLUTION_TIERS)} or 'full'")
+            sub.requested_tier = tier
+        if display_width and display_width > 0:
+            if from_click and sub.display_width_from_hello:
+                return
+            sub.display_width = int(display_width)
+            sub.display_width_from_hello = not from_click
+
+    def _subscriber_tier(self, sub: WaterfallSubscriber, frame_width: int) -> int:
+        """Width to send a subscriber frames at: the smallest tier covering its display, 0 for full size."""
+        if sub.requested_tier is not None:
+            tier = sub.requested_tier
+        elif sub.display_width:
+            tier = min((width for width in RESOLUTION_TIERS if width >= sub.display_width), default=0)
+        else:
+            tier = 0
+        return tier if tier < frame_width else 0
 
-            # Get list of all windows using _NET_CLIENT_LIST
-            try:
-                window_list_atom = self.display.intern_atom('_NET_CLIENT_LIST')
-                window_list = root.get_full_property(
-                    window_list_atom,
-                    X.AnyPropertyType
-                )
+    def _subscriber_fps(self, sub: WaterfallSubscriber) -> float:
+        return min(ADAPTIVE_LEVELS[sub.level][0], self.fps)
 
-                if window_list:
-                    for window_id in window_list.value:
-                        try:
-                            window = self.display.create_resource_object('window', window_id)
-                            window_name = window.get_wm_name()
-
-                            # Look for FlDigi in window title
-                            if window_name and 'fldigi' in window_name.lower():
-                                return window_id
-                        except Exception:
-                            continue
-            except Exception:
-                pass
+    def _subscriber_quality(self, sub: WaterfallSubscriber) -> int:
+        return min(ADAPTIVE_LEVELS[sub.level][1], self.jpeg_quality)
 
-            # Fallback: Try to find by iterating through windows
-            def search_windows(win):
-                try:
-                    window_name = win.get_wm_name()
-                    if window_name and 'fldigi' in window_name.lower():
-                        return win.id
-
-                    # Search children
-                    children = win.query_tree().children
-                    for child in children:
-                        result = search_windows(child)
-                        if result:
-                            return result
-                except Exception:
-                    pass
-                return None
+    def _adapt(self, sub: WaterfallSubscriber, now: float):
+        """
+        Step a subscriber's level down when it falls behind, up when it has
+        headroom. Changes at most once per ADAPT_INTERVAL.
+        """
+        if now - sub.last_adjust_time < ADAPT_INTERVAL:
+            return
+
+        busy = (sub.send_ms or 0) / 1000 * self._subscriber_fps(sub)
+        if (sub.backlog_skips or busy > 0.8) and sub.level < len(ADAPTIVE_LEVELS) - 1:
+            sub.level += 1
+        elif not sub.backlog_skips and busy < 0.3 and sub.level > 0:
+            sub.level -= 1
+        sub.backlog_skips = 0
+        sub.last_adjust_time = now
+
+    def set_crop(self, x: int, y: int, width: int, height: int):
+        """
+        Restrict capture to a rectangle of the FlDigi window (window coordinates).
+
+        The rectangle is clamped to the window on every frame, so it survives
+        the window being resized smaller. The frequency axis is kept (or
+        restored after clear_crop) when the crop spans the same columns it
+        was set for, as an auto-detected crop of the same waterfall does.
+        """
+        if width <= 0 or height <= 0 or x < 0 or y < 0:
+            raise ValueError("Crop rectangle must have a non-negative origin and positive size")
+        self.crop = (int(x), int(y), int(width), int(height))
+        if self._crop_axis and self._crop_axis[0] == (self.crop[0], self.crop[2]):
+            self.frequency_axis = self._crop_axis[1]
+        else:
+            self.frequency_axis = None
+        self._reset_carriers()
+        self.request_keyframe()
+
+    def clear_crop(self):
+        """Capture the whole FlDigi window again."""
+        self.crop = None
+        self.frequency_axis = None
+        self._reset_carriers()
+        self.request_keyframe()
+
+    def set_frequency_axis(self, low_hz: float, high_hz: float):
+        """
+        Set the audio frequencies at the left and right edges of the crop.
+
+        Sent to clients in the meta message ahead of their next keyframe.
+        """
+        if not self.crop:
+            raise ValueError("Set a crop to the waterfall before its frequency axis")
+        if low_hz < 0 or high_hz <= low_hz:
+            raise ValueError("Frequency axis needs 0 <= low_hz < high_hz")
+        self.frequency_axis = (float(low_hz), float(high_hz))
+        self._crop_axis = ((self.crop[0], self.crop[2]), self.frequency_axis)
+        self._reset_carriers()
+        self.request_keyframe()
+
+    def frequency_at(self, canvas_x: float, canvas_width: float) -> Optional[int]:
+        """
+        Audio frequency under a point on a canvas showing the frames, or
+        None until a frequency axis is set. FlDigi's zoom and offset are not
+        visible in the pixels, so no scale is guessed.
+
+        Frames are only ever scaled horizontally as a whole, so the position
+        across the canvas maps straight onto the frequency axis.
+        """
+        if canvas_width <= 0 or self.frequency_axis is None:
+            return None
+        low, high = self.frequency_axis
+        fraction = min(max(canvas_x / canvas_width, 0.0), 1.0)
+        return int(round(low + (high - low) * fraction))
+
+    def _reset_carriers(self):
+        if self.carrier_detector:
+            self.carrier_detector.reset()
+        self.carriers = []
+        self._carriers_sent = None
+
+    def _detect_carriers(self, pixels: "np.ndarray", scroll: Optional[int], now: float):
+        """
+        Feed the newest waterfall rows to the carrier detector (capture
+        thread). Only runs once the crop has a frequency axis, so columns map
+        to frequencies; a scroll's exposed rows are exactly the new ones.
+        """
+        if self.frequency_axis is None or not self.carrier_detector:
+            return
+        if scroll is None:
+            rows = pixels[:CARRIER_ROWS]
+        elif scroll > 0:
+            rows = pixels[:scroll]
+        else:
+            rows = pixels[scroll:]
+        found = self.carrier_detector.update(to_intensity(rows, CODECS["intensity"].lut()), now)
+
+        width = pixels.shape[1]
+        low, high = self.frequency_axis
+        hz_per_column = (high - low) / width
+        self.carriers = [
+            {
+                "frequency": int(round(low + (carrier["column"] + 0.5) * hz_per_column)),
+                "bandwidth": int(round(carrier["width"] * hz_per_column)),
+                "strength": carrier["strength"],
+                "persistence": carrier["persistence"]
+            }
+            for carrier in found
+        ]
+
+    def _carriers_changed(self, frequencies: List[int], noise_floor: Optional[float]) -> bool:
+        if self._carriers_sent is None:
+            return True
+        sent_frequencies, sent_floor = self._carriers_sent
+        if len(frequencies) != len(sent_frequencies):
+            return True
+        if (noise_floor is None) != (sent_floor is None) or \
+                (noise_floor is not None and abs(noise_floor - sent_floor) >= CARRIER_CHANGE_FLOOR):
+            return True
+        return any(abs(a - b) >= CARRIER_CHANGE_HZ for a, b in zip(sorted(frequencies), sorted(sent_frequencies)))
+
+    async def _publish_carriers(self, now: float):
+        """
+        Broadcast the carriers that have lasted CARRIER_MIN_PERSISTENCE to
+        /ws clients, only when that set or the noise floor changed and at
+        most every CARRIER_PUBLISH_INTERVAL. Strength and persistence alone
+        changing is not broadcast; the status has the current values.
+        """
+        if (self.carrier_detector is None or self.frequency_axis is None
+                or now - self._carriers_published < CARRIER_PUBLISH_INTERVAL):
+            return
+        carriers = [carrier for carrier in self.carriers if carrier["persistence"] >= CARRIER_MIN_PERSISTENCE]
+        noise_floor = self.carrier_detector.noise_floor
+        frequencies = [carrier["frequency"] for carrier in carriers]
+        if not self._carriers_changed(frequencies, noise_floor):
+            return
+        self._carriers_published = now
+        self._carriers_sent = (frequencies, noise_floor)
+        await manager.broadcast_json({
+            "carriers": carriers,
+            "noise_floor": round(noise_floor, 1) if noise_floor is not None else None
+        }, "carriers")
+
+    def _frame_meta(self, width: int) -> dict:
+        """
+        Meta message describing the frames: whether they are cropped to the
+        waterfall, the frequency axis across their width (None until one is
+        set for the crop) and the FlDigi palette for intensity frames.
+        """
+        axis = self.frequency_axis
+        return {
+            "type": "meta",
+            "width": width,
+            "cropped": self.crop is not None,
+            "low_hz": axis[0] if axis else None,
+            "high_hz": axis[1] if axis else None,
+            "palette": [list(stop) for stop in CODECS["intensity"].palette] if NUMPY_AVAILABLE else None
+        }
+
+    async def auto_detect_crop(self, samples: int = 3, interval: float = 0.25) -> Optional[Tuple[int, int, int, int]]:
+        """
+        Find the waterfall inside the FlDigi window and crop to it.
+
+        Takes a few full-window captures and picks the largest colourful,
+        changing block of pixels (see detect_waterfall_region). Returns the
+        new crop, or None if nothing was found (the crop is left unchanged).
+        """
+        if not NUMPY_AVAILABLE:
+            raise RuntimeError("Waterfall auto-detection requires NumPy")
+
+        loop = asyncio.get_event_loop()
+        frames = []
+        for i in range(samples):
+            if i:
+                await asyncio.sleep(interval)
+            pixels = await loop.run_in_executor(None, self._capture_pixels, True)
+            if pixels is not None:
+                frames.append(pixels)
+
+        if not frames:
+            return None
+
+        region = await loop.run_in_executor(None, detect_waterfall_region, frames)
+        if region:
+            self.set_crop(*region)
+        return region
+
+    def _capture_rect(self, window_width: int, window_height: int, full: bool = False) -> Tuple[int, int, int, int]:
+        """Region of the window to capture, with the crop clamped to the window."""
+        if full or not self.crop:
+            return 0, 0, window_width, window_height
+
+        x, y, width, height = self.crop
+        x = min(x, window_width - 1)
+        y = min(y, window_height - 1)
+        return x, y, max(1, min(width, window_width - x)), max(1, min(height, window_height - y))
+
+    def _canvas_to_window(self, canvas_x: int, canvas_y: int, canvas_width: int, canvas_height: int) -> Tuple[int, int]:
+        """
+        Convert canvas coordinates to window coordinates.
+
+        The canvas shows the last captured region (which may be a crop), so the
+        click is scaled to that region and offset by its origin.
+        """
+        if self.last_capture_rect:
+            rect_x, rect_y, rect_width, rect_height = self.last_capture_rect
+        else:
+            rect_x, rect_y = 0, 0
+            rect_width, rect_height = self.last_window_size
+
+        # Canvas might be scaled differently than actual window
+        window_x = rect_x + int(canvas_x * rect_width / canvas_width)
+        window_y = rect_y + int(canvas_y * rect_height / canvas_height)
 
-            return search_windows(root)
+        # Clamp coordinates to the captured region
+        window_x = max(rect_x, min(window_x, rect_x + rect_width - 1))
+        window_y = max(rect_y, min(window_y, rect_y + rect_height - 1))
+        return window_x, window_y
+
+    def _find_fldigi_window(self) -> Optional[int]:
+        """
+        Find the FlDigi window by its title.
+
+        The window is remembered and kept up to date from X events by
+        WindowFinder (backend/x11_windows.py), so this is cheap enough to call
+        for every frame; searches are rate-limited and the tree walk bounded.
+        Returns the window ID if found, None otherwise.
+        """
+        try:
+            if not self.display:
+                self.display = xdisplay.Display()
+            if self.window_finder is None:
+                self.window_finder = WindowFinder()
+            return self.window_finder.find()
 
         except Exception as e:
             print(f"Error finding FlDigi window: {e}")
+            if self.window_finder:
+                self.window_finder.close()
+                self.window_finder = None
             return None
 
     def _find_fldigi_window_windows(self) -> Optional[int]:
@@ -219,9 +781,10 @@ class WaterfallCaptureService:
             print(f"Error finding FlDigi window on Windows: {e}")
             return None
 
-    def _capture_window_windows(self) -> Optional[bytes]:
+    def _capture_window_windows(self, full: bool = False, out: Optional["np.ndarray"] = None) -> Optional["np.ndarray"]:
         """
-        Capture the FlDigi window on Windows and return as JPEG bytes.
+        Capture the FlDigi window on Windows as an RGB array, cropped to the
+        capture region unless full is True.
         Returns None if capture fails.
         """
         if sys.platform != "win32" or not WIN32_AVAILABLE:
@@ -242,6 +805,8 @@ class WaterfallCaptureService:
             width = client_rect[2] - client_rect[0]
             height = client_rect[3] - client_rect[1]
 
+            capture_start = time.perf_counter()
+
             # Create device contexts
             hwnd_dc = win32gui.GetWindowDC(hwnd)
             mfc_dc = win32ui.CreateDCFromHandle(hwnd_dc)
@@ -256,34 +821,29 @@ class WaterfallCaptureService:
             # PW_CLIENTONLY (1) = capture only client area
             windll.user32.PrintWindow(hwnd, save_dc.GetSafeHdc(), 1)
 
-            # Convert bitmap to PIL Image
+            # Read bitmap bits (BGRX)
             bmpinfo = save_bitmap.GetInfo()
             bmpstr = save_bitmap.GetBitmapBits(True)
 
-            image = Image.frombuffer(
-                'RGB',
-                (bmpinfo['bmWidth'], bmpinfo['bmHeight']),
-                bmpstr,
-                'raw',
-                'BGRX',
-                0,
-                1
-            )
-
             # Cleanup GDI objects
             win32gui.DeleteObject(save_bitmap.GetHandle())
             save_dc.DeleteDC()
             mfc_dc.DeleteDC()
             win32gui.ReleaseDC(hwnd, hwnd_dc)
 
-            # Cache CLIENT area size for click coordinate conversion
-            self.last_window_size = (width, height)
+            # PrintWindow always renders the whole client area; crop while converting
+            x, y, crop_width, crop_height = self._capture_rect(width, height, full)
+            pixels = _bgrx_to_rgb(bmpstr, bmpinfo['bmWidthBytes'], x, y, crop_width, crop_height, out)
+
+            self.capture_method = "printwindow"
+            self._record_capture_time(capture_start)
 
-            # Encode as JPEG
-            buffer = io.BytesIO()
-            image.save(buffer, format="JPEG", quality=self.jpeg_quality, optimize=True)
+            # Cache CLIENT area size and captured region for click coordinate conversion
+            self.last_window_size = (width, height)
+            if not full:
+                self.last_capture_rect = (x, y, crop_width, crop_height)
 
-            return buffer.getvalue()
+            return pixels
 
         except Exception as e:
             # Window might have been closed or moved
@@ -291,70 +851,254 @@ class WaterfallCaptureService:
             self.window_id = None
             return None
 
-    def _capture_window(self) -> Optional[bytes]:
+    def _capture_pixels(self, full: bool = False, out: Optional["np.ndarray"] = None,
+                        damage: Optional[Tuple[int, int, int, int]] = None) -> Optional["np.ndarray"]:
         """
-        Capture the FlDigi window and return as JPEG bytes.
+        Capture the FlDigi window (or its crop region) as an HxWx3 RGB array.
         Platform-agnostic wrapper that calls the appropriate platform-specific method.
-        Returns None if capture fails.
+        Pixels are converted into out when it has the right shape, otherwise
+        into a new array. On Linux, damage (a window rectangle) limits the
+        grab to that part of out. Returns None if capture fails.
         """
-        if sys.platform == "linux":
-            return self._capture_window_linux()
-        elif sys.platform == "win32":
-            return self._capture_window_windows()
+        with self._capture_lock:
+            if sys.platform == "linux":
+                return self._capture_window_linux(full, out, damage)
+            elif sys.platform == "win32":
+                return self._capture_window_windows(full, out)
+            else:
+                return None
+
+    def _create_encoder(self):
+        """A process pool encoder if encode_processes is set and it starts, otherwise one thread."""
+        if self.encode_processes > 0:
+            try:
+                return ProcessEncoder(self.encode_processes, CODECS["intensity"].palette)
+            except (OSError, ValueError) as e:
+                print(f"Error starting waterfall encode processes, encoding on a thread: {e}")
+        return ThreadEncoder()
+
+    def _capture_frame(self, damage: Optional[Tuple[int, int, int, int]] = None) -> Optional[CapturedFrame]:
+        """
+        Capture the FlDigi waterfall region and work out how it changed.
+
+        The frame is compared with the last changed frame: an unchanged
+        fingerprint marks it unchanged (nothing to encode), otherwise
+        detect_scroll finds whether it is an exact scroll so subscribers can
+        be sent only the newly exposed rows. Returns None if capture fails.
+
+        Runs on the capture thread. Pixels are converted into a reused
+        buffer and the previous frame is kept in another, so steady-state
+        capture allocates only the PIL image handed to the encoder. With a
+        damage rectangle only that part of the buffer is grabbed again.
+
+        Without NumPy there is no scroll detection: each frame that differs
+        from the last is sent as a keyframe.
+        """
+        if not NUMPY_AVAILABLE:
+            return self._capture_frame_plain()
+        pixels = self._capture_pixels(out=self._frame_buffer, damage=damage)
+        if pixels is None:
+            return None
+        self._frame_buffer = pixels
+
+        now = time.time()
+        analyze_start = time.perf_counter()
+
+        fingerprint = frame_fingerprint(pixels)
+        if not fingerprint_changed(self.last_fingerprint, fingerprint):
+            self.frames_skipped += 1
+            self._record_stage("analyze", analyze_start)
+            # Nothing meaningful changed, so the last image still stands in for it
+            return CapturedFrame(self._last_image, now, self.frame_number, False, 0)
+        self.last_fingerprint = fingerprint
+
+        scroll = None
+        if self.previous_frame is not None and self.previous_frame.shape == pixels.shape:
+            scroll = detect_scroll(self.previous_frame, pixels, self.max_scroll)
+            np.copyto(self.previous_frame, pixels)
         else:
+            self.previous_frame = pixels.copy()
+        self._detect_carriers(pixels, scroll, now)
+        self._record_stage("analyze", analyze_start)
+
+        self.frame_number = (self.frame_number + 1) & 0xffffffff
+        self._last_image = Image.fromarray(pixels)
+        return CapturedFrame(self._last_image, now, self.frame_number, True, scroll)
+
+    def _capture_frame_plain(self) -> Optional[CapturedFrame]:
+        """_capture_frame without NumPy: the capture is a PIL image, compared whole."""
+        image = self._capture_pixels()
+        if image is None:
             return None
+        now = time.time()
+        analyze_start = time.perf_counter()
+        last = self._last_image
+        if last is not None and last.size == image.size and ImageChops.difference(last, image).getbbox() is None:
+            self.frames_skipped += 1
+            self._record_stage("analyze", analyze_start)
+            return CapturedFrame(last, now, self.frame_number, False, 0)
+        self._record_stage("analyze", analyze_start)
+
+        self.frame_number = (self.frame_number + 1) & 0xffffffff
+        self._last_image = image
+        return CapturedFrame(image, now, self.frame_number, True, None)
+
+    def _plan_frame(self, sub: WaterfallSubscriber,
+                    frame: CapturedFrame) -> Optional[Tuple[int, int, int, Optional[str], int]]:
+        """
+        Decide what to send one subscriber for this frame.
 
-    def _capture_window_linux(self) -> Optional[bytes]:
+        Returns (kind, scroll, quality, codec, tier), or None to send nothing. Strips carry
+        every row scrolled since the subscriber's last frame. A keyframe is
+        sent when the subscriber needs one, when the accumulated scroll is too
+        large for a strip, or every keyframe_interval seconds while scrolling.
         """
-        Capture the FlDigi window on Linux/X11 and return as JPEG bytes.
-        Returns None if capture fails.
+        now = frame.timestamp
+        if frame.changed:
+            sub.advance(frame)
+
+        # Skip rather than queue: busy or not due yet at this subscriber's rate
+        due = now - sub.last_sent_time >= 0.8 / self._subscriber_fps(sub)
+        if sub.in_flight or not due:
+            if frame.changed:
+                sub.frames_skipped += 1
+                if sub.in_flight and due:
+                    sub.backlog_skips += 1
+            self._adapt(sub, now)
+            return None
+
+        self._adapt(sub, now)
+        # Lossless codecs ignore quality, so all levels share one encoding
+        quality = self._subscriber_quality(sub) if CODECS[sub.codec].lossy else 0
+        width, height = frame.image.size
+        pending = sub.pending_scroll
+        limit = min(self.max_scroll, height // 2)
+
+        tier = self._subscriber_tier(sub, width)
+        if tier != sub.tier:
+            sub.tier = tier
+            sub.needs_keyframe = True
+
+        if sub.full_frames:
+            # MJPEG has no strips; the same plan as a WebSocket JPEG keyframe shares its encoding
+            if frame.changed or sub.needs_keyframe or now - sub.last_sent_time >= self.keepalive_interval:
+                return FRAME_KIND_KEYFRAME, 0, quality, "jpeg", tier
+            return None
+
+        if (sub.needs_keyframe or abs(pending) > limit
+                or (pending and now - sub.last_keyframe_time >= self.keyframe_interval)):
+            return FRAME_KIND_KEYFRAME, 0, quality, sub.codec, tier
+        if pending:
+            return FRAME_KIND_STRIP, pending, quality, sub.codec, tier
+        if now - sub.last_sent_time >= self.keepalive_interval:
+            return FRAME_KIND_STRIP, 0, 0, None, tier
+        return None
+
+    def _encode_jobs(self, plans, height: int) -> list:
+        """
+        Encode jobs (see backend/waterfall_encode.py) for each distinct
+        (kind, scroll, quality, codec, tier) that has a payload; keepalives
+        have none.
+        """
+        jobs = []
+        for plan in plans:
+            kind, scroll, quality, codec, tier = plan
+            if kind == FRAME_KIND_KEYFRAME:
+                jobs.append((plan, tier, 0, None, codec, quality))
+            elif scroll:
+                # Exposed rows are at the top when scrolling down, at the bottom when scrolling up
+                y = 0 if scroll > 0 else height + scroll
+                jobs.append((plan, tier, y, abs(scroll), codec, quality))
+        return jobs
+
+    def _capture_window_linux(self, full: bool = False, out: Optional["np.ndarray"] = None,
+                              damage: Optional[Tuple[int, int, int, int]] = None) -> Optional["np.ndarray"]:
+        """
+        Capture the FlDigi window on Linux/X11 as an RGB array.
+        Only the capture region is read from the X server unless full is True.
+        When out holds the previous grab of the same region, only the part
+        inside the damage rectangle is read again. Returns None if capture fails.
         """
         try:
-            # Find window if not already found
-            if not self.window:
-                self.window_id = self._find_fldigi_window()
-                if not self.window_id:
-                    return None
-
+            # Follow the window finder (it notices the window being destroyed)
+            window_id = self._find_fldigi_window()
+            if not window_id:
+                self.window = None
+                self.window_id = None
+                return None
+            if not self.window or window_id != self.window_id:
+                self.window_id = window_id
                 self.window = self.display.create_resource_object('window', self.window_id)
 
             # Get window geometry
             geom = self.window.get_geometry()
-            width, height = geom.width, geom.height
-
-            # Capture window image
-            raw_image = self.window.get_image(
-                0, 0, width, height,
-                X.ZPixmap,
-                0xffffffff
-            )
-
-            # Convert to PIL Image
-            # X11 returns BGRX format (32-bit with padding)
-            image = Image.frombytes(
-                "RGB",
-                (width, height),
-                raw_image.data,
-                "raw",
-                "BGRX"
-            )
-
-            # Cache window size for click coordinate conversion
-            self.last_window_size = (width, height)
+            x, y, width, height = self._capture_rect(geom.width, geom.height, full)
+
+            capture_start = time.perf_counter()
+            region = intersect_rect(damage, (x, y, width, height)) if damage and not full else None
+            if (region and out is not None and out.shape == (height, width, 3)
+                    and self.last_capture_rect == (x, y, width, height)):
+                # The rest of out still holds the last grab of this region
+                damage_x, damage_y, damage_width, damage_height = region
+                buffer, stride = self._grab_linux(damage_x, damage_y, damage_width, damage_height)
+                _bgrx_to_rgb(
+                    buffer, stride, 0, 0, damage_width, damage_height,
+                    out[damage_y - y:damage_y - y + damage_height, damage_x - x:damage_x - x + damage_width]
+                )
+                pixels = out
+            else:
+                buffer, stride = self._grab_linux(x, y, width, height)
+                pixels = _bgrx_to_rgb(buffer, stride, 0, 0, width, height, out)
+            self._record_capture_time(capture_start)
 
-            # Encode as JPEG
-            buffer = io.BytesIO()
-            image.save(buffer, format="JPEG", quality=self.jpeg_quality, optimize=True)
+            # Cache window size and captured region for click coordinate conversion
+            self.last_window_size = (geom.width, geom.height)
+            if not full:
+                self.last_capture_rect = (x, y, width, height)
 
-            return buffer.getvalue()
+            return pixels
 
         except Exception as e:
             # Window might have been closed or moved
             print(f"Error capturing window: {e}")
+            if self.window_finder:
+                self.window_finder.forget(self.window_id)
             self.window = None
             self.window_id = None
             return None
 
+    def _grab_linux(self, x: int, y: int, width: int, height: int) -> Tuple[object, int]:
+        """
+        Grab a rectangle of the window as (BGRX buffer, bytes per line), via
+        MIT-SHM when possible.
+
+        The SHM path reads from a shared segment that is reused across frames,
+        so pixels are not streamed through the X socket. Falls back to
+        get_image when SHM is unavailable (e.g. remote X) or a grab fails.
+        """
+        if self.use_shm:
+            if self.shm is None:
+                self.shm = ShmCapture()
+                if not self.shm.available:
+                    print("MIT-SHM not available, using XGetImage for waterfall capture")
+
+            if self.shm.available:
+                result = self.shm.capture(self.window_id, x, y, width, height)
+                if result:
+                    self.capture_method = "shm"
+                    return result
+
+        # Capture window image through the X protocol
+        raw_image = self.window.get_image(
+            x, y, width, height,
+            X.ZPixmap,
+            0xffffffff
+        )
+        self.capture_method = "get_image"
+
+        # X11 returns BGRX format (32-bit with padding)
+        return raw_image.data, len(raw_image.data) // height
+
     def send_mouse_click(self, canvas_x: int, canvas_y: int, canvas_width: int, canvas_height: int) -> bool:
         """
         Send a mouse click to the FlDigi window at the specified coordinates.
@@ -385,19 +1129,9 @@ class WaterfallCaptureService:
                 return False
 
             hwnd = self.window_id
-            client_width, client_height = self.last_window_size
 
             # Convert canvas coordinates to client area coordinates
-            # Canvas might be scaled differently than actual window
-            scale_x = client_width / canvas_width
-            scale_y = client_height / canvas_height
-
-            client_x = int(canvas_x * scale_x)
-            client_y = int(canvas_y * scale_y)
-
-            # Clamp coordinates to client area bounds
-            client_x = max(0, min(client_x, client_width - 1))
-            client_y = max(0, min(client_y, client_height - 1))
+            client_x, client_y = self._canvas_to_window(canvas_x, canvas_y, canvas_width, canvas_height)
 
             # Create the click position parameter (LPARAM)
             # LPARAM = MAKELONG(x, y) for WM_LBUTTONDOWN/UP
@@ -426,14 +1160,8 @@ class WaterfallCaptureService:
             if not self.display or not self.window or not self.last_window_size:
                 return False
 
-            window_width, window_height = self.last_window_size
-
             # Convert canvas coordinates to window coordinates
-            scale_x = window_width / canvas_width
-            scale_y = window_height / canvas_height
-
-            window_x = int(canvas_x * scale_x)
-            window_y = int(canvas_y * scale_y)
+            window_x, window_y = self._canvas_to_window(canvas_x, canvas_y, canvas_width, canvas_height)
 
             # Send mouse button press event
             event = xdisplay.protocol.event.ButtonPress(
@@ -476,53 +1204,298 @@ class WaterfallCaptureService:
             print(f"Error sending click to FlDigi window on Linux: {e}")
             return False
 
-    async def _capture_loop(self):
+    def _plan_distribution(self, frame: CapturedFrame) -> dict:
+        """
+        Decide what every subscriber is sent for a frame.
+
+        Returns {plan: [(subscriber, base frame, frame number), ...]}.
+        Subscriber state is advanced here rather than when the frame is
+        sent, so the next frame can be planned while this one is still
+        being encoded.
+        """
+        plans = {}
+        for sub in list(self.subscribers.values()):
+            plan = self._plan_frame(sub, frame)
+            if not plan:
+                continue
+
+            kind, scroll = plan[0], plan[1]
+            keepalive = kind == FRAME_KIND_STRIP and not scroll
+            number = sub.frame_number if keepalive else frame.number
+            plans.setdefault(plan, []).append((sub, sub.frame_number, number))
+
+            if kind == FRAME_KIND_KEYFRAME:
+                sub.needs_keyframe = False
+                sub.last_keyframe_time = frame.timestamp
+                self.keyframes_sent += 1
+            elif not keepalive:
+                self.strips_sent += 1
+            sub.pending_scroll = 0
+            sub.frame_number = number
+            sub.last_sent_time = frame.timestamp
+        return plans
+
+    def _send_encoded(self, frame: CapturedFrame, plans: dict, payloads: dict):
+        """
+        Send an encoded frame to the subscribers it was planned for.
+
+        Subscribers that hold the same base frame share the same bytes
+        object, and MJPEG viewers share the encoded JPEG itself. Sends run
+        as background tasks so a slow subscriber never holds up the loop or
+        the others.
+        """
+        width, height = frame.image.size
+        frame_meta = self._frame_meta(width)
+        messages = {}
+        for plan, targets in plans.items():
+            kind, scroll, _, codec, tier = plan
+            codec_id = CODECS[codec].codec_id if codec else 0
+            y = 0 if scroll >= 0 else height + scroll
+            # The axis spans the frame at any tier; only the width differs
+            meta = dict(frame_meta, width=tier or width)
+            for sub, base, number in targets:
+                if sub.websocket not in self.subscribers:
+                    continue
+                if sub.full_frames:
+                    # The bare JPEG: the same bytes object WebSocket keyframes are built from
+                    data, send_meta = payloads[plan], False
+                else:
+                    key = (plan, base)
+                    if key not in messages:
+                        rows = height if kind == FRAME_KIND_KEYFRAME else abs(scroll)
+                        messages[key] = FRAME_HEADER.pack(
+                            FRAME_MAGIC, FRAME_VERSION, kind, frame.timestamp, number,
+                            tier or width, height, scroll, y, rows, base, codec_id
+                        ) + payloads.get(plan, b"")
+                    data = messages[key]
+                    # Clients learn about a new axis or palette just before the keyframe it applies to
+                    send_meta = kind == FRAME_KIND_KEYFRAME and sub.meta != meta
+                    if send_meta:
+                        sub.meta = meta
+                sub.in_flight += 1
+                sub.send_task = asyncio.create_task(
+                    self._send_frame(sub, data, meta if send_meta else None, sub.send_task)
+                )
+
+    async def _send_frame(self, sub: WaterfallSubscriber, data: bytes, meta: Optional[dict] = None,
+                          previous: Optional[asyncio.Task] = None):
+        """
+        Send a frame to one subscriber, preceded by a meta message if given,
+        once its previous send has finished. The subscriber is dropped if a
+        send fails or stalls.
+        """
+        try:
+            if previous and not previous.done():
+                await previous
+            if sub.websocket not in self.subscribers:
+                return
+
+            start = time.perf_counter()
+            try:
+                if meta:
+                    await asyncio.wait_for(sub.websocket.send_json(meta), SEND_TIMEOUT)
+                await asyncio.wait_for(sub.websocket.send_bytes(data), SEND_TIMEOUT)
+            except Exception:
+                self.remove_subscriber(sub.websocket)
+                return
+        finally:
+            sub.in_flight -= 1
+
+        sub.record_send((time.perf_counter() - start) * 1000)
+        sub.frames_sent += 1
+        self.frames_sent += 1
+
+    def _damage_tracker(self):
+        """DAMAGE tracker for the current FlDigi window, or None to capture on a timer."""
+        if sys.platform != "linux" or not self.use_damage or not self.window_id:
+            return None
+
+        if self.damage and self.damage.window_id != self.window_id:
+            self.damage.close()
+            self.damage = None
+        if self.damage is None:
+            self.damage = DamageTracker(self.window_id)
+            if not self.damage.available:
+                print("X DAMAGE not available, capturing the waterfall on a timer")
+        return self.damage if self.damage.available else None
+
+    def _wait_for_damage(self, tracker) -> Tuple[Optional[Tuple[int, int, int, int]], bool]:
         """
-        Main capture loop. Captures frames and sends to all subscribers.
+        Wait until the window is drawn to inside the capture region.
+
+        Returns (damaged rectangle in window coordinates, timed out). The
+        rectangle is None when the wait ended without one: on a wake-up (new
+        subscriber, keyframe request), on shutdown, or after
+        damage_fallback_interval, so the frame is grabbed in full. Damage
+        outside the region (FlDigi's text panes) is ignored.
         """
-        self.running = True
-        frame_delay = 1.0 / self.fps
+        deadline = time.monotonic() + self.damage_fallback_interval
+        while not self._stop_event.is_set():
+            if self._wake_event.is_set():
+                self._wake_event.clear()
+                return None, False
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None, True
+
+            # Short slices so wake-ups and shutdown are noticed promptly
+            region = tracker.collect(min(remaining, 0.25))
+            if region is None:
+                continue
+            if self.last_capture_rect is None:
+                return region, False
+            region = intersect_rect(region, self.last_capture_rect)
+            if region:
+                return region, False
+
+        return None, False
+
+    def _capture_thread_main(self):
+        """
+        Capture thread: grab and analyse frames and hand the latest one to
+        the event loop.
+
+        On Linux frames are grabbed when X DAMAGE reports that the capture
+        region was drawn to, at most fps times a second, and only the damaged
+        rectangle is read. Elsewhere, or without DAMAGE, frames are grabbed
+        on a fixed 1/fps timer.
+
+        Capture runs independently of encoding and sending, so frame N+1 is
+        being grabbed while frame N is encoded. If the loop falls behind, a
+        newer frame replaces the pending one (absorbing its scroll) instead of
+        queuing up.
+        """
+        next_time = time.perf_counter()
+        fps_start, fps_frames = next_time, 0
+
+        while not self._stop_event.is_set():
+            if not self.subscribers:
+                # Idle until someone subscribes
+                self._wake_event.wait(0.5)
+                self._wake_event.clear()
+                next_time = time.perf_counter()
+                continue
+
+            damage, timed_out = None, False
+            tracker = self._damage_tracker()
+            self.capture_trigger = "damage" if tracker else "timer"
+            if tracker:
+                damage, timed_out = self._wait_for_damage(tracker)
+                if self._stop_event.is_set():
+                    break
 
+            try:
+                frame = self._capture_frame(damage)
+            except Exception as e:
+                print(f"Error in waterfall capture thread: {e}")
+                frame = None
+
+            if frame:
+                if timed_out and frame.changed:
+                    self._record_damage_miss(tracker)
+                self._publish_frame(frame)
+                fps_frames += 1
+
+            now = time.perf_counter()
+            if now - fps_start >= 1.0:
+                self.capture_fps = fps_frames / (now - fps_start)
+                fps_start, fps_frames = now, 0
+
+            # Sleep to cap the rate at fps; damage drawn meanwhile is picked up after
+            next_time = max(next_time + 1.0 / self.fps, now)
+            self._stop_event.wait(next_time - now)
+
+    def _record_damage_miss(self, tracker):
+        """
+        A timed capture found a change DAMAGE never reported (e.g. FlDigi
+        draws into a child window); after a few, capture on a timer instead.
+        """
+        tracker.misses += 1
+        if tracker.misses >= DAMAGE_MAX_MISSES:
+            print("X DAMAGE is not reporting waterfall updates, capturing on a timer")
+            tracker.close()
+
+    def _publish_frame(self, frame: CapturedFrame):
+        """Put a frame in the latest-wins slot and wake the distribution loop."""
+        with self._frame_lock:
+            if self._pending_frame is not None:
+                frame.absorb(self._pending_frame)
+            self._pending_frame = frame
+        try:
+            self._loop.call_soon_threadsafe(self._frame_ready.set)
+        except RuntimeError:
+            # Event loop already closed during shutdown
+            pass
+
+    async def _capture_loop(self):
+        """
+        Main distribution loop. Takes the latest captured frame, plans it
+        for all subscribers and starts encoding it.
+
+        At most encoder.depth frames are being encoded at once; beyond that
+        this loop waits, and the capture thread's latest-wins slot drops
+        frames rather than letting them queue.
+        """
         try:
             while self.enabled:
-                start_time = time.time()
-
-                # Only capture if we have subscribers
-                if self.subscribers:
-                    # Run blocking capture in thread pool to avoid blocking event loop
-                    loop = asyncio.get_event_loop()
-                    jpeg_bytes = await loop.run_in_executor(None, self._capture_window)
-
-                    if jpeg_bytes:
-                        # Encode as base64 for WebSocket transmission
-                        b64_image = base64.b64encode(jpeg_bytes).decode('utf-8')
-
-                        # Send to all subscribers
-                        dead_subs = set()
-                        for subscriber in self.subscribers:
-                            try:
-                                await subscriber.send_json({
-                                    "type": "waterfall_frame",
-                                    "image": b64_image,
-                                    "timestamp": time.time()
-                                })
-                            except Exception:
-                                # Mark dead connections for removal
-                                dead_subs.add(subscriber)
-
-                        # Remove dead subscribers
-                        self.subscribers -= dead_subs
-
-                # Sleep to maintain target FPS
-                elapsed = time.time() - start_time
-                sleep_time = max(0, frame_delay - elapsed)
-                await asyncio.sleep(sleep_time)
+                await self._frame_ready.wait()
+                self._frame_ready.clear()
+
+                await self._encode_slots.acquire()
+                with self._frame_lock:
+                    frame, self._pending_frame = self._pending_frame, None
+                if frame:
+                    await self._publish_carriers(frame.timestamp)
+
+                plans = self._plan_distribution(frame) if frame and self.subscribers else None
+                if not plans:
+                    self._encode_slots.release()
+                    continue
+
+                jobs = self._encode_jobs(plans, frame.image.height)
+                task = asyncio.ensure_future(self.encoder.encode(frame.image, jobs, self._encode_sequence))
+                self._encode_sequence += 1
+                self._encoded.append((frame, plans, task, time.perf_counter()))
+                self._encoded_ready.set()
 
         except asyncio.CancelledError:
             pass
         finally:
             self.running = False
 
+    async def _send_loop(self):
+        """
+        Send encoded frames in capture order. Frames can finish encoding
+        out of order on a process pool; each waits for the ones before it.
+        """
+        while True:
+            if not self._encoded:
+                self._encoded_ready.clear()
+                await self._encoded_ready.wait()
+                continue
+
+            frame, plans, task, start = self._encoded[0]
+            try:
+                payloads = await task
+                self._record_stage("encode", start)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error encoding waterfall frame: {e}")
+                payloads = None
+                # Subscribers were advanced past a frame they will never get
+                for targets in plans.values():
+                    for sub, _, _ in targets:
+                        sub.needs_keyframe = True
+            finally:
+                if self._encoded and self._encoded[0][2] is task:
+                    self._encoded.popleft()
+                    self._encode_slots.release()
+
+            if payloads is not None:
+                self._send_encoded(frame, plans, payloads)
+
 
 # Global singleton instance
 waterfall_service = WaterfallCaptureService()
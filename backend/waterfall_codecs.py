@@ -0,0 +1,161 @@
+"""
+Waterfall frame encoders.
+
+Each codec turns an RGB PIL image (a keyframe or a strip of new rows) into
+the payload that follows FRAME_HEADER on /api/waterfall/ws. The codec id is
+carried in the header so clients know how to decode each frame.
+
+Payload formats:
+    jpeg     JPEG file
+    webp     WebP file (lossy)
+    png      8-bit palettised PNG file
+    indexed  uint16 palette size N, N*3 bytes RGB palette, then a zlib
+             stream of width*rows uint8 palette indices (row-major)
+    intensity  zlib stream of width*rows uint8 signal levels (row-major),
+             recovered from FlDigi's palette; the client applies its own
+             palette. Only meaningful when the capture is cropped to the
+             waterfall (text and markers are mapped to the nearest level)
+
+A waterfall is a few hundred distinct palette colours at most, so the
+palettised codecs are often smaller than JPEG and decode without artefacts.
+Use `python -m benchmarks.waterfall_codecs` to compare them on real frames.
+"""
+
+import io
+import struct
+import zlib
+from typing import Dict, List, Optional
+
+from PIL import Image, features
+
+try:
+    import numpy as np
+    from backend.waterfall_analysis import FLDIGI_PALETTE, intensity_lut, to_intensity
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+
+class WaterfallCodec:
+    """Base class for frame encoders."""
+
+    name = ""
+    codec_id = 0
+    lossy = True  # Uses the subscriber's quality level
+
+    def available(self) -> bool:
+        return True
+
+    def encode(self, image: "Image.Image", quality: int, buffer: io.BytesIO) -> bytes:
+        """Encode an RGB image. buffer is scratch space owned by the caller's thread."""
+        raise NotImplementedError
+
+    @staticmethod
+    def _reset(buffer: io.BytesIO) -> io.BytesIO:
+        buffer.seek(0)
+        buffer.truncate()
+        return buffer
+
+
+class JpegCodec(WaterfallCodec):
+    name = "jpeg"
+    codec_id = 0
+
+    def encode(self, image, quality, buffer):
+        image.save(self._reset(buffer), format="JPEG", quality=quality, optimize=True)
+        return buffer.getvalue()
+
+
+class WebpCodec(WaterfallCodec):
+    name = "webp"
+    codec_id = 1
+
+    def available(self) -> bool:
+        return bool(features.check("webp"))
+
+    def encode(self, image, quality, buffer):
+        # method 2: noticeably faster than the default 4 for a small size cost
+        image.save(self._reset(buffer), format="WEBP", quality=quality, method=2)
+        return buffer.getvalue()
+
+
+def _quantize(image: "Image.Image") -> "Image.Image":
+    return image.quantize(colors=256, method=Image.Quantize.FASTOCTREE)
+
+
+class PalettePngCodec(WaterfallCodec):
+    name = "png"
+    codec_id = 2
+    lossy = False
+
+    def encode(self, image, quality, buffer):
+        _quantize(image).save(self._reset(buffer), format="PNG", compress_level=1)
+        return buffer.getvalue()
+
+
+class IndexedZlibCodec(WaterfallCodec):
+    name = "indexed"
+    codec_id = 3
+    lossy = False
+
+    def encode(self, image, quality, buffer):
+        indexed = _quantize(image)
+        # Only send palette entries up to the highest index actually used
+        count = max(index for _, index in indexed.getcolors(256)) + 1
+        palette = bytes(indexed.getpalette()[:3 * count])
+        return struct.pack("<H", count) + palette + zlib.compress(indexed.tobytes(), 1)
+
+
+class IntensityCodec(WaterfallCodec):
+    name = "intensity"
+    codec_id = 4
+    lossy = False
+
+    def __init__(self):
+        self.palette = FLDIGI_PALETTE if NUMPY_AVAILABLE else None
+        self._lut = None
+
+    def available(self) -> bool:
+        return NUMPY_AVAILABLE
+
+    def set_palette(self, stops):
+        """Use FlDigi palette stops (see load_palette) to recover levels."""
+        self.palette = tuple(tuple(stop) for stop in stops)
+        self._lut = None
+
+    def lut(self):
+        """Colour to level lookup table for the palette, built on first use."""
+        if self._lut is None:
+            self._lut = intensity_lut(self.palette)
+        return self._lut
+
+    def encode(self, image, quality, buffer):
+        levels = to_intensity(np.asarray(image), self.lut())
+        return zlib.compress(levels.tobytes(), 1)
+
+
+CODECS: Dict[str, WaterfallCodec] = {
+    codec.name: codec
+    for codec in (JpegCodec(), WebpCodec(), PalettePngCodec(), IndexedZlibCodec(), IntensityCodec())
+}
+
+DEFAULT_CODEC = "jpeg"
+
+
+def available_codecs() -> List[str]:
+    """Names of codecs this server can encode."""
+    return [name for name, codec in CODECS.items() if codec.available()]
+
+
+def negotiate_codec(client_codecs: Optional[List[str]], preference: List[str]) -> str:
+    """
+    Pick the codec for a subscriber: the first entry of the server's
+    preference order that the client can decode and this server can encode.
+    """
+    if not client_codecs:
+        return DEFAULT_CODEC
+    supported = set(client_codecs)
+    for name in preference:
+        if name in supported and name in CODECS and CODECS[name].available():
+            return name
+    return DEFAULT_CODEC
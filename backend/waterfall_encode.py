@@ -0,0 +1,183 @@
+"""
+Waterfall encode stage: a single thread, or a pool of worker processes.
+
+The capture service turns each frame's plans into encode jobs:
+
+    (key, tier, y, rows, codec, quality)
+
+meaning "scale the frame to tier pixels wide (0 = full size), take rows
+rows from y (rows None = the whole frame) and encode them with codec". An
+encoder runs the jobs for one frame and resolves to {key: payload}.
+
+ThreadEncoder runs them on one thread, which is enough for one full-size
+stream. ProcessEncoder spreads them over worker processes so several
+frames, and the tiers of one frame, are encoded on different cores.
+Frames reach the workers through a ring of shared-memory slots rather
+than being pickled; only the small job lists and encoded payloads cross
+the process boundary. The parent owns the slots: it alone unlinks them,
+and workers only attach and close.
+"""
+
+import asyncio
+import atexit
+import io
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional, Tuple
+
+from PIL import Image
+
+from backend.waterfall_codecs import CODECS
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+Job = Tuple[object, int, int, Optional[int], str, int]
+
+
+def encode_jobs(image: "Image.Image", jobs: List[Job], buffer: io.BytesIO) -> Dict[object, bytes]:
+    """Run encode jobs for one frame. Each tier is scaled from the frame once."""
+    tiers = {0: image}
+    payloads = {}
+    for key, tier, y, rows, codec, quality in jobs:
+        if tier not in tiers:
+            # Width only, so strips keep their exact row counts
+            tiers[tier] = image.resize((tier, image.height), Image.BOX)
+        scaled = tiers[tier]
+        if rows is not None:
+            scaled = scaled.crop((0, y, scaled.width, y + rows))
+        payloads[key] = CODECS[codec].encode(scaled, quality, buffer)
+    return payloads
+
+
+class ThreadEncoder:
+    """Encodes frames one at a time on a dedicated thread."""
+
+    depth = 1  # Frames in flight
+
+    def __init__(self):
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="waterfall-encode")
+        self._buffer = io.BytesIO()  # Only touched by the encode thread
+
+    async def encode(self, image: "Image.Image", jobs: List[Job], slot: int) -> Dict[object, bytes]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, encode_jobs, image, jobs, self._buffer)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+
+# Worker process state
+_worker_buffer = None
+_worker_segments: Dict[str, shared_memory.SharedMemory] = {}
+
+
+def _init_worker(palette):
+    global _worker_buffer
+    _worker_buffer = io.BytesIO()
+    if palette is not None:
+        CODECS["intensity"].set_palette(palette)
+    atexit.register(_close_worker_segments)
+
+
+def _close_worker_segments():
+    for shm in _worker_segments.values():
+        shm.close()
+    _worker_segments.clear()
+
+
+def _encode_in_worker(segment: str, size: Tuple[int, int], jobs: List[Job]) -> Dict[object, bytes]:
+    shm = _worker_segments.get(segment)
+    if shm is None:
+        if len(_worker_segments) > 16:
+            # Slots are replaced when frames grow; drop attachments to old ones
+            _close_worker_segments()
+        shm = _worker_segments[segment] = shared_memory.SharedMemory(name=segment)
+
+    width, height = size
+    image = Image.frombuffer("RGB", size, shm.buf[:width * height * 3], "raw", "RGB", 0, 1)
+    return encode_jobs(image, jobs, _worker_buffer)
+
+
+class ProcessEncoder:
+    """
+    Encodes frames in a pool of worker processes.
+
+    Up to depth frames are in flight, each in its own shared-memory slot.
+    The caller must not reuse a slot before the frame in it has been
+    encoded; the capture service guarantees that by taking slots in turn
+    and admitting at most depth frames at once. A frame's jobs are split
+    by tier, so one frame with several tiers also uses several workers.
+    """
+
+    def __init__(self, processes: int, palette=None):
+        self.depth = processes
+        # spawn: forking a process that runs an event loop and capture threads is unsafe
+        self._executor = ProcessPoolExecutor(
+            max_workers=processes, mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker, initargs=(palette,)
+        )
+        self._slots: List[Optional[shared_memory.SharedMemory]] = [None] * processes
+
+    def _slot(self, index: int, size: int) -> shared_memory.SharedMemory:
+        shm = self._slots[index]
+        if shm is None or shm.size < size:
+            self._release_slot(index)
+            shm = self._slots[index] = shared_memory.SharedMemory(create=True, size=size)
+        return shm
+
+    def _release_slot(self, index: int):
+        """Close and unlink one slot. The only place slots are freed."""
+        shm, self._slots[index] = self._slots[index], None
+        if shm is None:
+            return
+        try:
+            shm.unlink()
+        except FileNotFoundError:
+            pass
+        try:
+            shm.close()
+        except BufferError:
+            pass  # Still being staged into; the mapping goes when that copy finishes
+
+    @staticmethod
+    def _stage(image: "Image.Image", shm: shared_memory.SharedMemory):
+        """Copy a frame's RGB pixels into a slot."""
+        width, height = image.size
+        if NUMPY_AVAILABLE:
+            # Straight into the slot through a view of it, no intermediate bytes object
+            view = np.ndarray((height, width, 3), dtype=np.uint8, buffer=shm.buf)
+            np.copyto(view, np.asarray(image))
+            del view  # A live view keeps the mapping exported and close() would fail
+        else:
+            shm.buf[:width * height * 3] = image.tobytes()
+
+    async def encode(self, image: "Image.Image", jobs: List[Job], slot: int) -> Dict[object, bytes]:
+        width, height = image.size
+        shm = self._slot(slot % self.depth, width * height * 3)
+        loop = asyncio.get_running_loop()
+        # A full frame is megabytes; copy it on a thread, not the event loop
+        await loop.run_in_executor(None, self._stage, image, shm)
+
+        groups: Dict[int, List[Job]] = {}
+        for job in jobs:
+            groups.setdefault(job[1], []).append(job)
+
+        results = await asyncio.gather(*[
+            loop.run_in_executor(self._executor, _encode_in_worker, shm.name, image.size, group)
+            for group in groups.values()
+        ])
+
+        payloads = {}
+        for result in results:
+            payloads.update(result)
+        return payloads
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        for index in range(len(self._slots)):
+            self._release_slot(index)
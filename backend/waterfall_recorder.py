@@ -0,0 +1,395 @@
+"""
+Waterfall recording and playback.
+
+The recorder is a capture subscriber like a WebSocket client: it is sent
+the same binary frames (keyframes and scroll strips, see FRAME_HEADER in
+waterfall_capture.py) and meta messages, and appends them to disk. Playback
+sends them back out unchanged, so any waterfall client can play a
+recording.
+
+A recording is a directory of segments, each a pair of files named after
+the segment's start time in milliseconds:
+
+    <start>.wfd   data: records back to back
+    <start>.wfi   index: one fixed-size entry per record,
+                  timestamp (float64 seconds), data offset (uint64),
+                  length (uint32), flags (uint8, RECORD_*), 3 pad bytes
+
+Index entries are written after their data, so an index never points past
+the end of its data file, even after a crash. Every segment starts with
+the latest meta message (if any) and a keyframe, so playback can start in
+any segment. Records are stamped with capture timestamps (a meta message
+with the frame before it), so the index is sorted. Readers memory-map both
+files and binary-search the index; only the record being sent is copied
+out.
+
+Old segments are deleted once the recording is larger than max_bytes or
+they are older than max_age seconds.
+"""
+
+import asyncio
+import json
+import mmap
+import os
+import struct
+import time
+from pathlib import Path
+from typing import AsyncIterator, List, Optional, Tuple
+
+from backend.config import (
+    WATERFALL_RECORD_DIR, WATERFALL_RECORD_MAX_AGE, WATERFALL_RECORD_MAX_BYTES,
+    WATERFALL_RECORD_SEGMENT_SECONDS
+)
+from backend.waterfall_capture import FRAME_HEADER, FRAME_KIND_KEYFRAME, FRAME_KIND_STRIP
+
+INDEX_ENTRY = struct.Struct("<dQIB3x")  # 24 bytes
+RECORD_KEYFRAME = 1  # A keyframe: playback can start here
+RECORD_META = 2      # A JSON meta message rather than a binary frame
+
+DATA_SUFFIX = ".wfd"
+INDEX_SUFFIX = ".wfi"
+SEGMENT_MAX_BYTES = 64 * 1024 * 1024
+LIVE_POLL_INTERVAL = 0.25  # Seconds between checks for new records once playback catches up
+PLAYBACK_MAX_GAP = 10.0  # Longer gaps between records (streaming was off) are skipped in playback
+
+
+class Segment:
+    """One segment of a recording, read through memory maps."""
+
+    def __init__(self, directory: Path, start: float):
+        self.start = start
+        name = f"{int(round(start * 1000)):013d}"
+        self.data_path = directory / (name + DATA_SUFFIX)
+        self.index_path = directory / (name + INDEX_SUFFIX)
+        self.removed = False
+        self._data = None
+        self._index = None
+
+    @classmethod
+    def from_path(cls, path: Path) -> Optional["Segment"]:
+        try:
+            return cls(path.parent, int(path.stem) / 1000)
+        except ValueError:
+            return None
+
+    def size(self) -> int:
+        try:
+            return os.path.getsize(self.data_path) + os.path.getsize(self.index_path)
+        except OSError:
+            return 0
+
+    def entries(self) -> int:
+        try:
+            return os.path.getsize(self.index_path) // INDEX_ENTRY.size
+        except OSError:
+            return 0
+
+    @staticmethod
+    def _map(path: Path, current, length: int):
+        """Map length bytes of path, reusing the current map if it is large enough."""
+        if current is not None and len(current) >= length:
+            return current
+        if current is not None:
+            current.close()
+        with open(path, "rb") as f:
+            return mmap.mmap(f.fileno(), length, access=mmap.ACCESS_READ)
+
+    def _entry_map(self, count: int):
+        # The segment being recorded grows; map again when asked past the end
+        self._index = self._map(self.index_path, self._index, count * INDEX_ENTRY.size)
+        return self._index
+
+    def entry(self, i: int) -> Tuple[float, int, int, int]:
+        """(timestamp, offset, length, flags) of record i."""
+        return INDEX_ENTRY.unpack_from(self._entry_map(i + 1), i * INDEX_ENTRY.size)
+
+    def read(self, i: int) -> Tuple[float, int, bytes]:
+        """(timestamp, flags, data) of record i."""
+        timestamp, offset, length, flags = self.entry(i)
+        self._data = self._map(self.data_path, self._data, offset + length)
+        return timestamp, flags, self._data[offset:offset + length]
+
+    def find(self, timestamp: float) -> Tuple[int, Optional[int]]:
+        """
+        Where to start playing from timestamp: (first record to send, meta
+        record to send before it or None). Playback starts at the last
+        keyframe at or before timestamp, or the first keyframe after it.
+        """
+        count = self.entries()
+        if count == 0:
+            return 0, None
+        # Last record at or before timestamp
+        low, high = 0, count
+        while low < high:
+            middle = (low + high) // 2
+            if self.entry(middle)[0] <= timestamp:
+                low = middle + 1
+            else:
+                high = middle
+        start = max(low - 1, 0)
+
+        while start > 0 and not self.entry(start)[3] & RECORD_KEYFRAME:
+            start -= 1
+        if not self.entry(start)[3] & RECORD_KEYFRAME:
+            while start < count - 1 and not self.entry(start)[3] & RECORD_KEYFRAME:
+                start += 1
+
+        meta = start - 1
+        while meta >= 0 and not self.entry(meta)[3] & RECORD_META:
+            meta -= 1
+        return start, meta if meta >= 0 else None
+
+    def last_timestamp(self) -> Optional[float]:
+        count = self.entries()
+        return self.entry(count - 1)[0] if count else None
+
+    def close(self):
+        for mapped in (self._data, self._index):
+            if mapped is not None:
+                mapped.close()
+        self._data = None
+        self._index = None
+
+    def remove(self):
+        self.close()
+        self.removed = True
+        for path in (self.data_path, self.index_path):
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+
+
+class WaterfallRecorder:
+    """
+    Records the waterfall stream and plays it back.
+
+    Subscribes to the capture service as a stand-in WebSocket, so it gets
+    frames at full size in the server's preferred codec for as long as
+    waterfall streaming is enabled. Records are written straight from the
+    event loop: each is one small append to a file, which lands in the page
+    cache without waiting on the disk.
+    """
+
+    def __init__(self, directory: str = WATERFALL_RECORD_DIR, max_bytes: int = WATERFALL_RECORD_MAX_BYTES,
+                 max_age: float = WATERFALL_RECORD_MAX_AGE,
+                 segment_seconds: float = WATERFALL_RECORD_SEGMENT_SECONDS):
+        self.directory = Path(directory).expanduser()
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.segment_seconds = segment_seconds
+        self.recording = False
+        self.records_written = 0
+        self.segments: List[Segment] = []
+        self._service = None
+        self._segment: Optional[Segment] = None  # Segment being written
+        self._data_file = None
+        self._index_file = None
+        self._offset = 0
+        self._rotate = False  # Start a new segment at the next keyframe
+        self._meta: Optional[bytes] = None  # Latest meta message, repeated at the start of each segment
+        self._last_timestamp = 0.0  # Of the last record written; the index is in this order
+
+    def _scan(self):
+        """Load the segments on disk, oldest first, keeping the ones already open."""
+        known = {segment.index_path: segment for segment in self.segments}
+        segments = []
+        for path in self.directory.glob("*" + INDEX_SUFFIX):
+            segment = known.pop(path, None) or Segment.from_path(path)
+            if segment is not None:
+                segments.append(segment)
+        for segment in known.values():
+            segment.close()
+            segment.removed = True
+        self.segments = sorted(segments, key=lambda segment: segment.start)
+
+    def start(self, service):
+        """Start recording frames from the capture service."""
+        if self.recording:
+            return
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._scan()
+        self._enforce_retention()
+        self._service = service
+        self.recording = True
+        service.add_subscriber(self)
+        service.set_subscriber_codecs(self, [name for name in service.get_status()["codecs"] if name != "intensity"])
+
+    def stop(self):
+        """Stop recording. What was recorded stays available for playback."""
+        if not self.recording:
+            return
+        self.recording = False
+        if self._service:
+            self._service.remove_subscriber(self)
+            self._service = None
+        self._close_files()
+
+    def _close_files(self):
+        for f in (self._data_file, self._index_file):
+            if f is not None:
+                f.close()
+        self._data_file = None
+        self._index_file = None
+        self._segment = None
+
+    def _open_segment(self, timestamp: float):
+        self._close_files()
+        segment = Segment(self.directory, timestamp)
+        self._data_file = open(segment.data_path, "ab", buffering=0)
+        self._index_file = open(segment.index_path, "ab", buffering=0)
+        self._offset = self._data_file.tell()
+        self._segment = segment
+        if not self.segments or self.segments[-1].data_path != segment.data_path:
+            self.segments.append(segment)
+        self._rotate = False
+        if self._meta is not None:
+            self._write(timestamp, RECORD_META, self._meta)
+        self._enforce_retention()
+
+    def _write(self, timestamp: float, flags: int, data: bytes):
+        self._data_file.write(data)
+        self._index_file.write(INDEX_ENTRY.pack(timestamp, self._offset, len(data), flags))
+        self._offset += len(data)
+        self._last_timestamp = timestamp
+        self.records_written += 1
+
+        if (timestamp - self._segment.start >= self.segment_seconds or self._offset >= SEGMENT_MAX_BYTES) \
+                and not self._rotate:
+            # Segments must start with a keyframe; ask for one and rotate when it arrives
+            self._rotate = True
+            if self._service:
+                self._service.request_keyframe(self)
+
+    async def send_json(self, data: dict):
+        # Meta messages; anything else sent to clients is not part of the stream
+        if not self.recording or data.get("type") != "meta":
+            return
+        self._meta = json.dumps(data).encode()
+        if self._segment is not None:
+            # On the frames' clock, not the wall clock, so the index stays sorted
+            # for Segment.find and playback pacing
+            self._write(self._last_timestamp, RECORD_META, self._meta)
+
+    async def send_bytes(self, data: bytes):
+        if not self.recording:
+            return
+        header = FRAME_HEADER.unpack_from(data)
+        kind, timestamp, rows = header[2], header[3], header[9]
+        if kind == FRAME_KIND_STRIP and rows == 0:
+            return  # Keepalives carry nothing to play back
+
+        keyframe = kind == FRAME_KIND_KEYFRAME
+        if self._segment is None and not keyframe:
+            return  # Wait for the keyframe every new subscriber is sent first
+        try:
+            if self._segment is None or (keyframe and self._rotate):
+                self._open_segment(timestamp)
+            self._write(timestamp, RECORD_KEYFRAME if keyframe else 0, data)
+        except OSError as e:
+            print(f"Error recording waterfall, stopping: {e}")
+            self.stop()
+
+    def _enforce_retention(self):
+        """Delete the oldest segments while over max_bytes or older than max_age."""
+        now = time.time()
+        total = sum(segment.size() for segment in self.segments)
+        while len(self.segments) > 1 and self.segments[0] is not self._segment:
+            oldest = self.segments[0]
+            # A segment ends where the next one starts
+            if total <= self.max_bytes and self.segments[1].start >= now - self.max_age:
+                break
+            total -= oldest.size()
+            try:
+                oldest.remove()
+            except OSError as e:
+                print(f"Error removing waterfall recording segment: {e}")
+                break
+            self.segments.pop(0)
+
+    def get_status(self) -> dict:
+        if not self.recording:
+            self._scan()
+        return {
+            "recording": self.recording,
+            "directory": str(self.directory),
+            "segments": len(self.segments),
+            "bytes": sum(segment.size() for segment in self.segments),
+            "max_bytes": self.max_bytes,
+            "max_age": self.max_age,
+            "oldest": self.segments[0].start if self.segments else None,
+            "newest": self.segments[-1].last_timestamp() if self.segments else None,
+            "records_written": self.records_written
+        }
+
+    def _segment_at(self, timestamp: float) -> int:
+        """Index of the segment covering timestamp (the first one if it is earlier)."""
+        position = 0
+        for i, segment in enumerate(self.segments):
+            if segment.start <= timestamp:
+                position = i
+        return position
+
+    async def play(self, start: float, speed: float = 1.0) -> AsyncIterator[Tuple[bool, bytes]]:
+        """
+        Yield (is_meta, data) records from start (Unix seconds) onwards,
+        paced at speed times real time. Playback begins at the keyframe
+        before start and sends the records up to start at once, so the
+        client has a complete picture at start. Once it reaches the end of
+        the recording it follows the recording live.
+        """
+        if speed <= 0:
+            raise ValueError("Playback speed must be positive")
+        if not self.recording:
+            self._scan()
+        if not self.segments:
+            return
+
+        position = self._segment_at(start)
+        segment = self.segments[position]
+        record, meta = segment.find(start)
+        if meta is not None:
+            yield True, segment.read(meta)[2]
+
+        clock = time.monotonic()
+        previous = None
+        while True:
+            if segment.removed:
+                # Retention caught up with playback; continue from the oldest segment left
+                if not self.segments:
+                    return
+                position, segment, record = 0, self.segments[0], 0
+                continue
+
+            if record < segment.entries():
+                timestamp, flags, data = segment.read(record)
+                record += 1
+                if previous is not None and timestamp - previous > PLAYBACK_MAX_GAP:
+                    clock = time.monotonic() - (timestamp - start) / speed
+                previous = timestamp
+                if timestamp > start:
+                    delay = clock + (timestamp - start) / speed - time.monotonic()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                    else:
+                        # Behind (or in a gap shorter than the records): don't sleep, don't drift
+                        clock -= delay
+                yield bool(flags & RECORD_META), data
+                continue
+
+            if segment in self.segments and self.segments.index(segment) + 1 < len(self.segments):
+                position = self.segments.index(segment) + 1
+                segment, record = self.segments[position], 0
+                continue
+            if not self.recording:
+                return
+            await asyncio.sleep(LIVE_POLL_INTERVAL)
+
+    def close(self):
+        self.stop()
+        for segment in self.segments:
+            segment.close()
+
+
+# Global recorder instance
+waterfall_recorder = WaterfallRecorder()
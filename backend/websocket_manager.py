@@ -1,52 +1,396 @@
+import asyncio
 import json
 import logging
-from typing import List, Dict, Any
+import time
+from collections import deque
+from typing import Dict, Any, Optional, Set, Iterable
 from datetime import datetime
 from fastapi import WebSocket
 
+from backend.config import (
+    HEARTBEAT_INTERVAL,
+    HEARTBEAT_TIMEOUT,
+    CLIENT_SEND_QUEUE_SIZE,
+    CLIENT_SEND_TIMEOUT,
+    LOW_PRIORITY_MIN_INTERVAL,
+    EVENT_HISTORY_SIZE,
+    SSE_QUEUE_SIZE,
+    EVENT_BUS,
+    EVENT_BUS_URL,
+    EVENT_BUS_CHANNEL,
+    POLLER_ENABLED
+)
+from backend.event_bus import (
+    BroadcastEvent,
+    EventBus,
+    InProcessEventBus,
+    create_event_bus,
+    event_topic,
+    next_event_id
+)
+
 logger = logging.getLogger(__name__)
 
+# Message types whose latest value is replayed to new listeners and clients
+SNAPSHOT_TYPES = ("connection_status", "status_update", "carriers")
+# Snapshot types only ever replayed as their latest value, never kept in the
+# event history, so they cannot push RX and status out of Last-Event-ID resume
+SNAPSHOT_ONLY_TYPES = ("carriers",)
+
+# Outbound priorities, highest first
+PRIORITY_CONTROL = 0  # connection status, errors, heartbeats, TX/RX transitions
+PRIORITY_RX = 1       # RX/TX text
+PRIORITY_LOW = 2      # status updates, metrics: coalesced and rate capped
+
+
+def message_priority(message_type: str) -> int:
+    if message_type == "text_update":
+        return PRIORITY_RX
+    if message_type in ("connection_status", "error", "ping"):
+        return PRIORITY_CONTROL
+    return PRIORITY_LOW
+
+
+class EventListener:
+    """
+    Non-WebSocket consumer of the broadcast stream (e.g. an SSE response).
+
+    If the listener falls SSE_QUEUE_SIZE events behind it is marked overflowed
+    and should end its stream; the client resumes with Last-Event-ID.
+    """
+
+    def __init__(self, topics: Optional[Set[str]] = None):
+        self.topics = topics
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=SSE_QUEUE_SIZE)
+        self.overflowed = False
+
+    def wants(self, event: BroadcastEvent) -> bool:
+        return self.topics is None or event.topic in self.topics
+
+    def offer(self, event: BroadcastEvent):
+        if self.overflowed or not self.wants(event):
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+
+class ClientOutbox:
+    """
+    Per-client outbound scheduler.
+
+    Control messages go first, then RX text, both in order. Low-priority
+    messages are keyed by message type: a newer one replaces one still waiting
+    (they are full snapshots). A client that keeps up gets every one as soon
+    as it is sent. Once one is superseded before the sender got to it, the
+    client is behind, and until its outbox empties again each type is
+    released at most once per LOW_PRIORITY_MIN_INTERVAL, so a saturated link
+    thins them out instead of queueing them behind RX text.
+    """
+
+    def __init__(self):
+        self.control: deque = deque()
+        self.rx: deque = deque()
+        self.low: Dict[str, str] = {}
+        self.low_next_send: Dict[str, float] = {}
+        self.coalesced = 0
+        self.behind = False  # Low-priority types are rate capped while set
+        self._wakeup = asyncio.Event()
+
+    def depth(self) -> int:
+        return len(self.control) + len(self.rx) + len(self.low)
+
+    def put(self, message: str, priority: int = PRIORITY_CONTROL, key: Optional[str] = None) -> bool:
+        """Queue a message. Returns False if the client's backlog is full."""
+        if key is not None and key in self.low:
+            # A fresher snapshot supersedes the one still waiting, whatever its priority
+            del self.low[key]
+            self.coalesced += 1
+            if self.low_next_send.get(key, 0.0) <= time.monotonic():
+                # It was due, not held back by the cap: the sender is not keeping up
+                self.behind = True
+
+        if priority == PRIORITY_LOW and key is not None:
+            self.low[key] = message
+        else:
+            queue = self.rx if priority == PRIORITY_RX else self.control
+            if len(queue) >= CLIENT_SEND_QUEUE_SIZE:
+                return False
+            queue.append(message)
+
+        self._wakeup.set()
+        return True
+
+    async def get(self) -> str:
+        while True:
+            if self.control:
+                return self.control.popleft()
+            if self.rx:
+                return self.rx.popleft()
+
+            timeout = None
+            if self.low:
+                now = time.monotonic()
+                key = min(self.low, key=lambda k: self.low_next_send.get(k, 0.0))
+                ready_at = self.low_next_send.get(key, 0.0)
+                if ready_at <= now:
+                    if self.behind:
+                        self.low_next_send[key] = now + LOW_PRIORITY_MIN_INTERVAL
+                    return self.low.pop(key)
+                timeout = ready_at - now
+            else:
+                # Caught up: stop capping
+                self.behind = False
+                self.low_next_send.clear()
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+
+class ClientInfo:
+    """Per-connection bookkeeping: outbound scheduler, sender task and counters."""
+
+    def __init__(self, websocket: WebSocket, client_id: int):
+        self.websocket = websocket
+        self.client_id = client_id
+        self.address = f"{websocket.client.host}:{websocket.client.port}" if websocket.client else None
+        self.connected_at = time.time()
+        self.last_seen = time.monotonic()
+        self.bytes_sent = 0
+        self.messages_sent = 0
+        self.messages_dropped = 0
+        self.outbox = ClientOutbox()
+        self.sender_task: Optional[asyncio.Task] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.client_id,
+            "address": self.address,
+            "connected_at": datetime.utcfromtimestamp(self.connected_at).isoformat(),
+            "idle_seconds": round(time.monotonic() - self.last_seen, 1),
+            "bytes_sent": self.bytes_sent,
+            "messages_sent": self.messages_sent,
+            "messages_dropped": self.messages_dropped,
+            "messages_coalesced": self.outbox.coalesced,
+            "rate_capped": self.outbox.behind,
+            "queue_depth": self.outbox.depth()
+        }
+
 
 class ConnectionManager:
 
     def __init__(self):
-        self.active_connections: List[WebSocket] = []
+        self.active_connections: Dict[WebSocket, ClientInfo] = {}
+        self.heartbeat_task: Optional[asyncio.Task] = None
+        self._next_client_id = 1
+        self._reaped_count = 0
+        self.event_listeners: Set[EventListener] = set()
+        self.event_history: deque = deque(maxlen=EVENT_HISTORY_SIZE)
+        self.latest_events: Dict[str, BroadcastEvent] = {}
+        self._last_event_id = 0
+        self._last_tx_status = None
+        self.bus: EventBus = InProcessEventBus(self._dispatch)
+
+    async def start(self):
+        """Attach the configured event bus and start heartbeats."""
+        if EVENT_BUS != self.bus.kind:
+            self.bus = create_event_bus(
+                EVENT_BUS,
+                self._dispatch,
+                url=EVENT_BUS_URL,
+                channel=EVENT_BUS_CHANNEL,
+                hub=POLLER_ENABLED
+            )
+        await self.bus.start()
+        self.start_heartbeat()
+
+    async def stop(self):
+        await self.stop_heartbeat()
+        await self.bus.stop()
 
     async def connect(self, websocket: WebSocket):
         await websocket.accept()
-        self.active_connections.append(websocket)
+        info = ClientInfo(websocket, self._next_client_id)
+        self._next_client_id += 1
+        info.sender_task = asyncio.create_task(self._sender(info))
+        self.active_connections[websocket] = info
         logger.info(f"New WebSocket connection. Total connections: {len(self.active_connections)}")
 
     def disconnect(self, websocket: WebSocket):
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
-            logger.info(f"WebSocket disconnected. Total connections: {len(self.active_connections)}")
+        info = self.active_connections.pop(websocket, None)
+        if info is None:
+            return
+
+        if info.sender_task and info.sender_task is not asyncio.current_task():
+            info.sender_task.cancel()
+        logger.info(f"WebSocket disconnected. Total connections: {len(self.active_connections)}")
+
+    def touch(self, websocket: WebSocket):
+        """Record that the client is alive (any inbound message, including pong)."""
+        info = self.active_connections.get(websocket)
+        if info:
+            info.last_seen = time.monotonic()
+
+    async def _sender(self, info: ClientInfo):
+        """Drain one client's queue so a slow socket never stalls a broadcast."""
+        websocket = info.websocket
+        while True:
+            message = await info.outbox.get()
+            try:
+                await asyncio.wait_for(websocket.send_text(message), CLIENT_SEND_TIMEOUT)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error sending to connection {info.client_id}: {e}")
+                self._reap(info)
+                return
+
+            info.messages_sent += 1
+            info.bytes_sent += len(message) if message.isascii() else len(message.encode('utf-8'))
+
+    def _enqueue(self, info: ClientInfo, message: str, priority: int = PRIORITY_CONTROL,
+                 key: Optional[str] = None):
+        if not info.outbox.put(message, priority, key):
+            info.messages_dropped += 1
+            logger.warning(f"Connection {info.client_id} send queue full, dropping client")
+            self._reap(info)
+
+    def _reap(self, info: ClientInfo):
+        """Forget a dead or hopelessly slow client and close its socket in the background."""
+        if info.websocket not in self.active_connections:
+            return
+
+        self._reaped_count += 1
+        self.disconnect(info.websocket)
+        asyncio.create_task(self._close_quietly(info.websocket))
+
+    async def _close_quietly(self, websocket: WebSocket):
+        try:
+            await asyncio.wait_for(websocket.close(), CLIENT_SEND_TIMEOUT)
+        except Exception:
+            pass
+
+    async def _heartbeat_loop(self):
+        ping = json.dumps({"type": "ping", "data": {}})
+        while True:
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+            now = time.monotonic()
+            for info in list(self.active_connections.values()):
+                if now - info.last_seen > HEARTBEAT_TIMEOUT:
+                    logger.warning(f"Connection {info.client_id} missed heartbeats, reaping")
+                    self._reap(info)
+                else:
+                    self._enqueue(info, ping)
+
+    def start_heartbeat(self):
+        if self.heartbeat_task is None:
+            self.heartbeat_task = asyncio.create_task(self._heartbeat_loop())
+
+    async def stop_heartbeat(self):
+        if self.heartbeat_task:
+            self.heartbeat_task.cancel()
+            try:
+                await self.heartbeat_task
+            except asyncio.CancelledError:
+                pass
+            self.heartbeat_task = None
 
     async def send_personal_message(self, message: str, websocket: WebSocket):
+        info = self.active_connections.get(websocket)
+        if info:
+            self._enqueue(info, message)
+            return
+
         try:
             await websocket.send_text(message)
         except Exception as e:
             logger.error(f"Error sending personal message: {e}")
 
     async def broadcast(self, message: str):
-        disconnected = []
-        for connection in self.active_connections:
-            try:
-                await connection.send_text(message)
-            except Exception as e:
-                logger.error(f"Error broadcasting to connection: {e}")
-                disconnected.append(connection)
-
-        for connection in disconnected:
-            self.disconnect(connection)
+        for info in list(self.active_connections.values()):
+            self._enqueue(info, message)
 
     async def broadcast_json(self, data: Dict[str, Any], message_type: str = "update"):
+        self._last_event_id = next_event_id(self._last_event_id)
         message = {
+            "id": self._last_event_id,
             "type": message_type,
             "data": data,
             "timestamp": datetime.utcnow().isoformat()
         }
-        await self.broadcast(json.dumps(message))
+        event = BroadcastEvent(
+            self._last_event_id,
+            message_type,
+            event_topic(message_type, data),
+            data,
+            json.dumps(message)
+        )
+        await self.bus.publish(event)
+
+    def _dispatch(self, event: BroadcastEvent):
+        """Deliver an event from the bus to this process's listeners and clients."""
+        if event.id > self._last_event_id:
+            self._last_event_id = event.id
+
+        if event.type not in SNAPSHOT_ONLY_TYPES:
+            self.event_history.append(event)
+        if event.type in SNAPSHOT_TYPES:
+            self.latest_events[event.type] = event
+        for listener in self.event_listeners:
+            listener.offer(event)
+
+        priority = self._event_priority(event)
+        for info in list(self.active_connections.values()):
+            self._enqueue(info, event.payload, priority, event.type)
+
+    def _event_priority(self, event: BroadcastEvent) -> int:
+        priority = message_priority(event.type)
+        if event.type == "status_update":
+            # A TX/RX transition must not wait behind the status rate cap
+            tx_status = event.data.get("tx_status")
+            if tx_status is not None and tx_status != self._last_tx_status:
+                self._last_tx_status = tx_status
+                priority = PRIORITY_CONTROL
+        return priority
+
+    async def send_snapshot(self, websocket: WebSocket):
+        """Queue the latest connection/status events for a newly connected client."""
+        info = self.active_connections.get(websocket)
+        if not info:
+            return
+        for message_type in SNAPSHOT_TYPES:
+            event = self.latest_events.get(message_type)
+            if event:
+                self._enqueue(info, event.payload, message_priority(event.type), event.type)
+
+    def add_event_listener(self, topics: Optional[Iterable[str]] = None,
+                           last_event_id: Optional[int] = None) -> EventListener:
+        """
+        Register a listener, pre-loaded with what it missed.
+
+        With last_event_id, every retained event newer than it is replayed.
+        Without it, the latest connection and status snapshots are replayed so
+        the consumer starts with current state.
+        """
+        listener = EventListener(set(topics) if topics else None)
+
+        if last_event_id is not None:
+            backlog = [event for event in self.event_history if event.id > last_event_id]
+        else:
+            backlog = [self.latest_events[t] for t in SNAPSHOT_TYPES if t in self.latest_events]
+
+        for event in backlog:
+            listener.offer(event)
+
+        self.event_listeners.add(listener)
+        return listener
+
+    def remove_event_listener(self, listener: EventListener):
+        self.event_listeners.discard(listener)
 
     async def broadcast_status(self, status: Dict[str, Any]):
         await self.broadcast_json(status, message_type="status_update")
@@ -74,5 +418,17 @@ class ConnectionManager:
     def get_connection_count(self) -> int:
         return len(self.active_connections)
 
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "connections": len(self.active_connections),
+            "reaped": self._reaped_count,
+            "event_listeners": len(self.event_listeners),
+            "last_event_id": self._last_event_id,
+            "bus": self.bus.get_status(),
+            "heartbeat_interval": HEARTBEAT_INTERVAL,
+            "heartbeat_timeout": HEARTBEAT_TIMEOUT,
+            "clients": [info.to_dict() for info in self.active_connections.values()]
+        }
+
 
 manager = ConnectionManager()
@@ -0,0 +1,121 @@
+"""
+X DAMAGE tracking for the FlDigi window.
+
+The DAMAGE extension reports which rectangles of a window were drawn to,
+so the capture thread can sleep until FlDigi actually paints and then grab
+only what changed, instead of polling on a timer.
+
+Uses its own python-xlib Display connection: the capture thread blocks on
+this socket, and events read here never mix with the connection used for
+grabs and synthetic clicks. Callers should fall back to timed capture when
+DamageTracker.available is False.
+"""
+
+import logging
+import select
+import time
+from typing import Optional, Tuple
+
+from Xlib import display as xdisplay
+from Xlib.ext import damage
+
+logger = logging.getLogger(__name__)
+
+Rect = Tuple[int, int, int, int]  # x, y, width, height in window coordinates
+
+
+def union_rect(a: Optional[Rect], b: Rect) -> Rect:
+    """Bounding box of two rectangles (a may be None)."""
+    if a is None:
+        return b
+    x, y = min(a[0], b[0]), min(a[1], b[1])
+    right = max(a[0] + a[2], b[0] + b[2])
+    bottom = max(a[1] + a[3], b[1] + b[3])
+    return x, y, right - x, bottom - y
+
+
+def intersect_rect(a: Rect, b: Rect) -> Optional[Rect]:
+    """Overlap of two rectangles, or None if they do not overlap."""
+    x, y = max(a[0], b[0]), max(a[1], b[1])
+    right = min(a[0] + a[2], b[0] + b[2])
+    bottom = min(a[1] + a[3], b[1] + b[3])
+    if right <= x or bottom <= y:
+        return None
+    return x, y, right - x, bottom - y
+
+
+class DamageTracker:
+    """Collects damage reported for one window."""
+
+    def __init__(self, window_id: int):
+        self.window_id = window_id
+        self.available = False
+        self.misses = 0  # Timed captures that found changes no damage event reported
+        self._display = None
+        self._damage = None
+        self._event_code = None
+
+        try:
+            self._display = xdisplay.Display()
+            if not self._display.has_extension(damage.extname):
+                logger.debug("DAMAGE extension not available")
+                self.close()
+                return
+            self._display.damage_query_version()
+            window = self._display.create_resource_object("window", window_id)
+            # Delta rectangles: one event per newly damaged area until it is
+            # subtracted, so a busy window does not flood the connection
+            self._damage = window.damage_create(damage.DamageReportDeltaRectangles)
+            self._event_code = self._display.extension_event.DamageNotify
+            self._display.sync()
+            self.available = True
+        except Exception as e:
+            logger.debug(f"DAMAGE tracking unavailable: {e}")
+            self.close()
+
+    def _drain(self, region: Optional[Rect]) -> Optional[Rect]:
+        while self._display.pending_events():
+            event = self._display.next_event()
+            if event.type & 0x7f == self._event_code:
+                area = event.area
+                region = union_rect(region, (area.x, area.y, area.width, area.height))
+        return region
+
+    def collect(self, timeout: float) -> Optional[Rect]:
+        """
+        Wait up to timeout seconds for damage and return the bounding box of
+        everything reported so far, or None if nothing was.
+
+        Reported damage is subtracted before returning, so a grab made
+        afterwards sees at least everything that was reported.
+        """
+        if not self.available:
+            return None
+
+        deadline = time.monotonic() + timeout
+        region = self._drain(None)
+        while region is None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            readable, _, _ = select.select([self._display.fileno()], [], [], remaining)
+            if readable:
+                region = self._drain(None)
+
+        # Anything drawn from here on is reported again (events already in
+        # flight are read on the next call and only cause an extra grab)
+        self._display.damage_subtract(self._damage)
+        self._display.sync()
+        return region
+
+    def close(self):
+        if self._display:
+            try:
+                if self._damage is not None:
+                    self._display.damage_destroy(self._damage)
+                self._display.close()
+            except Exception:
+                pass
+        self._display = None
+        self._damage = None
+        self.available = False
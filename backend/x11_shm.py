@@ -0,0 +1,287 @@
+"""
+MIT-SHM window capture for X11.
+
+python-xlib has no MIT-SHM support, so this talks to libX11/libXext through
+ctypes on its own Display connection. Pixels are written by the X server
+straight into a shared-memory segment that is reused across frames, instead
+of being streamed through the X protocol socket by XGetImage.
+
+Only works when the X server is local (SHM is not available over ssh -X or
+to remote displays); callers should fall back to get_image when
+ShmCapture.available is False or capture() returns None.
+"""
+
+import ctypes
+import ctypes.util
+import logging
+import threading
+from typing import Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+IPC_PRIVATE = 0
+IPC_CREAT = 0o1000
+IPC_RMID = 0
+Z_PIXMAP = 2
+ALL_PLANES = 0xffffffff
+
+
+class XShmSegmentInfo(ctypes.Structure):
+    _fields_ = [
+        ("shmseg", ctypes.c_ulong),
+        ("shmid", ctypes.c_int),
+        ("shmaddr", ctypes.c_void_p),
+        ("readOnly", ctypes.c_int),
+    ]
+
+
+class XImage(ctypes.Structure):
+    # Leading fields of XImage only; the struct is always allocated by Xlib
+    _fields_ = [
+        ("width", ctypes.c_int),
+        ("height", ctypes.c_int),
+        ("xoffset", ctypes.c_int),
+        ("format", ctypes.c_int),
+        ("data", ctypes.c_void_p),
+        ("byte_order", ctypes.c_int),
+        ("bitmap_unit", ctypes.c_int),
+        ("bitmap_bit_order", ctypes.c_int),
+        ("bitmap_pad", ctypes.c_int),
+        ("depth", ctypes.c_int),
+        ("bytes_per_line", ctypes.c_int),
+        ("bits_per_pixel", ctypes.c_int),
+    ]
+
+
+class XWindowAttributes(ctypes.Structure):
+    _fields_ = [
+        ("x", ctypes.c_int),
+        ("y", ctypes.c_int),
+        ("width", ctypes.c_int),
+        ("height", ctypes.c_int),
+        ("border_width", ctypes.c_int),
+        ("depth", ctypes.c_int),
+        ("visual", ctypes.c_void_p),
+        ("root", ctypes.c_ulong),
+        ("c_class", ctypes.c_int),
+        ("bit_gravity", ctypes.c_int),
+        ("win_gravity", ctypes.c_int),
+        ("backing_store", ctypes.c_int),
+        ("backing_planes", ctypes.c_ulong),
+        ("backing_pixel", ctypes.c_ulong),
+        ("save_under", ctypes.c_int),
+        ("colormap", ctypes.c_ulong),
+        ("map_installed", ctypes.c_int),
+        ("map_state", ctypes.c_int),
+        ("all_event_masks", ctypes.c_long),
+        ("your_event_mask", ctypes.c_long),
+        ("do_not_propagate_mask", ctypes.c_long),
+        ("override_redirect", ctypes.c_int),
+        ("screen", ctypes.c_void_p),
+    ]
+
+
+class XErrorEvent(ctypes.Structure):
+    _fields_ = [
+        ("type", ctypes.c_int),
+        ("display", ctypes.c_void_p),
+        ("resourceid", ctypes.c_ulong),
+        ("serial", ctypes.c_ulong),
+        ("error_code", ctypes.c_ubyte),
+        ("request_code", ctypes.c_ubyte),
+        ("minor_code", ctypes.c_ubyte),
+    ]
+
+
+XErrorHandler = ctypes.CFUNCTYPE(ctypes.c_int, ctypes.c_void_p, ctypes.POINTER(XErrorEvent))
+
+
+def _load_libraries():
+    names = {"X11": ctypes.util.find_library("X11"), "Xext": ctypes.util.find_library("Xext")}
+    if not all(names.values()):
+        return None
+
+    x11 = ctypes.CDLL(names["X11"])
+    xext = ctypes.CDLL(names["Xext"])
+    libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+
+    x11.XOpenDisplay.restype = ctypes.c_void_p
+    x11.XOpenDisplay.argtypes = [ctypes.c_char_p]
+    x11.XCloseDisplay.argtypes = [ctypes.c_void_p]
+    x11.XSync.argtypes = [ctypes.c_void_p, ctypes.c_int]
+    x11.XFree.argtypes = [ctypes.c_void_p]
+    x11.XGetWindowAttributes.argtypes = [ctypes.c_void_p, ctypes.c_ulong, ctypes.POINTER(XWindowAttributes)]
+    x11.XSetErrorHandler.restype = ctypes.c_void_p
+    x11.XSetErrorHandler.argtypes = [XErrorHandler]
+
+    xext.XShmQueryExtension.argtypes = [ctypes.c_void_p]
+    xext.XShmCreateImage.restype = ctypes.POINTER(XImage)
+    xext.XShmCreateImage.argtypes = [
+        ctypes.c_void_p, ctypes.c_void_p, ctypes.c_uint, ctypes.c_int,
+        ctypes.c_void_p, ctypes.POINTER(XShmSegmentInfo), ctypes.c_uint, ctypes.c_uint
+    ]
+    xext.XShmAttach.argtypes = [ctypes.c_void_p, ctypes.POINTER(XShmSegmentInfo)]
+    xext.XShmDetach.argtypes = [ctypes.c_void_p, ctypes.POINTER(XShmSegmentInfo)]
+    xext.XShmGetImage.argtypes = [
+        ctypes.c_void_p, ctypes.c_ulong, ctypes.POINTER(XImage),
+        ctypes.c_int, ctypes.c_int, ctypes.c_ulong
+    ]
+
+    libc.shmget.restype = ctypes.c_int
+    libc.shmget.argtypes = [ctypes.c_int, ctypes.c_size_t, ctypes.c_int]
+    libc.shmat.restype = ctypes.c_void_p
+    libc.shmat.argtypes = [ctypes.c_int, ctypes.c_void_p, ctypes.c_int]
+    libc.shmdt.argtypes = [ctypes.c_void_p]
+    libc.shmctl.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_void_p]
+
+    return x11, xext, libc
+
+
+# Xlib's default error handler exits the process, so errors raised during
+# capture (e.g. BadMatch when the window is unmapped) are recorded instead.
+_error_lock = threading.Lock()
+_last_error: Optional[int] = None
+
+
+@XErrorHandler
+def _record_error(display, event):
+    global _last_error
+    _last_error = event.contents.error_code
+    return 0
+
+
+class ShmCapture:
+    """Reusable shared-memory XImage for repeated captures of one window."""
+
+    def __init__(self):
+        self.available = False
+        self._libs = None
+        self._display = None
+        self._image = None
+        self._shminfo = XShmSegmentInfo()
+        self._size: Optional[Tuple[int, int, int]] = None
+        self._segment_size = 0  # Bytes in the attached segment, 0 = none
+
+        try:
+            self._libs = _load_libraries()
+            if not self._libs:
+                return
+            x11, xext, _ = self._libs
+            self._display = x11.XOpenDisplay(None)
+            if not self._display:
+                return
+            x11.XSetErrorHandler(_record_error)
+            self.available = bool(xext.XShmQueryExtension(self._display))
+        except (OSError, AttributeError) as e:
+            logger.debug(f"MIT-SHM unavailable: {e}")
+            self.available = False
+
+    def _free_header(self):
+        if self._image:
+            self._image.contents.data = None
+            self._libs[0].XFree(self._image)
+        self._image = None
+        self._size = None
+
+    def _release_image(self):
+        if not self._image and not self._segment_size:
+            return
+        x11, xext, libc = self._libs
+        if self._segment_size:
+            xext.XShmDetach(self._display, ctypes.byref(self._shminfo))
+            x11.XSync(self._display, 0)
+            libc.shmdt(self._shminfo.shmaddr)
+            self._segment_size = 0
+        self._free_header()
+
+    def _attach_segment(self, size: int) -> bool:
+        x11, xext, libc = self._libs
+        shmid = libc.shmget(IPC_PRIVATE, size, IPC_CREAT | 0o600)
+        if shmid < 0:
+            return False
+
+        addr = libc.shmat(shmid, None, 0)
+        # Marked for removal now; the kernel frees it after the last detach,
+        # so the segment cannot leak if the process dies.
+        libc.shmctl(shmid, IPC_RMID, None)
+        if addr in (None, ctypes.c_void_p(-1).value):
+            return False
+
+        self._shminfo.shmid = shmid
+        self._shminfo.shmaddr = addr
+        self._shminfo.readOnly = 0
+        if not xext.XShmAttach(self._display, ctypes.byref(self._shminfo)):
+            libc.shmdt(addr)
+            return False
+        x11.XSync(self._display, 0)
+        self._segment_size = size
+        return True
+
+    def _prepare(self, window_id: int, width: int, height: int) -> bool:
+        x11, xext, libc = self._libs
+
+        attrs = XWindowAttributes()
+        if not x11.XGetWindowAttributes(self._display, window_id, ctypes.byref(attrs)):
+            return False
+
+        key = (width, height, attrs.depth)
+        if self._image and self._size == key:
+            return True
+
+        # The XImage header is cheap to recreate; the segment is kept while it
+        # is large enough, so partial (damaged-region) grabs of varying size
+        # do not allocate a new one every frame.
+        self._free_header()
+        image = xext.XShmCreateImage(
+            self._display, attrs.visual, attrs.depth, Z_PIXMAP,
+            None, ctypes.byref(self._shminfo), width, height
+        )
+        if not image:
+            return False
+        if image.contents.bits_per_pixel != 32:
+            x11.XFree(image)
+            return False
+
+        size = image.contents.bytes_per_line * height
+        if size > self._segment_size:
+            self._release_image()
+            if not self._attach_segment(size):
+                x11.XFree(image)
+                return False
+
+        image.contents.data = self._shminfo.shmaddr
+        self._image = image
+        self._size = key
+        return True
+
+    def capture(self, window_id: int, x: int, y: int, width: int, height: int) -> Optional[Tuple[memoryview, int]]:
+        """
+        Capture a rectangle of a window into the shared segment.
+
+        Returns (buffer, bytes_per_line) with BGRX pixels, or None on failure.
+        The buffer is overwritten by the next capture; copy or convert it first.
+        """
+        global _last_error
+        if not self.available:
+            return None
+
+        with _error_lock:
+            _last_error = None
+            if not self._prepare(window_id, width, height):
+                return None
+
+            x11, xext, _ = self._libs
+            ok = xext.XShmGetImage(self._display, window_id, self._image, x, y, ALL_PLANES)
+            if not ok or _last_error is not None:
+                return None
+
+            stride = self._image.contents.bytes_per_line
+            buffer = (ctypes.c_char * (stride * height)).from_address(self._shminfo.shmaddr)
+            return memoryview(buffer).cast("B"), stride
+
+    def close(self):
+        if self._libs and self._display:
+            self._release_image()
+            self._libs[0].XCloseDisplay(self._display)
+        self._display = None
+        self.available = False
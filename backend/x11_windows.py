@@ -0,0 +1,195 @@
+"""
+FlDigi window discovery on X11.
+
+Looking a window up by title means a round trip per window, and walking
+the whole window tree on a busy desktop takes hundreds of milliseconds.
+WindowFinder remembers the window it found (and its process id) and keeps
+that fresh from X events instead of searching again:
+
+    PropertyNotify on the root window   _NET_CLIENT_LIST changed, rescan it
+    DestroyNotify for the found window  forget it
+
+Searches only happen while no window is known, and are rate-limited: the
+_NET_CLIENT_LIST scan when it changes (or every rescan_interval), the tree
+walk (for window managers without _NET_CLIENT_LIST) at most every
+walk_interval and over at most walk_limit windows. The walk is a round
+trip per window, so it runs on a background thread with a connection of
+its own; find() picks its result up on a later call.
+
+Uses its own python-xlib Display connection so events read here never mix
+with the connection used for grabs and synthetic clicks.
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from typing import Iterable, Optional
+
+from Xlib import X, display as xdisplay
+
+logger = logging.getLogger(__name__)
+
+
+class WindowFinder:
+    """Finds and remembers the top-level window whose title contains match."""
+
+    def __init__(self, match: str = "fldigi", rescan_interval: float = 5.0,
+                 walk_interval: float = 10.0, walk_limit: int = 300):
+        self.match = match.lower()
+        self.rescan_interval = rescan_interval
+        self.walk_interval = walk_interval
+        self.walk_limit = walk_limit
+        self.window_id: Optional[int] = None
+        self.pid: Optional[int] = None  # _NET_WM_PID of the last window found
+        self._display = None
+        self._root = None
+        self._client_list_atom = None
+        self._pid_atom = None
+        self._client_list_changed = True
+        self._last_scan = 0.0
+        self._last_walk = 0.0
+        self._walk_thread: Optional[threading.Thread] = None
+        self._walk_found: Optional[int] = None  # Set by the walk thread
+
+    def _connect(self):
+        if self._display is not None:
+            return
+        self._display = xdisplay.Display()
+        # Requests on windows that vanish meanwhile fail asynchronously; ignore them
+        self._display.set_error_handler(lambda *args: None)
+        self._root = self._display.screen().root
+        self._client_list_atom = self._display.intern_atom("_NET_CLIENT_LIST")
+        self._pid_atom = self._display.intern_atom("_NET_WM_PID")
+        self._root.change_attributes(event_mask=X.PropertyChangeMask)
+        self._display.flush()
+
+    def _pump(self):
+        """Apply queued events without blocking."""
+        while self._display.pending_events():
+            event = self._display.next_event()
+            if event.type == X.PropertyNotify and event.atom == self._client_list_atom:
+                self._client_list_changed = True
+            elif event.type == X.DestroyNotify and event.window.id == self.window_id:
+                self.forget(self.window_id)
+
+    def find(self) -> Optional[int]:
+        """
+        Return the FlDigi window id, searching only if none is known and a
+        search is due. Never walks the window tree more than once per
+        walk_interval; a walk runs in the background and its result is
+        returned by a later call.
+        """
+        self._connect()
+        self._pump()
+        if self.window_id:
+            return self.window_id
+
+        now = time.monotonic()
+        found, self._walk_found = self._walk_found, None
+        if not found and (self._client_list_changed or now - self._last_scan >= self.rescan_interval):
+            self._client_list_changed = False
+            self._last_scan = now
+            found = self._scan_client_list()
+        if not found and now - self._last_walk >= self.walk_interval and not self._walking():
+            self._last_walk = now
+            self._walk_thread = threading.Thread(target=self._walk, name="x11-window-walk", daemon=True)
+            self._walk_thread.start()
+
+        if found:
+            self._remember(found)
+        return self.window_id
+
+    def forget(self, window_id: Optional[int]):
+        """Drop the remembered window (e.g. after a capture error) so the next find() searches."""
+        if window_id and window_id == self.window_id:
+            self.window_id = None
+            self._walk_found = None
+            self._client_list_changed = True
+
+    def _title_matches(self, window) -> bool:
+        try:
+            name = window.get_wm_name()
+        except Exception:
+            return False
+        return bool(name) and self.match in str(name).lower()
+
+    def _window_pid(self, window) -> Optional[int]:
+        try:
+            prop = window.get_full_property(self._pid_atom, X.AnyPropertyType)
+        except Exception:
+            return None
+        return int(prop.value[0]) if prop and len(prop.value) else None
+
+    def _scan_client_list(self) -> Optional[int]:
+        try:
+            prop = self._root.get_full_property(self._client_list_atom, X.AnyPropertyType)
+        except Exception:
+            return None
+        if not prop:
+            return None
+
+        windows = [self._display.create_resource_object("window", wid) for wid in prop.value]
+        matches = [window for window in windows if self._title_matches(window)]
+        if not matches:
+            return None
+        # FlDigi's dialogs have "fldigi" in their titles too; prefer the
+        # process we were following, otherwise the first match
+        if self.pid is not None:
+            for window in matches:
+                if self._window_pid(window) == self.pid:
+                    return window.id
+        return matches[0].id
+
+    def _walking(self) -> bool:
+        return self._walk_thread is not None and self._walk_thread.is_alive()
+
+    def _walk(self):
+        """Walk thread: search the tree over a connection of its own."""
+        try:
+            connection = xdisplay.Display()
+        except Exception as e:
+            logger.debug(f"Window search could not connect: {e}")
+            return
+        try:
+            connection.set_error_handler(lambda *args: None)
+            self._walk_found = self._walk_tree(connection.screen().root)
+        finally:
+            connection.close()
+
+    def _walk_tree(self, root) -> Optional[int]:
+        """Breadth-first search from the root, so top-level windows are checked first."""
+        queue = deque([root])
+        visited = 0
+        while queue and visited < self.walk_limit:
+            window = queue.popleft()
+            visited += 1
+            if window is not root and self._title_matches(window):
+                return window.id
+            try:
+                children: Iterable = window.query_tree().children
+            except Exception:
+                continue
+            queue.extend(children)
+        if queue:
+            logger.debug(f"Window search stopped after {visited} windows")
+        return None
+
+    def _remember(self, window_id: int):
+        window = self._display.create_resource_object("window", window_id)
+        self.window_id = window_id
+        self.pid = self._window_pid(window) or self.pid
+        # Get DestroyNotify for the window itself (a reparenting window
+        # manager means it is not a child of the root)
+        window.change_attributes(event_mask=X.StructureNotifyMask)
+        self._display.flush()
+
+    def close(self):
+        if self._display:
+            try:
+                self._display.close()
+            except Exception:
+                pass
+        self._display = None
+        self.window_id = None
+        self._walk_found = None
@@ -0,0 +1,140 @@
+"""Shared helpers for the benchmark scripts: percentiles, process sampling, result files."""
+
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    PSUTIL_AVAILABLE = False
+
+RESULTS_DIR = Path(__file__).resolve().parent.parent / "bench_results"
+
+
+def percentiles(values: List[float], points=(50, 90, 99)) -> Dict[str, Optional[float]]:
+    """Nearest-rank percentiles plus min/max/mean, rounded for readability."""
+    if not values:
+        return {**{f"p{p}": None for p in points}, "min": None, "max": None, "mean": None, "count": 0}
+
+    ordered = sorted(values)
+    result = {}
+    for p in points:
+        index = min(len(ordered) - 1, max(0, int(round(p / 100.0 * len(ordered))) - 1))
+        result[f"p{p}"] = round(ordered[index], 3)
+    result["min"] = round(ordered[0], 3)
+    result["max"] = round(ordered[-1], 3)
+    result["mean"] = round(sum(ordered) / len(ordered), 3)
+    result["count"] = len(ordered)
+    return result
+
+
+class ProcessSampler:
+    """
+    Samples CPU% and RSS of a process once per interval in a background thread.
+
+    Uses psutil when installed, otherwise /proc (Linux only). If neither is
+    available the summary reports None.
+    """
+
+    def __init__(self, pid: int, interval: float = 0.5):
+        self.pid = pid
+        self.interval = interval
+        self.cpu_samples: List[float] = []
+        self.rss_samples: List[float] = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _read_proc(self):
+        with open(f"/proc/{self.pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        cpu_ticks = int(fields[11]) + int(fields[12])
+        with open(f"/proc/{self.pid}/statm") as f:
+            rss_pages = int(f.read().split()[1])
+        return cpu_ticks / os.sysconf("SC_CLK_TCK"), rss_pages * os.sysconf("SC_PAGE_SIZE")
+
+    def _run(self):
+        if PSUTIL_AVAILABLE:
+            process = psutil.Process(self.pid)
+            process.cpu_percent(None)
+            while not self._stop.wait(self.interval):
+                try:
+                    self.cpu_samples.append(process.cpu_percent(None))
+                    self.rss_samples.append(process.memory_info().rss / 1e6)
+                except psutil.Error:
+                    return
+            return
+
+        if not os.path.exists(f"/proc/{self.pid}/stat"):
+            return
+
+        last_cpu, _ = self._read_proc()
+        last_time = time.monotonic()
+        while not self._stop.wait(self.interval):
+            try:
+                cpu, rss = self._read_proc()
+            except OSError:
+                return
+            now = time.monotonic()
+            self.cpu_samples.append(100.0 * (cpu - last_cpu) / (now - last_time))
+            self.rss_samples.append(rss / 1e6)
+            last_cpu, last_time = cpu, now
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join(timeout=2)
+
+    def summary(self) -> Dict[str, Optional[float]]:
+        if not self.cpu_samples:
+            return {"cpu_percent_mean": None, "cpu_percent_max": None, "rss_mb_mean": None, "rss_mb_max": None}
+        return {
+            "cpu_percent_mean": round(sum(self.cpu_samples) / len(self.cpu_samples), 1),
+            "cpu_percent_max": round(max(self.cpu_samples), 1),
+            "rss_mb_mean": round(sum(self.rss_samples) / len(self.rss_samples), 1),
+            "rss_mb_max": round(max(self.rss_samples), 1)
+        }
+
+
+def save_results(name: str, results: Dict[str, Any], output: Optional[str] = None) -> Path:
+    """Write results as JSON, by default to bench_results/<name>_<timestamp>.json."""
+    if output:
+        path = Path(output)
+    else:
+        RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+        path = RESULTS_DIR / f"{name}_{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2)
+    return path
+
+
+def compare_results(old_path: str, new_path: str, keys: List[str]):
+    """Print dotted-path metrics side by side for two result files."""
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+
+    def lookup(data, dotted):
+        for part in dotted.split("."):
+            if not isinstance(data, dict) or part not in data:
+                return None
+            data = data[part]
+        return data
+
+    print(f"{'metric':<40} {'old':>12} {'new':>12} {'change':>10}")
+    for key in keys:
+        a, b = lookup(old, key), lookup(new, key)
+        change = ""
+        if isinstance(a, (int, float)) and isinstance(b, (int, float)) and a:
+            change = f"{(b - a) / a * 100:+.1f}%"
+        print(f"{key:<40} {str(a):>12} {str(b):>12} {change:>10}")
@@ -0,0 +1,156 @@
+"""
+Simulated FLDIGI XML-RPC server for benchmarks.
+
+Implements the subset of the FLDIGI XML-RPC API that the DigiShell backend
+polls (name/version, modem, rig, TRX state, RX data). RX data is generated at
+a fixed rate and every chunk carries a marker of the form ``[#<seq>:<t_us>]``
+so clients can measure end-to-end latency and spot gaps.
+
+Run standalone:
+    python -m benchmarks.fake_fldigi --port 7362 --rx-rate 20
+"""
+
+import argparse
+import threading
+import time
+from socketserver import ThreadingMixIn
+from xmlrpc.client import Binary
+from xmlrpc.server import SimpleXMLRPCServer, SimpleXMLRPCRequestHandler
+
+
+class _QuietHandler(SimpleXMLRPCRequestHandler):
+    rpc_paths = ('/', '/RPC2')
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _ThreadingXMLRPCServer(ThreadingMixIn, SimpleXMLRPCServer):
+    daemon_threads = True
+
+
+class FakeFldigi:
+    """In-memory FLDIGI state plus an RX text generator thread."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 7362, rx_rate: float = 20.0):
+        self.host = host
+        self.port = port
+        self.rx_rate = rx_rate
+        self.modem = "BPSK31"
+        self.carrier = 1500
+        self.bandwidth = 31
+        self.trx = "RX"
+        self.rig_frequency = 14070000.0
+        self.rig_mode = "USB"
+        self.seq = 0
+        self._rx_pending = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._server = None
+        self._threads = []
+
+    def _register(self, server):
+        functions = {
+            "fldigi.name": lambda: "fldigi",
+            "fldigi.version_struct": lambda: {"major": 4, "minor": 2, "patch": ".05"},
+            "fldigi.list": lambda: [],
+            "modem.get_name": lambda: self.modem,
+            "modem.set_by_name": self._set_modem,
+            "modem.get_carrier": lambda: self.carrier,
+            "modem.set_carrier": self._set_carrier,
+            "modem.get_bandwidth": lambda: self.bandwidth,
+            "modem.get_quality": lambda: 87.5,
+            "main.get_status1": lambda: "s/n 12 dB",
+            "main.get_status2": lambda: "",
+            "main.get_trx_status": lambda: self.trx,
+            "main.tx": lambda: self._set_trx("TX"),
+            "main.rx": lambda: self._set_trx("RX"),
+            "main.tune": lambda: self._set_trx("TUNE"),
+            "main.abort": lambda: self._set_trx("RX"),
+            "rig.get_name": lambda: "Simulated rig",
+            "rig.get_frequency": lambda: self.rig_frequency,
+            "rig.get_mode": lambda: self.rig_mode,
+            "rx.get_data": self._get_rx_data,
+            "tx.get_data": lambda: Binary(b""),
+            "text.add_tx": lambda text: 0,
+            "text.clear_tx": lambda: 0,
+            "text.clear_rx": lambda: 0,
+        }
+        for name, func in functions.items():
+            server.register_function(func, name)
+
+    def _set_modem(self, name):
+        self.modem = name
+        return name
+
+    def _set_carrier(self, frequency):
+        previous = self.carrier
+        self.carrier = int(frequency)
+        return previous
+
+    def _set_trx(self, state):
+        self.trx = state
+        return 0
+
+    def _get_rx_data(self):
+        with self._lock:
+            data = "".join(self._rx_pending)
+            self._rx_pending.clear()
+        return Binary(data.encode("utf-8"))
+
+    def _generate_rx(self):
+        interval = 1.0 / self.rx_rate
+        next_time = time.monotonic()
+        while not self._stop.is_set():
+            self.seq += 1
+            marker = f"[#{self.seq}:{int(time.time() * 1_000_000)}] "
+            with self._lock:
+                self._rx_pending.append(marker)
+            next_time += interval
+            self._stop.wait(max(0.0, next_time - time.monotonic()))
+
+    def start(self):
+        self._server = _ThreadingXMLRPCServer(
+            (self.host, self.port),
+            requestHandler=_QuietHandler,
+            allow_none=True,
+            logRequests=False
+        )
+        self._register(self._server)
+        self._threads = [
+            threading.Thread(target=self._server.serve_forever, daemon=True),
+        ]
+        if self.rx_rate > 0:
+            self._threads.append(threading.Thread(target=self._generate_rx, daemon=True))
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulated FLDIGI XML-RPC server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7362)
+    parser.add_argument("--rx-rate", type=float, default=20.0, help="RX chunks per second")
+    args = parser.parse_args()
+
+    fake = FakeFldigi(args.host, args.port, args.rx_rate)
+    fake.start()
+    print(f"Simulated FLDIGI listening on {args.host}:{args.port} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        fake.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,382 @@
+"""
+End-to-end waterfall capture benchmark on a virtual X server.
+
+Starts Xvfb, opens a synthetic window titled like FLDIGI that scrolls a
+waterfall (a grey "RX panel" on top, the waterfall below), and runs
+WaterfallCaptureService against it with N fake subscribers. Reports
+achieved capture fps, per-stage timings, delivered fps and bytes/s per
+subscriber, capture-to-send latency, event-loop lag and process CPU.
+
+Requires Xvfb on PATH (e.g. apt install xvfb) and python-xlib. With
+--synthetic there is no X server: the service's captures are replaced by
+the same synthetic window rendered in memory, which measures everything
+after the grab (analysis, encoding, distribution) on any machine.
+
+Usage:
+    python -m benchmarks.waterfall_capture --subscribers 20 --duration 20
+    python -m benchmarks.waterfall_capture --synthetic --subscribers 20 --crop exact
+    python -m benchmarks.waterfall_capture --subscribers 50 --slow-fraction 0.2 --codec indexed --crop exact
+    python -m benchmarks.waterfall_capture --compare bench_results/old.json bench_results/new.json
+"""
+
+import argparse
+import asyncio
+import os
+import shutil
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from backend.waterfall_capture import FRAME_HEADER, waterfall_service
+from benchmarks.common import ProcessSampler, percentiles, save_results, compare_results
+
+WINDOW_TITLE = "fldigi ver4.2.00 - BENCH"
+PANEL_HEIGHT = 200  # Grey area above the waterfall, like FLDIGI's RX/TX panes
+PANEL_GREY = 0xc0c0c0
+
+COMPARE_KEYS = [
+    "service.capture_fps",
+    "service.stage_ms.capture",
+    "service.stage_ms.analyze",
+    "service.stage_ms.encode",
+    "subscribers.fast.fps_mean",
+    "subscribers.fast.bytes_per_second_mean",
+    "subscribers.slow.fps_mean",
+    "latency_ms.p50",
+    "latency_ms.p99",
+    "loop_lag_ms.p99",
+    "process.cpu_percent_mean",
+]
+
+
+def start_xvfb(width: int, height: int) -> Tuple[subprocess.Popen, str]:
+    """Start Xvfb on a free display number and return (process, DISPLAY)."""
+    if not shutil.which("Xvfb"):
+        raise RuntimeError("Xvfb not found on PATH (install the xvfb package)")
+
+    read_fd, write_fd = os.pipe()
+    process = subprocess.Popen(
+        ["Xvfb", "-displayfd", str(write_fd), "-screen", "0", f"{width}x{height}x24", "-nolisten", "tcp"],
+        pass_fds=(write_fd,), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    os.close(write_fd)
+
+    # Xvfb writes the display number once it is ready for connections
+    with os.fdopen(read_fd) as pipe:
+        number = pipe.readline().strip()
+    if not number:
+        process.kill()
+        raise RuntimeError("Xvfb did not start")
+    return process, f":{number}"
+
+
+def serve_window(width: int, height: int, fps: float, scroll: int):
+    """
+    Window process: paint a scrolling synthetic waterfall until killed.
+
+    Each tick shifts the waterfall down on the server with copy_area and
+    puts only the new rows, like FLDIGI does.
+    """
+    import numpy as np
+    from Xlib import X, display as xdisplay
+    from benchmarks.waterfall_frames import SyntheticWaterfall
+
+    display = xdisplay.Display()
+    screen = display.screen()
+    window = screen.root.create_window(
+        0, 0, width, PANEL_HEIGHT + height, 0, screen.root_depth,
+        X.InputOutput, X.CopyFromParent, background_pixel=screen.black_pixel
+    )
+    window.set_wm_name(WINDOW_TITLE)
+    window.map()
+    gc = window.create_gc(foreground=PANEL_GREY)
+    window.fill_rectangle(gc, 0, 0, width, PANEL_HEIGHT)
+
+    # Keep each PutImage request under the core protocol size limit
+    rows_per_request = max(1, 200000 // (width * 4))
+
+    def put_rows(pixels, y):
+        bgrx = np.zeros(pixels.shape[:2] + (4,), dtype=np.uint8)
+        bgrx[..., :3] = pixels[..., ::-1]
+        for start in range(0, bgrx.shape[0], rows_per_request):
+            chunk = bgrx[start:start + rows_per_request]
+            window.put_image(gc, 0, y + start, width, chunk.shape[0], X.ZPixmap, screen.root_depth, 0, chunk.tobytes())
+
+    waterfall = SyntheticWaterfall(width, height, scroll)
+    put_rows(waterfall.next_frame(), PANEL_HEIGHT)
+    display.sync()
+
+    interval = 1.0 / fps
+    next_time = time.perf_counter()
+    while True:
+        frame = waterfall.next_frame()
+        window.copy_area(gc, window, 0, PANEL_HEIGHT, width, height - scroll, 0, PANEL_HEIGHT + scroll)
+        put_rows(frame[:scroll], PANEL_HEIGHT)
+        display.sync()
+
+        next_time += interval
+        delay = next_time - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        else:
+            next_time = time.perf_counter()
+
+
+class SyntheticCapture:
+    """
+    Stands in for WaterfallCaptureService._capture_pixels with --synthetic:
+    the window serve_window paints, rendered in memory and scrolled at
+    window_fps in real time, cropped like a real grab.
+    """
+
+    def __init__(self, service, width: int, height: int, fps: float, scroll: int):
+        import numpy as np
+        from benchmarks.waterfall_frames import SyntheticWaterfall
+
+        self.np = np
+        self.service = service
+        self.fps = fps
+        self.waterfall = SyntheticWaterfall(width, height, scroll)
+        self.window = np.empty((PANEL_HEIGHT + height, width, 3), dtype=np.uint8)
+        self.window[:PANEL_HEIGHT] = [(PANEL_GREY >> shift) & 0xff for shift in (16, 8, 0)]
+        self.window[PANEL_HEIGHT:] = self.waterfall.next_frame()
+        self.start = time.perf_counter()
+        self.ticks = 0
+
+    def __call__(self, full: bool = False, out=None, damage=None):
+        capture_start = time.perf_counter()
+        ticks = int((capture_start - self.start) * self.fps)
+        if ticks > self.ticks:
+            self.ticks = ticks
+            self.window[PANEL_HEIGHT:] = self.waterfall.next_frame()
+
+        window_height, window_width = self.window.shape[:2]
+        x, y, width, height = self.service._capture_rect(window_width, window_height, full)
+        region = self.window[y:y + height, x:x + width]
+        if out is None or out.shape != region.shape:
+            out = self.np.empty_like(region)
+        self.np.copyto(out, region)
+
+        self.service.capture_method = "synthetic"
+        self.service.last_window_size = (window_width, window_height)
+        if not full:
+            self.service.last_capture_rect = (x, y, width, height)
+        self.service._record_capture_time(capture_start)
+        return out
+
+
+class FakeSubscriber:
+    """Stands in for a /api/waterfall/ws connection; counts what it is sent."""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.frames = 0
+        self.bytes = 0
+        self.latencies: List[float] = []
+
+    async def send_bytes(self, data: bytes):
+        timestamp = FRAME_HEADER.unpack_from(data)[3]
+        self.latencies.append((time.time() - timestamp) * 1000)
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.frames += 1
+        self.bytes += len(data)
+
+    async def send_json(self, data: dict):
+        pass
+
+    def reset(self):
+        self.frames = 0
+        self.bytes = 0
+        self.latencies = []
+
+
+async def _monitor_loop_lag(samples: List[float], stop: asyncio.Event, interval: float = 0.01):
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        start = loop.time()
+        await asyncio.sleep(interval)
+        samples.append((loop.time() - start - interval) * 1000)
+
+
+def _group_summary(subscribers: List[FakeSubscriber], duration: float) -> Dict[str, Any]:
+    if not subscribers:
+        return {"count": 0}
+    fps = [sub.frames / duration for sub in subscribers]
+    rates = [sub.bytes / duration for sub in subscribers]
+    return {
+        "count": len(subscribers),
+        "fps_mean": round(sum(fps) / len(fps), 2),
+        "fps_min": round(min(fps), 2),
+        "bytes_per_second_mean": round(sum(rates) / len(rates)),
+        "bytes_per_second_total": round(sum(rates))
+    }
+
+
+async def run_benchmark(args) -> Dict[str, Any]:
+    waterfall_service.fps = args.capture_fps
+    waterfall_service.encode_processes = args.encode_processes
+    slow_count = int(args.subscribers * args.slow_fraction)
+    fast = [FakeSubscriber() for _ in range(args.subscribers - slow_count)]
+    slow = [FakeSubscriber(args.slow_delay) for _ in range(slow_count)]
+    for sub in fast + slow:
+        waterfall_service.add_subscriber(sub)
+        waterfall_service.set_subscriber_codecs(sub, [args.codec])
+
+    if args.crop == "exact":
+        waterfall_service.set_crop(0, PANEL_HEIGHT, args.width, args.height)
+    if args.synthetic:
+        waterfall_service._capture_pixels = SyntheticCapture(
+            waterfall_service, args.width, args.height, args.window_fps, args.scroll
+        )
+
+    sampler = ProcessSampler(os.getpid())
+    lag_samples: List[float] = []
+    stop = asyncio.Event()
+
+    await waterfall_service.enable()
+    try:
+        if args.crop == "auto":
+            region = await waterfall_service.auto_detect_crop()
+            print(f"Auto-detected waterfall region: {region}")
+
+        await asyncio.sleep(args.warmup)
+        for sub in fast + slow:
+            sub.reset()
+
+        lag_task = asyncio.create_task(_monitor_loop_lag(lag_samples, stop))
+        sampler.start()
+        await asyncio.sleep(args.duration)
+        stop.set()
+        await lag_task
+        sampler.stop()
+        status = waterfall_service.get_status()
+    finally:
+        await waterfall_service.disable()
+
+    latencies = [value for sub in fast + slow for value in sub.latencies]
+    return {
+        "config": {
+            "subscribers": args.subscribers,
+            "slow_fraction": args.slow_fraction,
+            "slow_delay": args.slow_delay,
+            "codec": args.codec,
+            "crop": args.crop,
+            "width": args.width,
+            "height": args.height,
+            "scroll": args.scroll,
+            "window_fps": args.window_fps,
+            "capture_fps": args.capture_fps,
+            "encode_processes": args.encode_processes,
+            "synthetic": args.synthetic,
+            "duration": args.duration
+        },
+        "service": {
+            "capture_method": status["capture_method"],
+            "capture_trigger": status["capture_trigger"],
+            "capture_fps": status["capture_fps"],
+            "stage_ms": status["stage_ms"],
+            "keyframes_sent": status["keyframes_sent"],
+            "strips_sent": status["strips_sent"],
+            "frames_skipped": status["frames_skipped"],
+            "crop": status["crop"]
+        },
+        "subscribers": {
+            "fast": _group_summary(fast, args.duration),
+            "slow": _group_summary(slow, args.duration)
+        },
+        "latency_ms": percentiles(latencies),
+        "loop_lag_ms": percentiles(lag_samples),
+        "process": sampler.summary()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="DigiShell waterfall capture benchmark (Xvfb)")
+    parser.add_argument("--subscribers", type=int, default=10)
+    parser.add_argument("--slow-fraction", type=float, default=0.0, help="Fraction of subscribers that send slowly")
+    parser.add_argument("--slow-delay", type=float, default=0.3, help="Seconds each send takes for a slow subscriber")
+    parser.add_argument("--codec", default="jpeg", help="Codec requested by every subscriber")
+    parser.add_argument("--crop", choices=("none", "exact", "auto"), default="none",
+                        help="Capture the whole window, the known waterfall rectangle, or auto-detect it")
+    parser.add_argument("--width", type=int, default=1000, help="Waterfall width")
+    parser.add_argument("--height", type=int, default=150, help="Waterfall height")
+    parser.add_argument("--scroll", type=int, default=2, help="Rows the synthetic waterfall scrolls per tick")
+    parser.add_argument("--window-fps", type=float, default=20.0, help="Synthetic waterfall scroll rate")
+    parser.add_argument("--capture-fps", type=int, default=15, help="WaterfallCaptureService.fps")
+    parser.add_argument("--encode-processes", type=int, default=0,
+                        help="Encode worker processes (0 = one encode thread)")
+    parser.add_argument("--duration", type=float, default=15.0, help="Measurement time in seconds")
+    parser.add_argument("--warmup", type=float, default=2.0, help="Seconds before measuring")
+    parser.add_argument("--output", help="Result file (default: bench_results/waterfall_capture_<timestamp>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="Compare two result files and exit")
+    parser.add_argument("--synthetic", action="store_true",
+                        help="No X server: capture an in-memory rendering of the synthetic window")
+    parser.add_argument("--serve-window", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.compare:
+        compare_results(args.compare[0], args.compare[1], COMPARE_KEYS)
+        return
+
+    if args.serve_window:
+        serve_window(args.width, args.height, args.window_fps, args.scroll)
+        return
+
+    if args.synthetic:
+        print(f"Synthetic window, {args.subscribers} subscribers, codec {args.codec}, crop {args.crop}")
+        _report(asyncio.run(run_benchmark(args)), args)
+        return
+
+    try:
+        xvfb, display_name = start_xvfb(max(1280, args.width), max(800, PANEL_HEIGHT + args.height))
+    except RuntimeError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    window: Optional[subprocess.Popen] = None
+    try:
+        os.environ["DISPLAY"] = display_name
+        window = subprocess.Popen([
+            sys.executable, "-m", "benchmarks.waterfall_capture", "--serve-window",
+            "--width", str(args.width), "--height", str(args.height),
+            "--scroll", str(args.scroll), "--window-fps", str(args.window_fps)
+        ])
+        time.sleep(1.0)  # Let the window map and paint
+
+        print(f"Xvfb on {display_name}, {args.subscribers} subscribers, codec {args.codec}, crop {args.crop}")
+        results = asyncio.run(run_benchmark(args))
+    finally:
+        if window:
+            window.terminate()
+            window.wait()
+        xvfb.terminate()
+        xvfb.wait()
+    _report(results, args)
+
+
+def _report(results: Dict[str, Any], args):
+    service = results["service"]
+    print(
+        f"\nCapture: {service['capture_method']} on {service['capture_trigger']} at "
+        f"{service['capture_fps']} fps, stage ms {service['stage_ms']}"
+    )
+    print(f"Frames: {service['keyframes_sent']} keyframes, {service['strips_sent']} strips, {service['frames_skipped']} unchanged")
+    for group in ("fast", "slow"):
+        summary = results["subscribers"][group]
+        if summary["count"]:
+            print(
+                f"{group:>5}: {summary['count']} subscribers, {summary['fps_mean']} fps "
+                f"(min {summary['fps_min']}), {summary['bytes_per_second_mean'] / 1024:.1f} KB/s each"
+            )
+    print(f"Capture-to-send latency ms: {results['latency_ms']}")
+    print(f"Event-loop lag ms: {results['loop_lag_ms']}")
+    print(f"Process: {results['process']}")
+
+    path = save_results("waterfall_capture", results, args.output)
+    print(f"\nResults written to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Waterfall codec benchmark.
+
+Encodes the same frames with every waterfall codec and reports payload
+size and encode time for keyframes (whole frame) and strips (the rows
+exposed by each scroll), plus the resulting bandwidth at a given frame
+rate. Use it to choose DIGISHELL_WATERFALL_CODECS for a deployment.
+
+Usage:
+    python -m benchmarks.waterfall_codecs                      # synthetic waterfall
+    python -m benchmarks.waterfall_codecs --record frames/ --count 100   # save live FLDIGI frames
+    python -m benchmarks.waterfall_codecs --frames frames/     # recorded frames
+    python -m benchmarks.waterfall_codecs --compare bench_results/old.json bench_results/new.json
+"""
+
+import argparse
+import io
+import sys
+import time
+from typing import Dict, Any, List
+
+import numpy as np
+from PIL import Image
+
+from backend.waterfall_analysis import detect_scroll
+from backend.waterfall_codecs import CODECS
+from benchmarks.common import percentiles, save_results, compare_results
+from benchmarks.waterfall_frames import SyntheticWaterfall, load_frames, record_frames, save_frames
+
+COMPARE_KEYS = [
+    f"codecs.{name}.{metric}"
+    for name in CODECS
+    for metric in ("keyframe_bytes.mean", "strip_bytes.mean", "keyframe_ms.p50", "strip_ms.p50", "bytes_per_second")
+]
+
+
+def _strips(frames: List[np.ndarray]) -> List[Image.Image]:
+    """Newly exposed rows of each frame that is an exact scroll of the one before."""
+    strips = []
+    for previous, current in zip(frames, frames[1:]):
+        scroll = detect_scroll(previous, current)
+        if scroll:
+            y = 0 if scroll > 0 else current.shape[0] + scroll
+            strips.append(Image.fromarray(current[y:y + abs(scroll)]))
+    return strips
+
+
+def _measure(codec, images: List[Image.Image], quality: int, buffer: io.BytesIO):
+    sizes, times = [], []
+    for image in images:
+        start = time.perf_counter()
+        data = codec.encode(image, quality, buffer)
+        times.append((time.perf_counter() - start) * 1000)
+        sizes.append(len(data))
+    return sizes, times
+
+
+def run(frames: List[np.ndarray], codec_names: List[str], quality: int, fps: float, keyframe_interval: float) -> Dict[str, Any]:
+    keyframes = [Image.fromarray(frame) for frame in frames]
+    strips = _strips(frames)
+    buffer = io.BytesIO()
+
+    results: Dict[str, Any] = {}
+    for name in codec_names:
+        codec = CODECS[name]
+        if not codec.available():
+            print(f"{name}: not available in this Pillow build, skipped")
+            continue
+
+        key_sizes, key_times = _measure(codec, keyframes, quality, buffer)
+        strip_sizes, strip_times = _measure(codec, strips, quality, buffer)
+
+        # Steady scrolling: one strip per frame plus a keyframe every keyframe_interval
+        strip_mean = sum(strip_sizes) / len(strip_sizes) if strip_sizes else sum(key_sizes) / len(key_sizes)
+        bytes_per_second = strip_mean * fps + (sum(key_sizes) / len(key_sizes)) / keyframe_interval
+
+        results[name] = {
+            "quality": quality if codec.lossy else None,
+            "keyframe_bytes": percentiles(key_sizes),
+            "keyframe_ms": percentiles(key_times),
+            "strip_bytes": percentiles(strip_sizes),
+            "strip_ms": percentiles(strip_times),
+            "bytes_per_second": round(bytes_per_second)
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="DigiShell waterfall codec benchmark")
+    parser.add_argument("--frames", help="Directory of recorded frames (*.png)")
+    parser.add_argument("--record", metavar="DIR", help="Capture frames from a running FLDIGI into DIR first")
+    parser.add_argument("--count", type=int, default=120, help="Frames to generate or record")
+    parser.add_argument("--interval", type=float, default=1 / 15, help="Seconds between recorded frames")
+    parser.add_argument("--width", type=int, default=1000, help="Synthetic frame width")
+    parser.add_argument("--height", type=int, default=150, help="Synthetic frame height")
+    parser.add_argument("--scroll", type=int, default=2, help="Synthetic rows scrolled per frame")
+    parser.add_argument("--codecs", default=",".join(CODECS), help="Comma-separated codecs to test")
+    parser.add_argument("--quality", type=int, default=75, help="Quality for lossy codecs")
+    parser.add_argument("--fps", type=float, default=15.0, help="Frame rate for the bandwidth estimate")
+    parser.add_argument("--keyframe-interval", type=float, default=5.0, help="Seconds between keyframes for the bandwidth estimate")
+    parser.add_argument("--output", help="Result file (default: bench_results/waterfall_codecs_<timestamp>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="Compare two result files and exit")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare_results(args.compare[0], args.compare[1], COMPARE_KEYS)
+        return
+
+    if args.record:
+        frames = record_frames(args.count, args.interval)
+        print(f"Recorded {len(frames)} frames to {save_frames(frames, args.record)}")
+        source = f"recorded:{args.record}"
+    elif args.frames:
+        frames = load_frames(args.frames)
+        source = f"frames:{args.frames}"
+    else:
+        frames = list(SyntheticWaterfall(args.width, args.height, args.scroll).frames(args.count))
+        source = "synthetic"
+
+    if len(frames) < 2:
+        print("Need at least two frames", file=sys.stderr)
+        sys.exit(1)
+
+    codec_names = [name.strip() for name in args.codecs.split(",") if name.strip() in CODECS]
+    height, width = frames[0].shape[:2]
+    print(f"{len(frames)} frames of {width}x{height} ({source})")
+
+    codecs = run(frames, codec_names, args.quality, args.fps, args.keyframe_interval)
+
+    print(f"\n{'codec':<10} {'key bytes':>10} {'key ms':>8} {'strip bytes':>12} {'strip ms':>9} {'KB/s':>8}")
+    for name, result in codecs.items():
+        print(
+            f"{name:<10} {result['keyframe_bytes']['mean']:>10.0f} {result['keyframe_ms']['p50']:>8.2f} "
+            f"{(result['strip_bytes']['mean'] or 0):>12.0f} {(result['strip_ms']['p50'] or 0):>9.2f} "
+            f"{result['bytes_per_second'] / 1024:>8.1f}"
+        )
+
+    results = {
+        "source": source,
+        "frames": len(frames),
+        "width": width,
+        "height": height,
+        "fps": args.fps,
+        "keyframe_interval": args.keyframe_interval,
+        "codecs": codecs
+    }
+    path = save_results("waterfall_codecs", results, args.output)
+    print(f"\nResults written to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Waterfall frames for the waterfall benchmarks: synthetic, recorded, or
+captured live from FLDIGI.
+
+Frames are HxWx3 uint8 RGB arrays, like WaterfallCaptureService captures.
+"""
+
+import time
+from pathlib import Path
+from typing import Iterator, List, Optional
+
+import numpy as np
+from PIL import Image
+
+from backend.waterfall_analysis import palette_colours
+
+
+class SyntheticWaterfall:
+    """
+    Scrolling waterfall: noise floor plus a few drifting carriers, new rows
+    at the top, scroll_rows rows per frame.
+    """
+
+    def __init__(self, width: int = 1000, height: int = 150, scroll_rows: int = 2,
+                 carriers: int = 6, seed: int = 1):
+        self.width = width
+        self.height = height
+        self.scroll_rows = scroll_rows
+        self.rng = np.random.default_rng(seed)
+        self.palette = palette_colours()  # FlDigi's default palette
+        self.carriers = self.rng.uniform(0.05, 0.95, carriers) * width
+        self.levels = np.zeros((height, width), dtype=np.uint8)
+        for _ in range(height // max(1, scroll_rows) + 1):
+            self._scroll()
+
+    def _row(self) -> np.ndarray:
+        row = self.rng.gamma(2.0, 18.0, self.width)
+        self.carriers += self.rng.normal(0, 0.3, len(self.carriers))
+        x = np.arange(self.width)
+        for i, centre in enumerate(self.carriers):
+            # Carriers key on and off, like real QSOs
+            if self.rng.random() < 0.85 - 0.1 * (i % 3):
+                row += 170 * np.exp(-((x - centre) / 2.5) ** 2)
+        return np.clip(row, 0, 255).astype(np.uint8)
+
+    def _scroll(self):
+        new_rows = np.stack([self._row() for _ in range(self.scroll_rows)])
+        self.levels = np.concatenate([new_rows, self.levels[:-self.scroll_rows]])
+
+    def next_frame(self) -> np.ndarray:
+        self._scroll()
+        return self.palette[self.levels]
+
+    def frames(self, count: int) -> Iterator[np.ndarray]:
+        for _ in range(count):
+            yield self.next_frame()
+
+
+def load_frames(directory: str) -> List[np.ndarray]:
+    """Load recorded frames (*.png, in name order) from a directory."""
+    paths = sorted(Path(directory).glob("*.png"))
+    return [np.asarray(Image.open(path).convert("RGB")) for path in paths]
+
+
+def save_frames(frames: List[np.ndarray], directory: str) -> Path:
+    path = Path(directory)
+    path.mkdir(parents=True, exist_ok=True)
+    for i, frame in enumerate(frames):
+        Image.fromarray(frame).save(path / f"frame_{i:05d}.png")
+    return path
+
+
+def record_frames(count: int, interval: float, full: bool = False) -> List[np.ndarray]:
+    """Capture frames from a running FLDIGI through the waterfall capture service."""
+    from backend.waterfall_capture import waterfall_service
+
+    frames: List[np.ndarray] = []
+    while len(frames) < count:
+        pixels: Optional[np.ndarray] = waterfall_service._capture_pixels(full)
+        if pixels is None:
+            raise RuntimeError("Could not capture the FLDIGI window")
+        frames.append(pixels)
+        time.sleep(interval)
+    return frames
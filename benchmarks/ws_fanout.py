@@ -0,0 +1,233 @@
+"""
+WebSocket fan-out load test.
+
+Starts a simulated FLDIGI and a real DigiShell backend (uvicorn subprocess),
+then opens many /ws clients, a fraction of which read deliberately slowly.
+Reports end-to-end RX-chunk latency percentiles (FLDIGI marker timestamp to
+client receive), dropped and coalesced RX chunks, and server CPU / memory.
+
+Usage:
+    python -m benchmarks.ws_fanout --clients 300 --slow-fraction 0.1 --duration 30
+    python -m benchmarks.ws_fanout --compare bench_results/old.json bench_results/new.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+from typing import Dict, Any, List
+
+try:
+    import websockets
+except ImportError:
+    websockets = None
+
+from benchmarks.common import ProcessSampler, percentiles, save_results, compare_results
+from benchmarks.fake_fldigi import FakeFldigi
+
+MARKER_RE = re.compile(r"\[#(\d+):(\d+)\]")
+
+COMPARE_KEYS = [
+    "latency_ms.fast.p50",
+    "latency_ms.fast.p99",
+    "latency_ms.slow.p50",
+    "latency_ms.slow.p99",
+    "rx_chunks.dropped",
+    "rx_chunks.coalesced",
+    "server.cpu_percent_mean",
+    "server.rss_mb_max",
+]
+
+
+def _free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _get_json(url: str) -> Dict[str, Any]:
+    with urllib.request.urlopen(url, timeout=5) as response:
+        return json.loads(response.read())
+
+
+class ClientStats:
+
+    def __init__(self, slow: bool):
+        self.slow = slow
+        self.messages = 0
+        self.rx_messages = 0
+        self.chunks = 0
+        self.coalesced = 0
+        self.last_seq = None
+        self.gaps = 0
+        self.latencies_ms: List[float] = []
+        self.error = None
+
+
+async def run_client(url: str, stats: ClientStats, stop: asyncio.Event, slow_delay: float):
+    try:
+        async with websockets.connect(url, max_queue=16) as ws:
+            while not stop.is_set():
+                try:
+                    raw = await asyncio.wait_for(ws.recv(), timeout=0.5)
+                except asyncio.TimeoutError:
+                    continue
+
+                received_us = time.time() * 1_000_000
+                stats.messages += 1
+                message = json.loads(raw)
+
+                if message.get("type") == "ping":
+                    await ws.send(json.dumps({"type": "pong"}))
+                elif message.get("type") == "text_update":
+                    stats.rx_messages += 1
+                    markers = MARKER_RE.findall(message["data"].get("text", ""))
+                    if len(markers) > 1:
+                        stats.coalesced += len(markers) - 1
+                    for seq, sent_us in markers:
+                        seq = int(seq)
+                        stats.chunks += 1
+                        if stats.last_seq is not None and seq > stats.last_seq + 1:
+                            stats.gaps += seq - stats.last_seq - 1
+                        stats.last_seq = seq
+                        stats.latencies_ms.append((received_us - int(sent_us)) / 1000.0)
+
+                if stats.slow:
+                    await asyncio.sleep(slow_delay)
+    except Exception as e:
+        stats.error = str(e)
+
+
+async def run_clients(args, port: int) -> List[ClientStats]:
+    url = f"ws://127.0.0.1:{port}/ws"
+    stop = asyncio.Event()
+    slow_count = int(args.clients * args.slow_fraction)
+    all_stats = [ClientStats(slow=i < slow_count) for i in range(args.clients)]
+
+    tasks = []
+    for stats in all_stats:
+        tasks.append(asyncio.create_task(run_client(url, stats, stop, args.slow_delay)))
+        if args.ramp > 0:
+            await asyncio.sleep(args.ramp / args.clients)
+
+    await asyncio.sleep(args.duration)
+    stop.set()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return all_stats
+
+
+def summarize(all_stats: List[ClientStats], generated: int) -> Dict[str, Any]:
+    fast = [s for s in all_stats if not s.slow]
+    slow = [s for s in all_stats if s.slow]
+
+    return {
+        "latency_ms": {
+            "fast": percentiles([v for s in fast for v in s.latencies_ms]),
+            "slow": percentiles([v for s in slow for v in s.latencies_ms]),
+        },
+        "rx_chunks": {
+            "generated": generated,
+            "received": sum(s.chunks for s in all_stats),
+            "dropped": sum(s.gaps for s in all_stats),
+            "coalesced": sum(s.coalesced for s in all_stats),
+            "rx_messages": sum(s.rx_messages for s in all_stats),
+        },
+        "clients": {
+            "total": len(all_stats),
+            "slow": len(slow),
+            "errors": sum(1 for s in all_stats if s.error),
+            "messages_received": sum(s.messages for s in all_stats),
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="DigiShell WebSocket fan-out load test")
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--slow-fraction", type=float, default=0.1, help="Fraction of clients that read slowly")
+    parser.add_argument("--slow-delay", type=float, default=0.5, help="Seconds a slow client sleeps after each message")
+    parser.add_argument("--duration", type=float, default=20.0, help="Measurement time in seconds")
+    parser.add_argument("--ramp", type=float, default=2.0, help="Seconds over which clients are connected")
+    parser.add_argument("--rx-rate", type=float, default=20.0, help="Simulated RX chunks per second")
+    parser.add_argument("--output", help="Result file (default: bench_results/ws_fanout_<timestamp>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="Compare two result files and exit")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare_results(args.compare[0], args.compare[1], COMPARE_KEYS)
+        return
+
+    if websockets is None:
+        print("ERROR: the 'websockets' package is required (pip install websockets)")
+        sys.exit(1)
+
+    fldigi_port = _free_port()
+    backend_port = _free_port()
+
+    fake = FakeFldigi(port=fldigi_port, rx_rate=args.rx_rate)
+    fake.start()
+
+    env = dict(os.environ, DIGISHELL_FLDIGI_PORT=str(fldigi_port))
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.main:app",
+         "--host", "127.0.0.1", "--port", str(backend_port), "--log-level", "warning"],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+
+    sampler = None
+    try:
+        deadline = time.monotonic() + 15
+        while True:
+            try:
+                _get_json(f"http://127.0.0.1:{backend_port}/health")
+                break
+            except OSError:
+                if time.monotonic() > deadline or server.poll() is not None:
+                    raise RuntimeError("Backend did not start")
+                time.sleep(0.2)
+
+        print(f"Backend on :{backend_port}, simulated FLDIGI on :{fldigi_port}")
+        print(f"Running {args.clients} clients ({args.slow_fraction:.0%} slow) for {args.duration}s...")
+
+        sampler = ProcessSampler(server.pid)
+        sampler.start()
+        all_stats = asyncio.run(run_clients(args, backend_port))
+        sampler.stop()
+
+        health = _get_json(f"http://127.0.0.1:{backend_port}/health")
+        server_stats = health.get("websocket_stats", {})
+        server_stats.pop("clients", None)
+
+        results = {
+            "benchmark": "ws_fanout",
+            "timestamp": time.time(),
+            "config": {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+            **summarize(all_stats, fake.seq),
+            "server": sampler.summary(),
+            "server_stats": server_stats,
+        }
+    finally:
+        if sampler:
+            sampler.stop()
+        server.terminate()
+        try:
+            server.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+        fake.stop()
+
+    path = save_results("ws_fanout", results, args.output)
+    print(json.dumps({k: results[k] for k in ("latency_ms", "rx_chunks", "server")}, indent=2))
+    print(f"Results saved to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -729,6 +729,10 @@ const TUTORIAL_STEPS = [
                 <li><strong>&lt;DATE&gt;</strong> - Current date (YYYY-MM-DD format)</li>
                 <li><strong>&lt;TIME&gt;</strong> - Current local time (HH:MM)</li>
                 <li><strong>&lt;UTC&gt;</strong> - Current UTC time (HH:MMZ)</li>
+                <li><strong>&lt;FREQ&gt;</strong> - Rig frequency in kHz</li>
+                <li><strong>&lt;MODE&gt;</strong> - Current modem</li>
+                <li><strong>&lt;RST&gt;</strong> - Estimated RST/RSQ report for the station you are receiving</li>
+                <li><strong>&lt;SNR&gt;</strong> - Signal-to-noise ratio of that station</li>
             </ul>
             <p style="margin-bottom: 1rem;">Click <strong>"Edit Macros"</strong> to create custom macros for CQ calls, greetings, signal reports, and sign-offs!</p>
             <div style="background: var(--warning-light); padding: 1rem; border-radius: var(--radius-md); border-left: 4px solid var(--warning);">
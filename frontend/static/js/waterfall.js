@@ -5,6 +5,54 @@
  * This is a BETA feature and disabled by default.
  */
 
+// Binary frame header (see FRAME_HEADER in backend/waterfall_capture.py)
+const WATERFALL_HEADER_SIZE = 31;
+const WATERFALL_MAGIC = 0x4657; // "WF" read as little-endian uint16
+const WATERFALL_KIND_KEYFRAME = 0;
+const WATERFALL_KIND_STRIP = 1;
+
+// Codec ids (see backend/waterfall_codecs.py); 'indexed' and 'intensity' are decoded here, the rest by the browser
+const WATERFALL_CODEC_MIME = { 0: 'image/jpeg', 1: 'image/webp', 2: 'image/png' };
+const WATERFALL_CODEC_INDEXED = 3;
+const WATERFALL_CODEC_INTENSITY = 4;
+
+// FlDigi's default waterfall palette: colours for signal levels 0, 32, ... 256
+const WATERFALL_DEFAULT_PALETTE = [
+    [0, 0, 0], [0, 0, 136], [0, 19, 198], [0, 32, 239], [172, 167, 105],
+    [194, 198, 49], [225, 228, 107], [255, 255, 0], [255, 51, 0]
+];
+
+// 256-entry RGBA lookup (as little-endian Uint32) interpolated from palette stops
+function buildWaterfallPalette(stops) {
+    const lut = new Uint32Array(256);
+    const step = 256 / (stops.length - 1);
+    for (let level = 0; level < 256; level++) {
+        const i = Math.min(Math.floor(level / step), stops.length - 2);
+        const t = (level - i * step) / step;
+        const [r, g, b] = [0, 1, 2].map((c) => Math.round(stops[i][c] + (stops[i + 1][c] - stops[i][c]) * t));
+        lut[level] = 0xff000000 | (b << 16) | (g << 8) | r;
+    }
+    return lut;
+}
+
+async function inflateWaterfallPayload(bytes) {
+    const stream = new Blob([bytes]).stream().pipeThrough(new DecompressionStream('deflate'));
+    return new Uint8Array(await new Response(stream).arrayBuffer());
+}
+
+function supportedWaterfallCodecs() {
+    const codecs = ['jpeg', 'png'];
+    const probe = document.createElement('canvas');
+    probe.width = probe.height = 1;
+    if (probe.toDataURL('image/webp').startsWith('data:image/webp')) {
+        codecs.push('webp');
+    }
+    if (typeof DecompressionStream !== 'undefined') {
+        codecs.push('indexed');
+    }
+    return codecs;
+}
+
 class WaterfallViewer {
     constructor() {
         this.websocket = null;
@@ -15,11 +63,22 @@ class WaterfallViewer {
         this.settingsToggle = document.getElementById('waterfall-streaming-settings-toggle');
         this.waterfallPanel = document.getElementById('waterfall-panel');
         this.statusSpan = document.getElementById('waterfall-status');
+        this.cropButton = document.getElementById('waterfall-crop-btn');
+        this.axisRow = document.getElementById('waterfall-axis');
+        this.axisLowInput = document.getElementById('waterfall-axis-low');
+        this.axisHighInput = document.getElementById('waterfall-axis-high');
+        this.axisButton = document.getElementById('waterfall-axis-btn');
+        this.cropped = false;
+        this.frequencyAxis = null; // [lowHz, highHz] across the canvas, from the server's meta message
+        this.paletteLut = buildWaterfallPalette(WATERFALL_DEFAULT_PALETTE);
         this.enabled = false;
         this.connected = false;
         this.lastFrameTime = 0;
         this.frameCount = 0;
         this.fpsDisplay = 0;
+        this.lastFrameNumber = 0;
+        this.synced = false; // Canvas holds a complete frame that strips can be applied to
+        this.renderQueue = Promise.resolve();
 
         this.setupEventListeners();
     }
@@ -36,6 +95,16 @@ class WaterfallViewer {
             });
         }
 
+        // Crop to the waterfall region (auto-detected) or back to the whole window
+        if (this.cropButton) {
+            this.cropButton.addEventListener('click', () => this.toggleCrop());
+        }
+
+        // Frequency axis of the crop, so clicks tune by frequency
+        if (this.axisButton) {
+            this.axisButton.addEventListener('click', () => this.setFrequencyAxis());
+        }
+
         // Settings toggle (in settings modal)
         if (this.settingsToggle) {
             this.settingsToggle.addEventListener('change', async (e) => {
@@ -45,7 +114,22 @@ class WaterfallViewer {
             });
         }
 
-        // Handle canvas clicks to send to FlDigi (future feature)
+        // Pick a new resolution tier when the panel is resized
+        let resizeTimer = null;
+        window.addEventListener('resize', () => {
+            clearTimeout(resizeTimer);
+            resizeTimer = setTimeout(() => this.sendHello(), 500);
+        });
+
+        // Show the audio frequency under the pointer when the axis is known
+        if (this.canvas) {
+            this.canvas.addEventListener('mousemove', (e) => {
+                const hz = this.frequencyAt(e.clientX - this.canvas.getBoundingClientRect().left);
+                this.canvas.title = hz === null ? '' : `${hz} Hz`;
+            });
+        }
+
+        // Clicks tune FlDigi (by frequency when the server knows the axis)
         if (this.canvas) {
             this.canvas.addEventListener('click', (e) => {
                 if (this.websocket && this.websocket.readyState === WebSocket.OPEN) {
@@ -53,13 +137,14 @@ class WaterfallViewer {
                     const x = e.clientX - rect.left;
                     const y = e.clientY - rect.top;
 
-                    // Send click coordinates to backend
+                    // Send click coordinates to backend, relative to the displayed canvas size
+                    // (frames may be sent at a lower resolution tier than FlDigi's)
                     this.websocket.send(JSON.stringify({
                         type: 'mouse_click',
                         x: x,
                         y: y,
-                        canvasWidth: this.canvas.width,
-                        canvasHeight: this.canvas.height
+                        canvasWidth: rect.width,
+                        canvasHeight: rect.height
                     }));
                 }
             });
@@ -99,6 +184,29 @@ class WaterfallViewer {
         return null;
     }
 
+    async toggleCrop() {
+        try {
+            const response = await fetch('/api/waterfall/region', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify(this.cropped ? { clear: true } : { auto: true })
+            });
+
+            if (!response.ok) {
+                const error = await response.json();
+                throw new Error(error.detail || 'Failed to set waterfall region');
+            }
+
+            const region = await response.json();
+            this.setCropped(region.crop !== null);
+            this.showFrequencyAxis(region.frequency_axis);
+
+        } catch (error) {
+            console.error('Error setting waterfall region:', error);
+            window.showToast(error.message, 'error');
+        }
+    }
+
     async enable() {
         try {
             this.updateStatus('Enabling...');
@@ -172,19 +280,35 @@ class WaterfallViewer {
         const wsUrl = `${protocol}//${host}/api/waterfall/ws`;
 
         this.websocket = new WebSocket(wsUrl);
+        this.websocket.binaryType = 'arraybuffer';
 
         this.websocket.onopen = () => {
             console.log('Waterfall WebSocket connected');
             this.connected = true;
+            this.synced = false;
             this.updateStatus('Streaming');
+
+            this.sendHello();
         };
 
         this.websocket.onmessage = (event) => {
             try {
-                const data = JSON.parse(event.data);
+                if (event.data instanceof ArrayBuffer) {
+                    this.handleFrame(event.data);
+                    return;
+                }
 
-                if (data.type === 'waterfall_frame') {
-                    this.renderFrame(data.image);
+                const data = JSON.parse(event.data);
+                if (data.type === 'hello_ack') {
+                    console.log('Waterfall codec:', data.codec);
+                } else if (data.type === 'meta') {
+                    this.handleMeta(data);
+                } else if (data.type === 'click_ack') {
+                    if (data.carrier !== null && data.carrier !== undefined) {
+                        console.log('Waterfall tuned to', data.carrier, 'Hz');
+                    }
+                } else if (data.type === 'error') {
+                    console.error('Waterfall error:', data.message);
                 }
             } catch (e) {
                 console.error('Error processing waterfall frame:', e);
@@ -214,27 +338,220 @@ class WaterfallViewer {
         };
     }
 
-    renderFrame(base64Image) {
-        if (!this.canvas || !this.ctx) return;
+    // The crop is shared by every viewer; it is learned from the meta message
+    // as well as from this client's crop button
+    setCropped(cropped) {
+        if (cropped === this.cropped) return;
+        this.cropped = cropped;
+        if (this.cropButton) {
+            this.cropButton.title = cropped ? 'Show whole FlDigi window' : 'Crop to waterfall';
+        }
+        if (this.axisRow) {
+            this.axisRow.style.display = cropped ? '' : 'none';
+        }
+        // Cropped to the waterfall, signal levels are all there is to send
+        this.sendHello();
+    }
+
+    async setFrequencyAxis() {
+        const low = parseFloat(this.axisLowInput.value);
+        const high = parseFloat(this.axisHighInput.value);
+        if (Number.isNaN(low) || Number.isNaN(high) || high <= low) {
+            window.showToast('Enter the audio frequencies at the left and right edges, left below right', 'error');
+            return;
+        }
 
-        const img = new Image();
-        img.onload = () => {
-            // Set canvas size to match image on first frame
-            if (this.canvas.width !== img.width || this.canvas.height !== img.height) {
-                this.canvas.width = img.width;
-                this.canvas.height = img.height;
+        try {
+            const response = await fetch('/api/waterfall/region', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ low_hz: low, high_hz: high })
+            });
+
+            if (!response.ok) {
+                const error = await response.json();
+                throw new Error(error.detail || 'Failed to set the frequency axis');
             }
 
-            // Draw the image
-            this.ctx.drawImage(img, 0, 0);
+            const region = await response.json();
+            this.showFrequencyAxis(region.frequency_axis);
+            window.showToast(`Waterfall axis set to ${low}-${high} Hz`, 'success');
 
-            // Show canvas, hide placeholder
-            this.showCanvas();
+        } catch (error) {
+            console.error('Error setting waterfall frequency axis:', error);
+            window.showToast(error.message, 'error');
+        }
+    }
+
+    // Fill the axis inputs from the server's axis, unless they are being edited
+    showFrequencyAxis(axis) {
+        if (!axis || !this.axisLowInput || !this.axisHighInput) return;
+        if (document.activeElement === this.axisLowInput || document.activeElement === this.axisHighInput) return;
+        this.axisLowInput.value = Math.round(axis[0]);
+        this.axisHighInput.value = Math.round(axis[1]);
+    }
 
-            // Update FPS counter
-            this.updateFPS();
+    sendHello() {
+        if (!this.websocket || this.websocket.readyState !== WebSocket.OPEN) return;
+
+        // Let the server pick the codec for this connection. Intensity frames
+        // (signal levels rendered with our palette) are only wanted when the
+        // view is cropped to the waterfall, so they are asked for alone.
+        const codecs = supportedWaterfallCodecs();
+        const intensity = this.cropped && typeof DecompressionStream !== 'undefined';
+        const hello = { type: 'hello', codecs: intensity ? ['intensity'] : codecs };
+
+        // The server sends the smallest resolution tier that fills the panel
+        const width = this.displayWidth();
+        if (width) {
+            hello.width = width;
+        }
+        this.websocket.send(JSON.stringify(hello));
+    }
+
+    // Width in device pixels the waterfall is shown at (0 if the panel is hidden)
+    displayWidth() {
+        const container = this.canvas ? this.canvas.parentElement : null;
+        if (!container) return 0;
+        return Math.round(container.getBoundingClientRect().width * (window.devicePixelRatio || 1));
+    }
+
+    // Audio frequency under a canvas x coordinate (CSS pixels), or null without an axis
+    frequencyAt(x) {
+        if (!this.frequencyAxis || !this.canvas) return null;
+        const [low, high] = this.frequencyAxis;
+        const width = this.canvas.getBoundingClientRect().width || this.canvas.width;
+        return Math.round(low + (high - low) * x / width);
+    }
+
+    handleMeta(meta) {
+        this.frequencyAxis = meta.low_hz !== null && meta.high_hz !== null ? [meta.low_hz, meta.high_hz] : null;
+        this.paletteLut = buildWaterfallPalette(meta.palette || WATERFALL_DEFAULT_PALETTE);
+        this.setCropped(Boolean(meta.cropped));
+        this.showFrequencyAxis(this.frequencyAxis);
+    }
+
+    handleFrame(buffer) {
+        if (buffer.byteLength < WATERFALL_HEADER_SIZE) return;
+
+        const view = new DataView(buffer);
+        if (view.getUint16(0, true) !== WATERFALL_MAGIC) return;
+
+        const frame = {
+            version: view.getUint8(2),
+            kind: view.getUint8(3),
+            timestamp: view.getFloat64(4, true),
+            frameNumber: view.getUint32(12, true),
+            width: view.getUint16(16, true),
+            height: view.getUint16(18, true),
+            scroll: view.getInt16(20, true),
+            y: view.getUint16(22, true),
+            rows: view.getUint16(24, true),
+            base: view.getUint32(26, true),
+            codec: view.getUint8(30)
         };
-        img.src = 'data:image/jpeg;base64,' + base64Image;
+
+        const payload = new Uint8Array(buffer, WATERFALL_HEADER_SIZE);
+
+        // Strips depend on the previous frame, so frames are applied strictly in order
+        this.renderQueue = this.renderQueue
+            .then(() => this.renderFrame(frame, payload))
+            .catch((e) => console.error('Error rendering waterfall frame:', e));
+    }
+
+    async decodePayload(frame, payload) {
+        if (frame.codec === WATERFALL_CODEC_INTENSITY) {
+            // zlib-compressed signal levels, coloured with our palette
+            const levels = await inflateWaterfallPayload(payload);
+            const image = new ImageData(frame.width, frame.rows);
+            const pixels = new Uint32Array(image.data.buffer);
+            for (let i = 0; i < pixels.length; i++) {
+                pixels[i] = this.paletteLut[levels[i]];
+            }
+            return createImageBitmap(image);
+        }
+
+        if (frame.codec !== WATERFALL_CODEC_INDEXED) {
+            const type = WATERFALL_CODEC_MIME[frame.codec] || 'image/jpeg';
+            return createImageBitmap(new Blob([payload], { type: type }));
+        }
+
+        // uint16 palette size, RGB palette, then zlib-compressed palette indices
+        const count = payload[0] | (payload[1] << 8);
+        const paletteEnd = 2 + count * 3;
+        const lut = new Uint32Array(256);
+        for (let i = 0; i < count; i++) {
+            const p = 2 + i * 3;
+            // ImageData is RGBA in memory; little-endian Uint32 puts R in the low byte
+            lut[i] = 0xff000000 | (payload[p + 2] << 16) | (payload[p + 1] << 8) | payload[p];
+        }
+
+        const indices = await inflateWaterfallPayload(payload.subarray(paletteEnd));
+
+        const image = new ImageData(frame.width, frame.rows);
+        const pixels = new Uint32Array(image.data.buffer);
+        for (let i = 0; i < pixels.length; i++) {
+            pixels[i] = lut[indices[i]];
+        }
+        return createImageBitmap(image);
+    }
+
+    async renderFrame(frame, payload) {
+        if (!this.canvas || !this.ctx) return;
+
+        if (frame.kind === WATERFALL_KIND_STRIP) {
+            const inSequence = this.synced
+                && frame.base === this.lastFrameNumber
+                && this.canvas.width === frame.width
+                && this.canvas.height === frame.height;
+
+            if (!inSequence) {
+                // Missed a frame; strips are useless until the next keyframe
+                if (this.synced) {
+                    this.synced = false;
+                    this.requestKeyframe();
+                }
+                return;
+            }
+
+            if (frame.rows === 0) {
+                // Keepalive: nothing changed on the server
+                this.lastFrameNumber = frame.frameNumber;
+                return;
+            }
+        } else if (frame.kind !== WATERFALL_KIND_KEYFRAME) {
+            return;
+        }
+
+        const bitmap = await this.decodePayload(frame, payload);
+
+        if (frame.kind === WATERFALL_KIND_KEYFRAME) {
+            // Set canvas size to match the frame
+            if (this.canvas.width !== frame.width || this.canvas.height !== frame.height) {
+                this.canvas.width = frame.width;
+                this.canvas.height = frame.height;
+            }
+            this.ctx.drawImage(bitmap, 0, 0);
+            this.synced = true;
+        } else {
+            // Shift the existing image, then fill in the newly exposed rows
+            this.ctx.drawImage(this.canvas, 0, frame.scroll);
+            this.ctx.drawImage(bitmap, 0, frame.y);
+        }
+        bitmap.close();
+        this.lastFrameNumber = frame.frameNumber;
+
+        // Show canvas, hide placeholder
+        this.showCanvas();
+
+        // Update FPS counter
+        this.updateFPS();
+    }
+
+    requestKeyframe() {
+        if (this.websocket && this.websocket.readyState === WebSocket.OPEN) {
+            this.websocket.send(JSON.stringify({ type: 'keyframe_request' }));
+        }
     }
 
     showCanvas() {
@@ -76,10 +76,19 @@ export class WebSocketClient {
     handleMessage(data) {
         try {
             const message = JSON.parse(data);
-            console.log('WebSocket message:', message);
 
             const { type, data: messageData } = message;
 
+            // Server heartbeat; answer so the connection is not reaped
+            if (type === 'ping') {
+                this.send({ type: 'pong' });
+                return;
+            }
+
+            if (type !== 'carriers') {
+                console.log('WebSocket message:', message);
+            }
+
             if (this.handlers[type]) {
                 this.handlers[type].forEach(handler => {
                     try {
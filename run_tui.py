@@ -4,8 +4,9 @@ import asyncio
 import sys
 import json
 import os
-from datetime import datetime, timedelta, timezone
+from datetime import datetime, timedelta
 from backend.fldigi_client import fldigi_client
+from backend.macro_template import expand_template
 import re
 
 from prompt_toolkit import Application
@@ -38,6 +39,7 @@ connection_time = None
 command_status = ""
 show_status_until = None
 last_trx_status = None
+last_status = {}  # Latest values shown in the status bar (StatusUpdate field names)
 
 live_tx_mode = True
 live_tx_active = False
@@ -375,23 +377,10 @@ def save_config():
 
 
 def expand_macros(text):
-    global last_call
-
-    replacements = {
-        '<MYCALL>': config.get('callsign', 'NOCALL'),
-        '<MYNAME>': config.get('name', 'Operator'),
-        '<MYQTH>': config.get('qth', 'Somewhere'),
-        '<CALL>': last_call or 'NOCALL',
-        '<DATE>': datetime.now().strftime('%Y-%m-%d'),
-        '<TIME>': datetime.now().strftime('%H:%M'),
-        '<UTC>': datetime.now(timezone.utc).strftime('%H:%MZ'),
-    }
-
-    result = text
-    for placeholder, value in replacements.items():
-        result = result.replace(placeholder, value)
-
-    return result
+    return expand_template(
+        text, config.get('callsign', 'NOCALL'), config.get('name', 'Operator'),
+        config.get('qth', 'Somewhere'), last_call, last_status
+    )
 
 
 def get_transmit_speed():
@@ -655,6 +644,9 @@ def get_status_text():
     snr = signal_metrics.get('snr')
     rst = signal_metrics.get('rsq_estimate') or signal_metrics.get('rst_estimate')
 
+    # Snapshot for macro <FREQ>/<MODE>/<RST>/<SNR>, so expanding needs no XML-RPC calls
+    last_status.update(modem=modem, rig_frequency=frequency, snr=snr, rst_estimate=rst)
+
     if trx_status == "RX":
         status_class = 'class:status.rx'
     elif trx_status == "TX":
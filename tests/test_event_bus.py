@@ -0,0 +1,123 @@
+"""The built-in RESP client used by RedisEventBus, and Unix socket event lines."""
+
+import asyncio
+import json
+
+import pytest
+
+import backend.event_bus as event_bus
+from backend.event_bus import (
+    BroadcastEvent, RedisProtocolError, UnixSocketEventBus, _encode_resp, _read_line, _read_resp
+)
+
+
+def _read(data: bytes):
+    async def read():
+        reader = asyncio.StreamReader()
+        reader.feed_data(data)
+        reader.feed_eof()
+        return await _read_resp(reader)
+    return asyncio.run(read())
+
+
+def test_encode_command():
+    assert _encode_resp("PUBLISH", "events", b"\x00{}") == (
+        b"*3\r\n$7\r\nPUBLISH\r\n$6\r\nevents\r\n$3\r\n\x00{}\r\n"
+    )
+
+
+def test_encode_utf8_length_is_in_bytes():
+    assert _encode_resp("73 de €") == b"*1\r\n$9\r\n73 de \xe2\x82\xac\r\n"
+
+
+def test_command_round_trip():
+    # A command is an array of bulk strings, which is also a valid reply
+    parts = [b"SUBSCRIBE", b"digishell:events", b"line\r\nbreak", b""]
+    assert _read(_encode_resp(*parts)) == parts
+
+
+def test_simple_replies():
+    assert _read(b"+OK\r\n") == b"OK"
+    assert _read(b":42\r\n") == 42
+    assert _read(b"$-1\r\n") is None
+    assert _read(b"*-1\r\n") is None
+    assert _read(b"*0\r\n") == []
+
+
+def test_error_reply():
+    with pytest.raises(RedisProtocolError, match="WRONGTYPE"):
+        _read(b"-WRONGTYPE Operation against a key holding the wrong kind of value\r\n")
+
+
+def test_nested_arrays():
+    data = b"*3\r\n$7\r\nmessage\r\n*2\r\n:1\r\n$-1\r\n*1\r\n*1\r\n+deep\r\n"
+    assert _read(data) == [b"message", [1, None], [[b"deep"]]]
+
+
+def test_subscription_message():
+    data = b"*3\r\n$7\r\nmessage\r\n$6\r\nevents\r\n$5\r\nhello\r\n"
+    assert _read(data) == [b"message", b"events", b"hello"]
+
+
+def test_closed_connection():
+    with pytest.raises(ConnectionError):
+        _read(b"")
+    with pytest.raises(asyncio.IncompleteReadError):
+        _read(b"$10\r\nshort\r\n")
+
+
+def test_unknown_reply_type():
+    with pytest.raises(RedisProtocolError):
+        _read(b"?what\r\n")
+
+
+def test_read_line_skips_lines_over_the_limit():
+    async def read():
+        reader = asyncio.StreamReader(limit=16)
+        # Over the limit with its newline in the buffer, and spread over several reads
+        reader.feed_data(b"short\n" + b"x" * 40 + b"\nnext\n" + b"y" * 20)
+        reader.feed_data(b"y" * 50 + b"\nafter\npartial")
+        reader.feed_eof()
+        return [await _read_line(reader) for _ in range(6)]
+
+    assert asyncio.run(read()) == [b"short\n", None, b"next\n", None, b"after\n", b""]
+
+
+def _event(event_id: int, text: str) -> BroadcastEvent:
+    data = {"text": text}
+    payload = json.dumps({"type": "text_update", "id": event_id, "data": data})
+    return BroadcastEvent(event_id, "text_update", "rx", data, payload)
+
+
+def test_unix_bus_survives_an_oversized_event(tmp_path, monkeypatch):
+    monkeypatch.setattr(event_bus, "EVENT_LINE_LIMIT", 1024)
+    path = str(tmp_path / "bus.sock")
+    hub_events, relay_events = [], []
+
+    async def run():
+        hub = UnixSocketEventBus(hub_events.append, path, hub=True)
+        relay = UnixSocketEventBus(relay_events.append, path, hub=False)
+        await hub.start()
+        await relay.start()
+        for _ in range(100):
+            if hub._peers:
+                break
+            await asyncio.sleep(0.01)
+
+        await hub.publish(_event(1, "x" * 4096))
+        await relay.publish(_event(2, "y" * 4096))
+        await hub.publish(_event(3, "from hub"))
+        await relay.publish(_event(4, "from relay"))
+        for _ in range(100):
+            if len(relay_events) == 2:
+                break
+            await asyncio.sleep(0.01)
+
+        await relay.stop()
+        await hub.stop()
+        return hub.errors, relay.errors
+
+    hub_errors, relay_errors = asyncio.run(run())
+    assert [event.id for event in hub_events] == [1, 3, 4]
+    assert [event.id for event in relay_events] == [3, 4]
+    assert (hub_errors, relay_errors) == (1, 1)
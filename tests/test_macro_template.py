@@ -0,0 +1,47 @@
+"""Macro templates (backend/macro_template.py)."""
+
+import re
+
+from backend.macro_template import compile_template, expand_template
+
+STATION = ("K1ABC", "Alice", "Boston")
+STATUS = {"rig_frequency": 14070000, "modem": "BPSK31", "rsq_estimate": "599", "snr": 12.34}
+
+
+def test_compile_splits_literals_and_placeholders():
+    assert compile_template("CQ de <MYCALL> k") == ((False, "CQ de "), (True, "MYCALL"), (False, " k"))
+    assert compile_template("<CALL><MYCALL>") == ((True, "CALL"), (True, "MYCALL"))
+    assert compile_template("") == ()
+
+
+def test_literal_text_passes_through():
+    text = "Plain text, <lower> case, a < b > c and 5<6>4"
+    assert expand_template(text, *STATION) == text
+
+
+def test_station_placeholders():
+    text = "<CALL> de <MYCALL> = name <MYNAME>, QTH <MYQTH>"
+    assert expand_template(text, *STATION, last_call="W2XYZ") == "W2XYZ de K1ABC = name Alice, QTH Boston"
+    assert expand_template("<CALL>", *STATION) == "NOCALL"
+
+
+def test_unknown_placeholders_are_left_intact():
+    assert expand_template("<MYCALL> <BOGUS> <MYCALL>", *STATION) == "K1ABC <BOGUS> K1ABC"
+
+
+def test_time_placeholders():
+    expanded = expand_template("<DATE> <TIME> <UTC>", *STATION)
+    assert re.fullmatch(r"\d{4}-\d{2}-\d{2} \d{2}:\d{2} \d{2}:\d{2}Z", expanded)
+
+
+def test_status_placeholders():
+    text = "<FREQ> <MODE> <RST> <SNR>"
+    assert expand_template(text, *STATION, status=STATUS) == "14070.000 BPSK31 599 12.3dB"
+    assert expand_template("<RST>", *STATION, status={"rst_estimate": "579"}) == "579"
+
+
+def test_status_placeholders_without_a_snapshot():
+    text = "[<FREQ>|<MODE>|<RST>|<SNR>]"
+    assert expand_template(text, *STATION) == "[|||]"
+    assert expand_template(text, *STATION, status={}) == "[|||]"
+    assert expand_template(text, *STATION, status={"rig_frequency": 0, "snr": None}) == "[|||]"
@@ -0,0 +1,100 @@
+"""The macro config cache in backend/routers/macros.py."""
+
+import asyncio
+import json
+import os
+import types
+
+import pytest
+
+from backend.routers import macros
+
+
+def _config(callsign: str, **macro_texts) -> dict:
+    return {"callsign": callsign, "name": "Op", "qth": "Here", "macros": macro_texts or {"1": "CQ de <MYCALL>"}}
+
+
+def _write(path, data: dict):
+    path.write_text(json.dumps(data))
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def config(tmp_path, monkeypatch):
+    path = tmp_path / "fldigi_tui.json"
+    clock = Clock()
+    monkeypatch.setattr(macros, "CONFIG_FILE", path)
+    monkeypatch.setattr(macros, "time", types.SimpleNamespace(monotonic=clock.monotonic))
+    monkeypatch.setattr(macros, "_cached_config", None)
+    monkeypatch.setattr(macros, "_cached_signature", None)
+    monkeypatch.setattr(macros, "_last_check", 0.0)
+
+    stats = []
+    signature = macros._config_signature
+    monkeypatch.setattr(macros, "_config_signature", lambda: stats.append(clock.now) or signature())
+    return types.SimpleNamespace(path=path, clock=clock, stats=stats)
+
+
+def test_defaults_without_a_file(config):
+    assert macros.load_config().callsign == "NOCALL"
+    _write(config.path, _config("K1ABC"))
+    config.clock.now += macros.CONFIG_CHECK_INTERVAL
+    assert macros.load_config().callsign == "K1ABC"
+
+
+def test_reloads_after_the_file_changes(config):
+    _write(config.path, _config("K1ABC"))
+    first = macros.load_config()
+    assert first.callsign == "K1ABC"
+
+    # Unchanged: the cached object is returned without parsing again
+    config.clock.now += macros.CONFIG_CHECK_INTERVAL
+    assert macros.load_config() is first
+
+    # Same size, newer mtime
+    _write(config.path, _config("K2ABC"))
+    stat = os.stat(config.path)
+    os.utime(config.path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    config.clock.now += macros.CONFIG_CHECK_INTERVAL
+    assert macros.load_config().callsign == "K2ABC"
+
+
+def test_stat_is_throttled(config):
+    _write(config.path, _config("K1ABC"))
+    macros.load_config()
+    assert len(config.stats) == 1
+
+    _write(config.path, _config("K1ABCD"))
+    config.clock.now += macros.CONFIG_CHECK_INTERVAL / 2
+    for _ in range(10):
+        assert macros.load_config().callsign == "K1ABC"
+    assert len(config.stats) == 1
+
+    config.clock.now += macros.CONFIG_CHECK_INTERVAL / 2
+    assert macros.load_config().callsign == "K1ABCD"
+    assert len(config.stats) == 2
+
+
+def test_write_does_not_change_a_config_being_read(config):
+    _write(config.path, _config("K1ABC", **{"1": "CQ"}))
+    reading = macros.load_config()
+
+    result = asyncio.run(macros.add_or_update_macro(macros.MacroUpdateRequest(key="2", text="73")))
+    assert result["success"]
+    assert reading.macros == {"1": "CQ"}
+
+    # The write is the new cached config and on disk, without waiting for a check
+    current = macros.load_config()
+    assert current is not reading and current.macros == {"1": "CQ", "2": "73"}
+    assert json.loads(config.path.read_text())["macros"] == {"1": "CQ", "2": "73"}
+
+    asyncio.run(macros.update_config(macros.ConfigUpdate(callsign="k9xyz")))
+    assert current.callsign == "K1ABC"
+    assert macros.load_config().callsign == "K9XYZ"
@@ -0,0 +1,96 @@
+"""Scroll and carrier detection on synthetic waterfall frames."""
+
+import numpy as np
+
+from backend.waterfall_analysis import (
+    CARRIER_HOLD, CarrierDetector, detect_scroll, intensity_lut, palette_colours, to_intensity
+)
+from benchmarks.waterfall_frames import SyntheticWaterfall
+
+CARRIER_COLUMNS = (120, 310)
+
+
+def _levels(rng: np.random.Generator, rows: int, width: int, carriers=CARRIER_COLUMNS) -> np.ndarray:
+    """Noise floor with steady carriers a few columns wide."""
+    levels = rng.gamma(2.0, 18.0, (rows, width))
+    x = np.arange(width)
+    for centre in carriers:
+        levels += 170 * np.exp(-((x - centre) / 2.5) ** 2)
+    return np.clip(levels, 0, 255).astype(np.uint8)
+
+
+def test_detect_scroll_down():
+    waterfall = SyntheticWaterfall(width=400, height=120, scroll_rows=3)
+    previous = waterfall.next_frame()
+    assert detect_scroll(previous, waterfall.next_frame()) == 3
+
+
+def test_detect_scroll_up():
+    waterfall = SyntheticWaterfall(width=400, height=120, scroll_rows=3)
+    previous = waterfall.next_frame()[::-1]
+    assert detect_scroll(previous, waterfall.next_frame()[::-1]) == -3
+
+
+def test_detect_scroll_rejects_non_scrolls():
+    waterfall = SyntheticWaterfall(width=400, height=120, scroll_rows=2)
+    frame = waterfall.next_frame()
+    assert detect_scroll(frame, frame.copy()) is None
+
+    changed = frame.copy()
+    changed[40:50, 100:200] = 0
+    assert detect_scroll(frame, changed) is None
+    assert detect_scroll(frame, frame[:100]) is None
+
+
+def test_detect_scroll_beyond_max_shift():
+    waterfall = SyntheticWaterfall(width=400, height=120, scroll_rows=10)
+    previous = waterfall.next_frame()
+    assert detect_scroll(previous, waterfall.next_frame(), max_shift=8) is None
+
+
+def test_carrier_detector_finds_carriers_in_frames():
+    rng = np.random.default_rng(3)
+    colours = palette_colours()
+    lut = intensity_lut()
+    detector = CarrierDetector()
+
+    found = []
+    for step in range(20):
+        frame = colours[_levels(rng, 2, 500)]
+        found = detector.update(to_intensity(frame, lut), now=step * 0.1)
+
+    columns = sorted(carrier["column"] for carrier in found)
+    assert len(columns) == len(CARRIER_COLUMNS)
+    for column, expected in zip(columns, CARRIER_COLUMNS):
+        assert abs(column - expected) < 1.5
+    assert all(abs(carrier["persistence"] - 1.9) < 1e-9 for carrier in found)
+    assert detector.noise_floor is not None and detector.noise_floor < 60
+
+
+def test_carrier_detector_drops_carriers_that_go_away():
+    rng = np.random.default_rng(4)
+    detector = CarrierDetector()
+    for step in range(20):
+        found = detector.update(_levels(rng, 2, 500), now=step * 0.1)
+    assert found
+
+    # The averages decay below the threshold within a few seconds of rows
+    step = 20
+    while found and step < 50:
+        found = detector.update(_levels(rng, 2, 500, carriers=()), now=step * 0.1)
+        step += 1
+    assert found == []
+
+    # Back after the hold time, a carrier is tracked afresh
+    now = step * 0.1 + CARRIER_HOLD + 1
+    for offset in range(20):
+        found = detector.update(_levels(rng, 2, 500), now=now + offset * 0.1)
+    assert found and all(carrier["persistence"] < 2.0 for carrier in found)
+
+
+def test_carrier_detector_ignores_plain_noise():
+    rng = np.random.default_rng(5)
+    detector = CarrierDetector()
+    for step in range(20):
+        found = detector.update(_levels(rng, 4, 500, carriers=()), now=step * 0.1)
+    assert found == []
@@ -0,0 +1,119 @@
+"""WaterfallCaptureService frame handling, driven with synthetic captures."""
+
+import asyncio
+import io
+
+from PIL import Image
+
+import backend.waterfall_capture as waterfall_capture
+from backend.waterfall_capture import FRAME_HEADER, FRAME_KIND_KEYFRAME, WaterfallCaptureService
+from backend.waterfall_encode import encode_jobs
+from benchmarks.waterfall_frames import SyntheticWaterfall
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.frames = []
+        self.json = []
+
+    async def send_bytes(self, data: bytes):
+        self.frames.append(FRAME_HEADER.unpack_from(data))
+
+    async def send_json(self, data: dict):
+        self.json.append(data)
+
+
+def _service(captures) -> WaterfallCaptureService:
+    """A service whose captures come from the given frames, in turn."""
+    service = WaterfallCaptureService()
+    captures = iter(captures)
+    service._capture_pixels = lambda full=False, out=None, damage=None: next(captures).copy()
+    return service
+
+
+async def _distribute(service: WaterfallCaptureService, frame):
+    """Plan, encode and send one frame the way _capture_loop and _send_loop do."""
+    plans = service._plan_distribution(frame)
+    if not plans:
+        return
+    jobs = service._encode_jobs(plans, frame.image.height)
+    service._send_encoded(frame, plans, encode_jobs(frame.image, jobs, io.BytesIO()))
+    for sub in service.subscribers.values():
+        if sub.send_task:
+            await sub.send_task
+
+
+def test_unchanged_frame_is_skipped_and_changed_frame_sent():
+    waterfall = SyntheticWaterfall(width=320, height=80, scroll_rows=2)
+    still = waterfall.next_frame()
+    service = _service([still, still, waterfall.next_frame()])
+    websocket = FakeWebSocket()
+    service.add_subscriber(websocket)
+
+    async def run():
+        first = service._capture_frame()
+        assert first.changed
+        first.timestamp = 100.0
+        await _distribute(service, first)
+
+        unchanged = service._capture_frame()
+        assert not unchanged.changed
+        assert unchanged.image is first.image
+        unchanged.timestamp = 100.5
+        await _distribute(service, unchanged)
+
+        changed = service._capture_frame()
+        assert changed.changed and changed.scroll == 2
+        changed.timestamp = 101.0
+        await _distribute(service, changed)
+
+    asyncio.run(run())
+
+    status = service.get_status()
+    assert status["frames_skipped"] == 1
+    assert status["frames_sent"] == 2
+    kinds = [frame[2] for frame in websocket.frames]
+    numbers = [frame[4] for frame in websocket.frames]
+    assert kinds[0] == FRAME_KIND_KEYFRAME
+    assert numbers == [1, 2]
+
+
+def test_capture_without_numpy_survives_a_frequency_axis(monkeypatch):
+    waterfall = SyntheticWaterfall(width=320, height=80, scroll_rows=2)
+    images = [Image.fromarray(waterfall.next_frame()) for _ in range(2)]
+    monkeypatch.setattr(waterfall_capture, "NUMPY_AVAILABLE", False)
+    service = _service(images)
+    service.carrier_detector = None  # As constructed without NumPy
+    service.set_crop(0, 0, 320, 80)
+    service.set_frequency_axis(500, 2500)
+    websocket = FakeWebSocket()
+    service.add_subscriber(websocket)
+
+    async def run():
+        for timestamp in (100.0, 101.0):
+            frame = service._capture_frame()
+            assert frame.changed and frame.scroll is None
+            frame.timestamp = timestamp
+            await service._publish_carriers(timestamp)
+            await _distribute(service, frame)
+
+    asyncio.run(run())
+    assert service.carriers == []
+    assert [frame[2] for frame in websocket.frames] == [FRAME_KIND_KEYFRAME, FRAME_KIND_KEYFRAME]
+
+
+def test_frequency_axis_survives_recropping_the_same_columns():
+    service = WaterfallCaptureService()
+    service.set_crop(10, 40, 600, 120)
+    service.set_frequency_axis(0, 3000)
+
+    service.clear_crop()
+    assert service.frequency_axis is None
+    assert service.frequency_at(10, 100) is None
+
+    service.set_crop(10, 45, 600, 110)
+    assert service.frequency_axis == (0.0, 3000.0)
+    assert service.frequency_at(25, 100) == 750
+
+    service.set_crop(12, 45, 600, 110)
+    assert service.frequency_axis is None
@@ -0,0 +1,32 @@
+"""The binary frame header sent in front of every /api/waterfall/ws frame."""
+
+from backend.waterfall_capture import (
+    FRAME_HEADER, FRAME_KIND_KEYFRAME, FRAME_KIND_STRIP, FRAME_MAGIC, FRAME_VERSION
+)
+from backend.waterfall_codecs import CODECS
+
+
+def test_frame_header_size():
+    # frontend/static/js/waterfall.js reads the fields at fixed offsets
+    assert FRAME_HEADER.size == 31
+
+
+def test_frame_header_round_trip():
+    fields = (
+        FRAME_MAGIC, FRAME_VERSION, FRAME_KIND_STRIP, 1718000000.123456, 0xfffffffe,
+        1600, 300, -12, 288, 12, 0xfffffffd, CODECS["webp"].codec_id
+    )
+    payload = b"encoded rows"
+    data = FRAME_HEADER.pack(*fields) + payload
+
+    assert FRAME_HEADER.unpack_from(data) == fields
+    assert data[FRAME_HEADER.size:] == payload
+
+
+def test_frame_header_keyframe_fields():
+    data = FRAME_HEADER.pack(FRAME_MAGIC, FRAME_VERSION, FRAME_KIND_KEYFRAME, 0.0, 1, 800, 150, 0, 0, 150, 0,
+                             CODECS["jpeg"].codec_id)
+    magic, version, kind, _, number, width, height, scroll, y, rows, base, codec_id = FRAME_HEADER.unpack(data)
+    assert (magic, version, kind) == (b"WF", FRAME_VERSION, FRAME_KIND_KEYFRAME)
+    assert (number, width, height, scroll, y, rows, base) == (1, 800, 150, 0, 0, 150, 0)
+    assert codec_id == CODECS["jpeg"].codec_id
@@ -0,0 +1,103 @@
+"""Recording the waterfall stream to disk, seeking and playing it back."""
+
+import asyncio
+
+from backend.waterfall_capture import FRAME_HEADER, FRAME_KIND_KEYFRAME, FRAME_KIND_STRIP, FRAME_MAGIC, FRAME_VERSION
+from backend.waterfall_recorder import INDEX_ENTRY, RECORD_KEYFRAME, RECORD_META, WaterfallRecorder
+
+
+class FakeService:
+    def __init__(self):
+        self.subscribers = []
+        self.keyframe_requests = 0
+
+    def add_subscriber(self, websocket):
+        self.subscribers.append(websocket)
+
+    def remove_subscriber(self, websocket):
+        self.subscribers.remove(websocket)
+
+    def set_subscriber_codecs(self, websocket, codecs):
+        return codecs[0]
+
+    def get_status(self):
+        return {"codecs": ["jpeg", "intensity"]}
+
+    def request_keyframe(self, websocket=None):
+        self.keyframe_requests += 1
+
+
+def _frame(kind: int, timestamp: float, number: int) -> bytes:
+    rows = 100 if kind == FRAME_KIND_KEYFRAME else 2
+    return FRAME_HEADER.pack(
+        FRAME_MAGIC, FRAME_VERSION, kind, timestamp, number, 400, 100, 0 if rows == 100 else 2, 0, rows,
+        number - 1, 0
+    ) + b"payload %d" % number
+
+
+# What a subscriber is sent, in order. Capture timestamps are far from the
+# wall clock, as in a recording replayed from long ago.
+STREAM = [
+    ("meta", {"type": "meta", "width": 400, "low_hz": None}),
+    ("frame", _frame(FRAME_KIND_KEYFRAME, 1000.0, 1)),
+    ("frame", _frame(FRAME_KIND_STRIP, 1000.1, 2)),
+    ("frame", _frame(FRAME_KIND_STRIP, 1000.2, 3)),
+    ("meta", {"type": "meta", "width": 400, "low_hz": 0}),
+    ("frame", _frame(FRAME_KIND_KEYFRAME, 1000.3, 4)),
+    ("frame", _frame(FRAME_KIND_STRIP, 1000.4, 5)),
+]
+
+
+def _record(tmp_path) -> WaterfallRecorder:
+    recorder = WaterfallRecorder(directory=str(tmp_path), segment_seconds=60)
+    recorder.start(FakeService())
+
+    async def send():
+        for kind, message in STREAM:
+            if kind == "meta":
+                await recorder.send_json(message)
+            else:
+                await recorder.send_bytes(message)
+
+    asyncio.run(send())
+    recorder.stop()
+    return recorder
+
+
+def test_index_is_in_timestamp_order(tmp_path):
+    recorder = _record(tmp_path)
+    assert len(recorder.segments) == 1
+    segment = recorder.segments[0]
+
+    entries = [segment.entry(i) for i in range(segment.entries())]
+    timestamps = [entry[0] for entry in entries]
+    flags = [entry[3] for entry in entries]
+    assert timestamps == sorted(timestamps)
+    # The first meta message arrived before any frame and opens the segment with the keyframe
+    assert flags == [RECORD_META, RECORD_KEYFRAME, 0, 0, RECORD_META, RECORD_KEYFRAME, 0]
+    assert segment.index_path.stat().st_size == len(entries) * INDEX_ENTRY.size
+
+
+def test_find_starts_at_keyframe_with_its_meta(tmp_path):
+    segment = _record(tmp_path).segments[0]
+    assert segment.find(999.0) == (1, 0)
+    assert segment.find(1000.25) == (1, 0)
+    assert segment.find(1000.3) == (5, 4)
+    assert segment.find(1000.45) == (5, 4)
+    assert segment.read(4)[2] == b'{"type": "meta", "width": 400, "low_hz": 0}'
+
+
+def test_playback_sends_records_in_order(tmp_path):
+    recorder = _record(tmp_path)
+
+    async def play(start):
+        return [record async for record in recorder.play(start, speed=100.0)]
+
+    expected = [(kind == "meta", None if kind == "meta" else message) for kind, message in STREAM]
+    played = asyncio.run(play(1000.0))
+    assert [(is_meta, None if is_meta else data) for is_meta, data in played] == expected
+
+    # A seek past the second keyframe starts there, after the meta message it needs
+    played = asyncio.run(play(1000.35))
+    assert [is_meta for is_meta, _ in played] == [True, False, False]
+    assert played[1][1] == STREAM[5][1]
@@ -0,0 +1,81 @@
+"""Per-client outbound scheduling in ConnectionManager."""
+
+import asyncio
+
+import pytest
+
+import backend.websocket_manager as websocket_manager
+from backend.websocket_manager import PRIORITY_CONTROL, PRIORITY_LOW, PRIORITY_RX, ClientOutbox
+
+
+async def _get_now(outbox: ClientOutbox):
+    """The next message if one is ready without waiting, else None."""
+    try:
+        return await asyncio.wait_for(outbox.get(), 0.05)
+    except asyncio.TimeoutError:
+        return None
+
+
+def test_priority_order():
+    async def run():
+        outbox = ClientOutbox()
+        outbox.put("status", PRIORITY_LOW, "status_update")
+        outbox.put("rx 1", PRIORITY_RX)
+        outbox.put("ping", PRIORITY_CONTROL)
+        outbox.put("rx 2", PRIORITY_RX)
+        return [await _get_now(outbox) for _ in range(4)]
+
+    assert asyncio.run(run()) == ["ping", "rx 1", "rx 2", "status"]
+
+
+def test_client_keeping_up_is_not_rate_capped(monkeypatch):
+    monkeypatch.setattr(websocket_manager, "LOW_PRIORITY_MIN_INTERVAL", 10.0)
+
+    async def run():
+        outbox = ClientOutbox()
+        sent = []
+        for i in range(5):
+            outbox.put(f"status {i}", PRIORITY_LOW, "status_update")
+            sent.append(await _get_now(outbox))
+        return outbox, sent
+
+    outbox, sent = asyncio.run(run())
+    assert sent == [f"status {i}" for i in range(5)]
+    assert not outbox.behind and outbox.coalesced == 0
+
+
+def test_client_behind_is_coalesced_and_rate_capped(monkeypatch):
+    monkeypatch.setattr(websocket_manager, "LOW_PRIORITY_MIN_INTERVAL", 0.3)
+
+    async def run():
+        outbox = ClientOutbox()
+        # Two snapshots before the sender gets to the first: it is behind
+        outbox.put("status 1", PRIORITY_LOW, "status_update")
+        outbox.put("status 2", PRIORITY_LOW, "status_update")
+        assert outbox.behind
+        first = await _get_now(outbox)
+
+        outbox.put("status 3", PRIORITY_LOW, "status_update")
+        outbox.put("rx", PRIORITY_RX)
+        held = [await _get_now(outbox), await _get_now(outbox)]
+        later = await asyncio.wait_for(outbox.get(), 1.0)
+
+        # Caught up: the next snapshot goes straight out again
+        assert await _get_now(outbox) is None
+        outbox.put("status 4", PRIORITY_LOW, "status_update")
+        return first, held, later, await _get_now(outbox), outbox
+
+    first, held, later, after, outbox = asyncio.run(run())
+    assert first == "status 2"
+    assert held == ["rx", None]
+    assert later == "status 3"
+    assert after == "status 4"
+    assert outbox.coalesced == 1 and not outbox.behind
+
+
+@pytest.mark.parametrize("priority", [PRIORITY_CONTROL, PRIORITY_RX])
+def test_full_queue_is_refused(monkeypatch, priority):
+    monkeypatch.setattr(websocket_manager, "CLIENT_SEND_QUEUE_SIZE", 2)
+    outbox = ClientOutbox()
+    assert outbox.put("a", priority) and outbox.put("b", priority)
+    assert not outbox.put("c", priority)